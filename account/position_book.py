@@ -0,0 +1,170 @@
+import os
+import sqlite3
+import threading
+import time
+
+from utils.logger import get_logger
+
+logger = get_logger("POSITION_BOOK")
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS positions (
+    symbol TEXT PRIMARY KEY,
+    side TEXT NOT NULL,
+    size REAL NOT NULL,
+    entry_price REAL NOT NULL,
+    leverage INTEGER NOT NULL,
+    take_profit REAL,
+    stop_loss REAL,
+    order_id TEXT,
+    opened_at INTEGER NOT NULL
+);
+CREATE TABLE IF NOT EXISTS fills (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    ts INTEGER NOT NULL,
+    symbol TEXT NOT NULL,
+    action TEXT NOT NULL,
+    side TEXT,
+    size REAL,
+    price REAL,
+    order_id TEXT
+);
+"""
+
+
+class PositionBook:
+    """
+    Write-through store of open positions plus an append-only fill journal,
+    in SQLite (WAL mode, one transaction per fill).
+
+    The bot's local book (Trader.positions) is rebuilt from load() on startup,
+    then reconcile() applies a bulk exchange snapshot, at startup and once per
+    cycle: positions closed on the exchange (TP/SL) are dropped, unknown
+    exchange positions adopted and size drift corrected. Every change is journaled in `fills`.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        # WAL + NORMAL: a committed fill survives a process crash; only an OS
+        # crash can lose the last transactions, which reconcile() repairs
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.executescript(_SCHEMA)
+
+    def load(self) -> dict:
+        """
+        {symbol: position} as stored, in Trader.positions shape.
+        """
+        with self._lock:
+            rows = self._db.execute(
+                "SELECT symbol, side, size, entry_price, leverage, take_profit, stop_loss, order_id, opened_at FROM positions"
+            ).fetchall()
+        return {row[0]: _position(row) for row in rows}
+
+    def open(self, symbol: str, position: dict, order_id: str | None = None):
+        """
+        Records an entry fill (replacing any stored position for the symbol).
+        """
+        with self._lock, self._db:
+            self._db.execute("BEGIN")
+            self._upsert(symbol, position, order_id)
+            self._journal(symbol, "open", position.get("side"), position.get("size"), position.get("entry_price"), order_id)
+
+    def close(self, symbol: str, price: float | None = None, order_id: str | None = None, reason: str = "close"):
+        with self._lock, self._db:
+            self._db.execute("BEGIN")
+            row = self._db.execute("SELECT side, size FROM positions WHERE symbol = ?", (symbol,)).fetchone()
+            self._db.execute("DELETE FROM positions WHERE symbol = ?", (symbol,))
+            self._journal(symbol, reason, row[0] if row else None, row[1] if row else None, price, order_id)
+
+    def reconcile(self, exchange_positions: list, keep=()) -> dict:
+        """
+        Makes the stored book match the exchange's open positions (the source
+        of truth) in one transaction; symbols in `keep` (orders in flight) are
+        left as stored. Returns the reconciled {symbol: position} and logs
+        what changed.
+        """
+        reported = {
+            p["symbol"]: p for p in exchange_positions
+            if p.get("symbol") and float(p.get("size") or 0) > 0 and p["symbol"] not in keep
+        }
+        local = {symbol: p for symbol, p in self.load().items() if symbol not in keep}
+        changes = []
+        with self._lock, self._db:
+            self._db.execute("BEGIN")
+            for symbol, position in local.items():
+                if symbol not in reported:
+                    self._db.execute("DELETE FROM positions WHERE symbol = ?", (symbol,))
+                    self._journal(symbol, "reconcile_closed", position["side"], position["size"], None, position.get("order_id"))
+                    changes.append(f"{symbol} closed on exchange")
+            for symbol, remote in reported.items():
+                position = local.get(symbol)
+                merged = dict(position or {})
+                merged.update({k: remote[k] for k in ("side", "size", "leverage") if remote.get(k)})
+                if remote.get("entry_price"):
+                    merged["entry_price"] = remote["entry_price"]
+                merged.setdefault("entry_price", 0.0)
+                merged.setdefault("leverage", 1)
+                if position is None:
+                    action = "reconcile_adopted"
+                elif (position["side"], round(position["size"], 10)) != (merged["side"], round(float(merged["size"]), 10)):
+                    action = "reconcile_resized"
+                else:
+                    continue
+                self._upsert(symbol, merged, merged.get("order_id"))
+                self._journal(symbol, action, merged["side"], merged["size"], merged["entry_price"], merged.get("order_id"))
+                changes.append(f"{symbol} {action.split('_')[1]} ({merged['side']} {merged['size']})")
+        if changes:
+            logger.warning("Reconciled with exchange: " + "; ".join(changes))
+        else:
+            logger.debug(f"Position book matches exchange ({len(reported)} open)")
+        return self.load()
+
+    def fills(self, limit: int = 100) -> list:
+        with self._lock:
+            rows = self._db.execute(
+                "SELECT ts, symbol, action, side, size, price, order_id FROM fills ORDER BY id DESC LIMIT ?", (limit,)
+            ).fetchall()
+        keys = ("ts", "symbol", "action", "side", "size", "price", "order_id")
+        return [dict(zip(keys, row)) for row in rows]
+
+    def close_db(self):
+        with self._lock:
+            self._db.close()
+
+    def _upsert(self, symbol: str, position: dict, order_id: str | None):
+        self._db.execute(
+            "INSERT OR REPLACE INTO positions VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+            (
+                symbol,
+                position.get("side", "SHORT"),
+                float(position["size"]),
+                float(position.get("entry_price") or 0.0),
+                int(position.get("leverage") or 1),
+                position.get("take_profit"),
+                position.get("stop_loss"),
+                order_id,
+                int(position.get("opened_at") or time.time() * 1000),
+            ),
+        )
+
+    def _journal(self, symbol: str, action: str, side, size, price, order_id):
+        self._db.execute(
+            "INSERT INTO fills (ts, symbol, action, side, size, price, order_id) VALUES (?, ?, ?, ?, ?, ?, ?)",
+            (int(time.time() * 1000), symbol, action, side, size, price, order_id),
+        )
+
+
+def _position(row) -> dict:
+    symbol, side, size, entry_price, leverage, take_profit, stop_loss, order_id, opened_at = row
+    position = {"side": side, "entry_price": entry_price, "size": size, "leverage": leverage, "opened_at": opened_at}
+    if take_profit is not None:
+        position["take_profit"] = take_profit
+    if stop_loss is not None:
+        position["stop_loss"] = stop_loss
+    if order_id:
+        position["order_id"] = order_id
+    return position
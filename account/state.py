@@ -1,38 +1,132 @@
+import threading
+import time
+
+from config.settings import ACCOUNT_CACHE_TTL_SEC
 from exchange.weex_client import WeexClient
 from utils.logger import get_logger
 
 logger = get_logger("ACCOUNT_STATE")
-client = WeexClient.from_env()
 
-def get_account_state() -> dict:
+# Cached account snapshot: shared by every symbol in a cycle and dropped
+# explicitly after a fill via invalidate_account_state().
+_cache = {"state": None, "fetched_at": 0.0}
+_cache_stats = {"hits": 0, "misses": 0}
+_cache_lock = threading.Lock()
+
+def get_account_state(ttl: float = ACCOUNT_CACHE_TTL_SEC) -> dict:
     """
     Fetches real account equity and balance.
+    Returns the cached snapshot if it is younger than ttl seconds.
+    """
+    with _cache_lock:
+        cached = _cached_state(ttl)
+        if cached is not None:
+            return cached
+
+        try:
+            # Endpoint: /capi/v2/account/getAccounts
+            # Docs: https://www.weex.com/api-doc/contract/Account_API/AllContractAccountsInfo
+            response = WeexClient.shared().get_accounts()
+            return _store(_parse_account(response))
+
+        except Exception as e:
+            logger.error(f"Account exception: {e}")
+            return {"equity": 0, "balance": 0}
+
+async def get_account_state_async(ttl: float = ACCOUNT_CACHE_TTL_SEC) -> dict:
     """
+    Async variant of get_account_state using the shared AsyncWeexClient.
+    """
+    from exchange.async_weex_client import AsyncWeexClient
+    with _cache_lock:
+        cached = _cached_state(ttl)
+    if cached is not None:
+        return cached
+
+    aclient = AsyncWeexClient.shared()
     try:
-        # Endpoint: /capi/v2/account/getAccounts
-        # Docs: https://www.weex.com/api-doc/contract/Account_API/AllContractAccountsInfo
-        response = client.get_accounts()
-
-        # Some endpoints return raw payload without {code,data}. Handle both.
-        payload = response
-        if isinstance(response, dict) and response.get("code") == "00000":
-            payload = response.get("data", response)
-
-        collateral = payload.get("collateral", []) if isinstance(payload, dict) else []
-        usdt = next((c for c in collateral if c.get("coin") == "USDT"), None)
-        amount = float(usdt.get("amount", 0.0)) if usdt else 0.0
-
-        if amount > 0 or collateral:
-            return {
-                "equity": amount,
-                "balance": amount,
-                "drawdown": 0.0,  # Calculation requires historical tracking, simplified for now
-                "open_positions": []  # Retrieve positions via positions endpoint if needed
-            }
-
-        logger.error(f"Account fetch failed: {response}")
-        return {"equity": 0, "balance": 0}
+        response = await aclient.get_accounts()
+        with _cache_lock:
+            return _store(_parse_account(response))
 
     except Exception as e:
         logger.error(f"Account exception: {e}")
         return {"equity": 0, "balance": 0}
+
+def invalidate_account_state():
+    """
+    Drops the cached snapshot so the next call refetches (e.g. after a fill).
+    """
+    with _cache_lock:
+        _cache["state"] = None
+        _cache["fetched_at"] = 0.0
+    logger.info("Account cache invalidated")
+
+def account_cache_stats() -> dict:
+    with _cache_lock:
+        return dict(_cache_stats)
+
+def _cached_state(ttl: float) -> dict | None:
+    # Caller must hold _cache_lock
+    state = _cache["state"]
+    age = time.monotonic() - _cache["fetched_at"]
+    if state is not None and age < ttl:
+        _cache_stats["hits"] += 1
+        logger.debug(f"Account cache hit (age={age:.1f}s)")
+        return dict(state)
+    _cache_stats["misses"] += 1
+    logger.info("Account cache miss; fetching account state")
+    return None
+
+def _store(state: dict | None) -> dict:
+    # Caller must hold _cache_lock. Failed fetches are never cached.
+    if state is None:
+        return {"equity": 0, "balance": 0}
+    _cache["state"] = state
+    _cache["fetched_at"] = time.monotonic()
+    return dict(state)
+
+def _parse_account(response) -> dict | None:
+    # Some endpoints return raw payload without {code,data}. Handle both.
+    payload = response
+    if isinstance(response, dict) and response.get("code") == "00000":
+        payload = response.get("data", response)
+
+    collateral = payload.get("collateral", []) if isinstance(payload, dict) else []
+    usdt = next((c for c in collateral if c.get("coin") == "USDT"), None)
+    amount = float(usdt.get("amount", 0.0)) if usdt else 0.0
+
+    if amount > 0 or collateral:
+        return {
+            "equity": amount,
+            "balance": amount,
+            "drawdown": 0.0,  # Calculation requires historical tracking, simplified for now
+            "open_positions": _parse_positions(payload.get("position", [])),
+        }
+
+    logger.error(f"Account fetch failed: {response}")
+    return None
+
+def _parse_positions(items) -> list:
+    """
+    Normalizes getAccounts' position list to
+    {symbol, side, size, entry_price, leverage, unrealized_pnl}.
+    """
+    positions = []
+    for item in items if isinstance(items, list) else []:
+        try:
+            size = float(item.get("size") or item.get("hold_size") or 0.0)
+            if not item.get("symbol") or size <= 0:
+                continue
+            open_value = float(item.get("open_value") or 0.0)
+            positions.append({
+                "symbol": item["symbol"],
+                "side": str(item.get("side", "")).upper(),
+                "size": size,
+                "entry_price": open_value / size if open_value else 0.0,
+                "leverage": int(float(item.get("leverage") or 1)),
+                "unrealized_pnl": float(item.get("unrealizePnl") or 0.0),
+            })
+        except (AttributeError, TypeError, ValueError):
+            logger.warning(f"Unparseable position entry: {item}")
+    return positions
@@ -1,8 +1,11 @@
+from ai.backends import RuleBasedBackend
+
+
 def upload_ai_log(client, decision, market_snapshot):
     payload = {
         "orderId": None,
         "stage": "Decision Making",
-        "model": "RuleBased-AI-v1",
+        "model": decision.get("ai_log", {}).get("model", RuleBasedBackend.model),
         "input": market_snapshot,
         "output": decision,
         "explanation": decision["reason"]
@@ -0,0 +1,283 @@
+import os
+import threading
+
+import numpy as np
+
+from ai.feature import COLUMN_INDEX, FEATURE_COLUMNS, FEATURE_VERSION, get_features
+from ai.json_stream import parse_json_response
+from ai.llm_client import call_llm
+from ai.prompt import build_prompt
+from ai.schema import validate_decision
+from config.settings import LLM_MODEL, TAKE_PROFIT_USDT, STOP_LOSS_USDT
+from utils.logger import get_logger
+
+logger = get_logger("AI_BACKENDS")
+
+
+def parse_decision(raw_response: str) -> dict:
+    """
+    Parses an LLM answer (plain JSON or a ```json block, with any surrounding
+    prose ignored) into a validated decision.
+    """
+    data = parse_json_response(raw_response)
+    if not isinstance(data, dict):
+        raise ValueError(f"Expected a JSON object, got {type(data).__name__}")
+    return validate_decision(data)
+
+
+_field_listener = None
+
+
+def set_decision_field_listener(listener):
+    """
+    Registers listener(symbol, key, fields) to hear about a streamed LLM
+    decision while it is generated: called once per completed top-level field
+    with all fields so far, before the decision is validated. It runs on the
+    LLM client's loop, so it must not block. None unregisters.
+    """
+    global _field_listener
+    _field_listener = listener
+
+
+def _field_callback(symbol: str):
+    listener = _field_listener
+    if listener is None:
+        return None
+    fields = {}
+
+    def on_field(key, value):
+        fields[key] = value
+        try:
+            listener(symbol, key, fields)
+        except Exception as e:
+            logger.warning(f"Decision field listener failed for {symbol}: {e}")
+
+    return on_field
+
+
+class InferenceBackend:
+    """
+    Turns a decision context into a DecisionSchema-valid dict (without ai_log).
+    `model` is the name reported in the AI log.
+    """
+
+    name = "base"
+    model = "base"
+    local = True
+
+    def decide(self, context: dict) -> dict:
+        raise NotImplementedError
+
+
+class LLMBackend(InferenceBackend):
+    name = "llm"
+    model = LLM_MODEL
+    local = False
+
+    def decide(self, context: dict) -> dict:
+        # 1. Build Prompt
+        prompt_text = build_prompt(context)
+
+        # 2. Call LLM (fields are announced as they stream in)
+        on_field = _field_callback(context.get("market", {}).get("symbol"))
+        try:
+            raw_response = call_llm(prompt_text, on_field=on_field) if on_field else call_llm(prompt_text)
+        except Exception as e:
+            raise RuntimeError(f"LLM call failed: {e}")
+
+        # 3. Parse & Validate
+        try:
+            return parse_decision(raw_response)
+        except Exception as e:
+            logger.error(f"Validation failed: {e}. Raw: {raw_response}")
+            raise ValueError(f"Invalid AI response: {e}")
+
+
+class LocalBackend(InferenceBackend):
+    """
+    Shared exit rules and decision shaping for the in-process scorers.
+    Entries use the constraint's required size; leverage grows with confidence
+    up to `max_leverage`.
+    """
+
+    max_leverage = 5
+
+    def decide(self, context: dict) -> dict:
+        features = get_features(context)
+        constraints = context.get("constraints", {}) or {}
+        allowed_actions = constraints.get("allowed_actions") or ["SELL", "HOLD"]
+
+        exit_decision = self._exit_rule(features, allowed_actions)
+        if exit_decision is not None:
+            action, confidence, reason = exit_decision
+        else:
+            action, confidence, reason = self.score(features, allowed_actions)
+        return self._decision(action, confidence, reason, constraints)
+
+    def score(self, features, allowed_actions: list) -> tuple:
+        """
+        Returns (action, confidence, reason) for the current feature row.
+        """
+        raise NotImplementedError
+
+    @staticmethod
+    def _exit_rule(features, allowed_actions: list):
+        # Same hard TP/SL rule the LLM prompt imposes
+        if not features[COLUMN_INDEX["has_position"]] or "CLOSE" not in allowed_actions:
+            return None
+        pnl = float(features[COLUMN_INDEX["pnl_usdt"]])
+        if pnl >= TAKE_PROFIT_USDT:
+            return "CLOSE", 1.0, f"Take profit reached: unrealized PnL {pnl:.4f} >= +{TAKE_PROFIT_USDT} USDT."
+        if pnl <= -STOP_LOSS_USDT:
+            return "CLOSE", 1.0, f"Stop loss reached: unrealized PnL {pnl:.4f} <= -{STOP_LOSS_USDT} USDT."
+        return None
+
+    def _decision(self, action: str, confidence: float, reason: str, constraints: dict) -> dict:
+        confidence = round(min(1.0, max(0.0, confidence)), 4)
+        trades = action in ("BUY", "SELL", "CLOSE")
+        leverage = max(1, round(confidence * self.max_leverage)) if action in ("BUY", "SELL") else 1
+        size = float(constraints.get("required_size") or 0.0) if trades else 0.0
+        if trades and size <= 0:
+            action, size, leverage = "HOLD", 0.0, 1
+            reason = f"{reason} No valid size available, holding."
+        return validate_decision({"action": action, "confidence": confidence, "leverage": leverage, "size": size, "reason": reason})
+
+
+def _clip(value: float) -> float:
+    return max(-1.0, min(1.0, value))
+
+
+class RuleBasedBackend(LocalBackend):
+    """
+    Deterministic short-bias scorer over the indicator features.
+    Each signal is scaled to [-1, 1] (positive favours a short), combined with
+    fixed weights and mapped to a confidence in [0, 1].
+    """
+
+    name = "rule_based"
+    model = "RuleBased-AI-v1"
+
+    WEIGHTS = {"trend": 0.35, "momentum": 0.25, "vwap": 0.2, "band": 0.1, "funding": 0.1}
+    ENTRY_CONFIDENCE = 0.65
+    EXIT_CONFIDENCE = 0.7
+
+    def _signals(self, row) -> dict:
+        f = {name: float(row[i]) for name, i in COLUMN_INDEX.items()}
+        # Gaps are measured in ATRs so the scorer works across price scales
+        scale = max(f["atr_pct"], 1e-4)
+        rsi = (f["rsi"] - 50.0) / 50.0
+        return {
+            "trend": _clip(-f["ema_gap"] / scale),
+            # Bearish RSI band is good, oversold (< 30) is a poor entry
+            "momentum": -1.0 if rsi < -0.4 else _clip(-rsi * 2.5),
+            "vwap": _clip(-f["vwap_gap"] / scale),
+            "band": _clip(f["bb_position"]),
+            # Positive funding pays shorts
+            "funding": _clip(f["funding"] / 0.0005),
+        }
+
+    def score(self, features, allowed_actions: list) -> tuple:
+        signals = self._signals(features)
+        score = sum(self.WEIGHTS[k] * v for k, v in signals.items())
+        summary = ", ".join(f"{k} {v:+.2f}" for k, v in signals.items())
+
+        if features[COLUMN_INDEX["has_position"]]:
+            # Confidence that the short should be closed
+            confidence = (1.0 - score) / 2
+            if "CLOSE" in allowed_actions and confidence >= self.EXIT_CONFIDENCE:
+                return "CLOSE", confidence, f"Rule-based exit: signals turned against the short ({summary})."
+            return "HOLD", 1.0 - confidence, f"Rule-based hold: short thesis intact ({summary})."
+
+        confidence = (1.0 + score) / 2
+        if "SELL" in allowed_actions and confidence >= self.ENTRY_CONFIDENCE:
+            return "SELL", confidence, f"Rule-based short entry: bearish confluence ({summary})."
+        return "HOLD", 1.0 - confidence, f"Rule-based hold: no clear short edge ({summary})."
+
+
+class LinearModelBackend(LocalBackend):
+    """
+    Softmax linear model over (a subset of) the feature row, loaded from an
+    .npz file written by save_linear_model(). Disallowed actions are masked out
+    before picking the most likely action.
+    """
+
+    name = "linear"
+
+    def __init__(self, path: str):
+        with np.load(path, allow_pickle=False) as data:
+            self.features = [str(n) for n in data["features"]]
+            self.actions = [str(a).upper() for a in data["actions"]]
+            self.weights = np.asarray(data["weights"], dtype=np.float64)
+            self.bias = np.asarray(data["bias"], dtype=np.float64)
+            n = len(self.features)
+            self.mean = np.asarray(data["mean"], dtype=np.float64) if "mean" in data else np.zeros(n)
+            self.std = np.asarray(data["std"], dtype=np.float64) if "std" in data else np.ones(n)
+            self.model = str(data["name"]) if "name" in data else "Linear-AI-v1"
+            version = int(data["feature_version"]) if "feature_version" in data else None
+
+        if version != FEATURE_VERSION:
+            raise ValueError(f"Model {path} was built for feature version {version}, current is {FEATURE_VERSION}")
+        unknown = set(self.features) - set(FEATURE_COLUMNS)
+        if unknown:
+            raise ValueError(f"Model {path} uses unknown features: {sorted(unknown)}")
+        self.columns = np.array([COLUMN_INDEX[n] for n in self.features])
+        if self.weights.shape != (len(self.actions), len(self.features)) or self.bias.shape != (len(self.actions),):
+            raise ValueError(f"Model {path} has weights {self.weights.shape} / bias {self.bias.shape}, expected ({len(self.actions)}, {len(self.features)})")
+        self.std = np.where(self.std > 0, self.std, 1.0)
+        logger.info(f"Loaded {self.model} from {path} ({len(self.actions)} actions x {len(self.features)} features)")
+
+    def score(self, features, allowed_actions: list) -> tuple:
+        x = (features[self.columns].astype(np.float64) - self.mean) / self.std
+        logits = self.weights @ x + self.bias
+        mask = np.array([a in allowed_actions for a in self.actions])
+        if not mask.any():
+            return "HOLD", 0.0, "Linear model: no allowed action in model outputs."
+        logits = np.where(mask, logits, -np.inf)
+        probs = np.exp(logits - logits.max())
+        probs /= probs.sum()
+        best = int(probs.argmax())
+        action = self.actions[best]
+        ranked = ", ".join(f"{a} {p:.2f}" for a, p in zip(self.actions, probs) if p > 0)
+        return action, float(probs[best]), f"{self.model}: {action} most likely ({ranked})."
+
+
+def save_linear_model(path: str, weights, bias, actions=("SELL", "HOLD", "CLOSE"), features=FEATURE_COLUMNS, mean=None, std=None, name: str = "Linear-AI-v1"):
+    """
+    Writes a model file readable by LinearModelBackend.
+    """
+    arrays = {
+        "features": np.array(features),
+        "actions": np.array(actions),
+        "weights": np.asarray(weights, dtype=np.float64),
+        "bias": np.asarray(bias, dtype=np.float64),
+        "name": np.array(name),
+        "feature_version": np.array(FEATURE_VERSION),
+    }
+    if mean is not None:
+        arrays["mean"] = np.asarray(mean, dtype=np.float64)
+    if std is not None:
+        arrays["std"] = np.asarray(std, dtype=np.float64)
+    np.savez(path, **arrays)
+
+
+_backends = {}
+_backends_lock = threading.Lock()
+
+
+def get_backend(name: str, model_path: str = "") -> InferenceBackend:
+    """
+    Backend instance by name ("llm", "rule_based", "linear"); built once per name.
+    """
+    with _backends_lock:
+        if name not in _backends:
+            if name == "llm":
+                _backends[name] = LLMBackend()
+            elif name == "rule_based":
+                _backends[name] = RuleBasedBackend()
+            elif name == "linear":
+                if not model_path or not os.path.exists(model_path):
+                    raise ValueError(f"Linear backend needs an existing inference_model_path, got '{model_path}'")
+                _backends[name] = LinearModelBackend(model_path)
+            else:
+                raise ValueError(f"Unknown inference backend '{name}'")
+        return _backends[name]
@@ -0,0 +1,256 @@
+"""
+Local stand-in for the OpenAI chat-completions endpoint, so the LLM client
+(deadlines, retries, hedging, token accounting) can be exercised offline.
+
+    python -m ai.fake_llm_server --port 8800 --latency 0.3 --slow-rate 0.1
+
+then set llm_base_url: "http://127.0.0.1:8800/v1" (any API key is accepted).
+Every answer is a valid HOLD decision (or, with --trade-rate, sometimes the
+allowed SELL/CLOSE); batch prompts get one entry per symbol.
+"""
+import argparse
+import asyncio
+import json
+import random
+import re
+import threading
+import time
+
+from utils.logger import get_logger
+
+logger = get_logger("FAKE_LLM_SERVER")
+
+_SYMBOL_HEADER = re.compile(r"^### (\S+)", re.MULTILINE)
+
+
+def hold_responder(prompt: str) -> str:
+    decision = {"action": "HOLD", "confidence": 0.5, "leverage": 1, "size": 0, "reason": "Fake server: no clear edge."}
+    symbols = _SYMBOL_HEADER.findall(prompt)
+    if symbols:
+        return json.dumps([{"symbol": s, **decision} for s in symbols])
+    return json.dumps(decision)
+
+
+# Both prompt templates end each symbol's block with these two lines
+_ALLOWED_ACTIONS = re.compile(r"ALLOWED ACTIONS: (.+)")
+_REQUIRED_SIZE = re.compile(r"REQUIRED SIZE: ([0-9.eE+-]+)")
+
+
+def trading_responder(trade_rate: float = 0.2, seed=None):
+    """
+    Responder that takes the non-HOLD allowed action (SELL or CLOSE) with the
+    required size for a `trade_rate` fraction of symbols, so orders and their
+    AI logs are exercised too.
+    """
+    rng = random.Random(seed)
+
+    def decide(actions: str, size: str) -> dict:
+        choices = [a.strip() for a in actions.split(",") if a.strip() != "HOLD"]
+        if choices and rng.random() < trade_rate:
+            return {"action": choices[0], "confidence": 0.8, "leverage": 2, "size": float(size), "reason": "Fake server: sampled trade."}
+        return {"action": "HOLD", "confidence": 0.5, "leverage": 1, "size": 0, "reason": "Fake server: no clear edge."}
+
+    def respond(prompt: str) -> str:
+        blocks = _SYMBOL_HEADER.split(prompt)
+        if len(blocks) > 1:
+            decisions = []
+            for symbol, block in zip(blocks[1::2], blocks[2::2]):
+                actions, size = _ALLOWED_ACTIONS.search(block), _REQUIRED_SIZE.search(block)
+                decisions.append({"symbol": symbol, **decide(actions.group(1) if actions else "HOLD", size.group(1) if size else "0")})
+            return json.dumps(decisions)
+        actions, size = _ALLOWED_ACTIONS.search(prompt), _REQUIRED_SIZE.search(prompt)
+        return json.dumps(decide(actions.group(1) if actions else "HOLD", size.group(1) if size else "0"))
+
+    return respond
+
+
+class FakeLLMServer:
+    """
+    Each request sleeps `latency` seconds (+/- jitter); with probability
+    `slow_rate` it sleeps `slow_latency` instead, and with probability
+    `error_rate` it answers HTTP 500.
+
+    Prompt prefix caching is mimicked OpenAI-style: the longest prefix seen
+    before, in `cache_block_tokens` steps and from `cache_min_tokens` up, is
+    reported as usage.prompt_tokens_details.cached_tokens (4 chars per token).
+    """
+
+    def __init__(self, host: str = "127.0.0.1", port: int = 0, latency: float = 0.05, jitter: float = 0.0,
+                 slow_rate: float = 0.0, slow_latency: float = 2.0, error_rate: float = 0.0, responder=hold_responder, seed=None,
+                 cache_min_tokens: int = 1024, cache_block_tokens: int = 128):
+        self.host = host
+        self.port = port
+        self.latency = latency
+        self.jitter = jitter
+        self.slow_rate = slow_rate
+        self.slow_latency = slow_latency
+        self.error_rate = error_rate
+        self.responder = responder
+        self.cache_min_tokens = cache_min_tokens
+        self.cache_block_tokens = cache_block_tokens
+        self.requests = 0
+        self._prefixes = set()
+        self._rng = random.Random(seed)
+        self._loop = None
+        self._runner = None
+        self._stopped = None
+        self._thread = None
+        self._ready = threading.Event()
+
+    @property
+    def base_url(self) -> str:
+        return f"http://{self.host}:{self.port}/v1"
+
+    def _cached_tokens(self, prompt: str) -> int:
+        block = self.cache_block_tokens * 4
+        blocks = [hash(prompt[:end]) for end in range(block, len(prompt) + 1, block)]
+        cached = 0
+        for i, key in enumerate(blocks):
+            if key not in self._prefixes:
+                break
+            cached = (i + 1) * self.cache_block_tokens
+        self._prefixes.update(blocks)
+        return cached if cached >= self.cache_min_tokens else 0
+
+    async def _completions(self, request):
+        from aiohttp import web
+
+        self.requests += 1
+        try:
+            body = await request.json()
+        except (ConnectionResetError, ValueError):
+            # Client gave up (deadline or losing hedge) before sending the body
+            return web.Response(status=400)
+        prompt = "\n".join(str(m.get("content", "")) for m in body.get("messages", []))
+
+        roll = self._rng.random()
+        if roll < self.slow_rate:
+            delay = self.slow_latency
+        else:
+            delay = max(0.0, self.latency + self._rng.uniform(-self.jitter, self.jitter))
+        streaming = bool(body.get("stream"))
+        # A streamed answer spends half the latency before the first token, half generating
+        await asyncio.sleep(delay / 2 if streaming else delay)
+
+        if self._rng.random() < self.error_rate:
+            return web.json_response({"error": {"message": "injected failure", "type": "server_error"}}, status=500)
+
+        content = self.responder(prompt)
+        prompt_tokens = len(prompt) // 4
+        cached_tokens = self._cached_tokens(prompt)
+        completion_tokens = len(content) // 4
+        usage = {
+            "prompt_tokens": prompt_tokens,
+            "prompt_tokens_details": {"cached_tokens": cached_tokens},
+            "completion_tokens": completion_tokens,
+            "total_tokens": prompt_tokens + completion_tokens,
+        }
+        if streaming:
+            include_usage = bool((body.get("stream_options") or {}).get("include_usage"))
+            return await self._stream(request, body, content, delay / 2, usage if include_usage else None)
+        return web.json_response({
+            "id": f"chatcmpl-fake-{self.requests}",
+            "object": "chat.completion",
+            "created": int(time.time()),
+            "model": body.get("model", "fake"),
+            "choices": [{"index": 0, "message": {"role": "assistant", "content": content}, "finish_reason": "stop"}],
+            "usage": usage,
+        })
+
+    async def _stream(self, request, body: dict, content: str, duration: float, usage: dict | None):
+        """
+        Server-sent chat.completion.chunk events, `content` spread evenly over
+        `duration`, then the finish chunk, the usage chunk and [DONE].
+        """
+        from aiohttp import web
+
+        response = web.StreamResponse(headers={"Content-Type": "text/event-stream"})
+        await response.prepare(request)
+        base = {"id": f"chatcmpl-fake-{self.requests}", "object": "chat.completion.chunk",
+                "created": int(time.time()), "model": body.get("model", "fake")}
+        pieces = [content[i:i + 8] for i in range(0, len(content), 8)] or [""]
+        events = [{**base, "choices": [{"index": 0, "delta": {"role": "assistant", "content": piece}, "finish_reason": None}]} for piece in pieces]
+        events.append({**base, "choices": [{"index": 0, "delta": {}, "finish_reason": "stop"}]})
+        if usage is not None:
+            events.append({**base, "choices": [], "usage": usage})
+        try:
+            for i, event in enumerate(events):
+                if 0 < i < len(pieces):
+                    await asyncio.sleep(duration / len(pieces))
+                await response.write(f"data: {json.dumps(event)}\n\n".encode())
+            await response.write(b"data: [DONE]\n\n")
+        except (ConnectionResetError, asyncio.CancelledError):
+            # Client stopped reading once it had the decision
+            return response
+        return response
+
+    async def _models(self, request):
+        from aiohttp import web
+
+        return web.json_response({"object": "list", "data": [{"id": "fake", "object": "model", "owned_by": "fake"}]})
+
+    async def _serve(self):
+        from aiohttp import web
+
+        self._loop = asyncio.get_running_loop()
+        self._stopped = asyncio.Event()
+        app = web.Application()
+        app.router.add_post("/v1/chat/completions", self._completions)
+        app.router.add_get("/v1/models", self._models)
+        self._runner = web.AppRunner(app)
+        await self._runner.setup()
+        site = web.TCPSite(self._runner, self.host, self.port)
+        await site.start()
+        self.port = site._server.sockets[0].getsockname()[1]
+        self._ready.set()
+        try:
+            await self._stopped.wait()
+        finally:
+            await self._runner.cleanup()
+
+    def start(self) -> str:
+        """
+        Serves in a background thread and returns the /v1 base URL.
+        """
+        self._thread = threading.Thread(target=lambda: asyncio.run(self._serve()), name="fake-llm-server", daemon=True)
+        self._thread.start()
+        self._ready.wait(5)
+        logger.info(f"Fake LLM server listening on {self.base_url}")
+        return self.base_url
+
+    def stop(self):
+        if self._loop and self._stopped:
+            self._loop.call_soon_threadsafe(self._stopped.set)
+        if self._thread:
+            self._thread.join(5)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Fake OpenAI chat-completions server")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8800)
+    parser.add_argument("--latency", type=float, default=0.3, help="Typical response time in seconds")
+    parser.add_argument("--jitter", type=float, default=0.1)
+    parser.add_argument("--slow-rate", type=float, default=0.0, help="Fraction of requests answered slowly")
+    parser.add_argument("--slow-latency", type=float, default=5.0)
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Fraction of requests answered with HTTP 500")
+    parser.add_argument("--trade-rate", type=float, default=0.0, help="Fraction of symbols answered with SELL/CLOSE instead of HOLD")
+    parser.add_argument("--cache-min-tokens", type=int, default=1024, help="Shortest prompt prefix reported as cached")
+    args = parser.parse_args()
+
+    server = FakeLLMServer(
+        host=args.host,
+        port=args.port,
+        latency=args.latency,
+        jitter=args.jitter,
+        slow_rate=args.slow_rate,
+        slow_latency=args.slow_latency,
+        error_rate=args.error_rate,
+        responder=trading_responder(args.trade_rate) if args.trade_rate else hold_responder,
+        cache_min_tokens=args.cache_min_tokens,
+    )
+    asyncio.run(server._serve())
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,239 @@
+"""
+Fixed-schema numeric features shared by the prompt, the decision cache key,
+the local model backends and offline training dumps.
+
+Every decision context gets one float32 row of FEATURE_COLUMNS. Column order is
+part of the schema: append new columns and bump FEATURE_VERSION, never reorder,
+so saved models and dumps can tell which layout they were built on.
+"""
+import json
+import math
+import os
+import threading
+
+import numpy as np
+
+FEATURE_VERSION = 1
+
+# (name, cache-key quantum, prompt label, prompt format)
+# A quantum of None keys the value on 4 significant digits instead of a fixed step.
+_SCHEMA = (
+    ("price",          None,   "PRICE",              "{:.8g}"),
+    ("rsi",            1.0,    "RSI(14)",            "{:.2f}"),
+    ("ema_gap",        0.001,  "PRICE VS EMA(20)",   "{:+.3%}"),
+    ("vwap_gap",       0.001,  "PRICE VS VWAP",      "{:+.3%}"),
+    ("bb_position",    0.1,    "BOLLINGER POSITION", "{:+.2f} (-1 lower band, +1 upper band)"),
+    ("bb_width",       0.001,  "BOLLINGER WIDTH",    "{:.3%}"),
+    ("atr_pct",        0.0001, "ATR(14)",            "{:.3%} of price"),
+    ("volatility",     0.0001, "VOLATILITY",         "{:.4%} per bar"),
+    ("funding",        1e-5,   "FUNDING RATE",       "{:+.5%}"),
+    ("ret_1",          0.001,  "LAST BAR RETURN",    "{:+.3%}"),
+    ("ret_5",          0.001,  "5-BAR RETURN",       "{:+.3%}"),
+    ("volume_ratio",   0.25,   "VOLUME VS AVERAGE",  "{:.2f}x"),
+    ("has_position",   1.0,    None,                 None),
+    ("position_size",  None,   None,                 None),
+    ("entry_gap",      0.001,  None,                 None),
+    ("pnl_usdt",       0.1,    None,                 None),
+    ("required_size",  None,   None,                 None),
+    ("allow_sell",     1.0,    None,                 None),
+    ("allow_close",    1.0,    None,                 None),
+)
+
+FEATURE_COLUMNS = tuple(c[0] for c in _SCHEMA)
+COLUMN_INDEX = {name: i for i, name in enumerate(FEATURE_COLUMNS)}
+N_FEATURES = len(FEATURE_COLUMNS)
+_QUANTA = tuple(c[1] for c in _SCHEMA)
+_MARKET_LINES = tuple((i, c[2], c[3]) for i, c in enumerate(_SCHEMA) if c[2])
+
+
+def _column(values, default: float = 0.0) -> np.ndarray:
+    out = np.empty(len(values), dtype=np.float64)
+    for i, value in enumerate(values):
+        try:
+            out[i] = float(value)
+        except (TypeError, ValueError):
+            out[i] = default
+    return np.where(np.isfinite(out), out, default)
+
+
+def _gap(price: np.ndarray, reference: np.ndarray) -> np.ndarray:
+    valid = (price > 0) & (reference > 0)
+    return np.where(valid, price / np.where(valid, reference, 1.0) - 1.0, 0.0)
+
+
+def build_feature_matrix(contexts: list) -> np.ndarray:
+    """
+    One float32 row per context, columns in FEATURE_COLUMNS order, computed
+    column-wise across all contexts at once. Missing or non-finite inputs
+    become neutral values (RSI 50, zero gaps, volume ratio 1).
+    """
+    markets = [c.get("market") or {} for c in contexts]
+    positions = [c.get("position") or {} for c in contexts]
+    constraints = [c.get("constraints") or {} for c in contexts]
+
+    def market(key, default=0.0):
+        return _column([m.get(key) for m in markets], default)
+
+    price = market("price")
+    upper = market("bb_upper")
+    lower = market("bb_lower")
+    half_band = (upper - lower) / 2
+    band_ok = (half_band > 0) & (price > 0)
+    bb_position = np.where(band_ok, (price - (upper + lower) / 2) / np.where(band_ok, half_band, 1.0), 0.0)
+    safe_price = np.where(price > 0, price, 1.0)
+
+    has_position = np.array([1.0 if p else 0.0 for p in positions])
+    allowed = [c.get("allowed_actions") or () for c in constraints]
+
+    columns = {
+        "price": price,
+        "rsi": market("rsi", 50.0),
+        "ema_gap": _gap(price, market("ema")),
+        "vwap_gap": _gap(price, market("vwap")),
+        "bb_position": np.clip(bb_position, -3.0, 3.0),
+        "bb_width": np.where(price > 0, (upper - lower) / safe_price, 0.0),
+        "atr_pct": np.where(price > 0, market("atr") / safe_price, 0.0),
+        "volatility": market("volatility"),
+        "funding": market("funding"),
+        "ret_1": market("ret_1"),
+        "ret_5": market("ret_5"),
+        "volume_ratio": market("volume_ratio", 1.0),
+        "has_position": has_position,
+        "position_size": _column([p.get("size") for p in positions]) * has_position,
+        "entry_gap": _gap(price, _column([p.get("entry_price") for p in positions])) * has_position,
+        "pnl_usdt": _column([p.get("pnl_usdt") for p in positions]) * has_position,
+        "required_size": _column([c.get("required_size") for c in constraints]),
+        "allow_sell": np.array([1.0 if "SELL" in a else 0.0 for a in allowed]),
+        "allow_close": np.array([1.0 if "CLOSE" in a else 0.0 for a in allowed]),
+    }
+    matrix = np.empty((len(contexts), N_FEATURES), dtype=np.float32)
+    for name, i in COLUMN_INDEX.items():
+        matrix[:, i] = columns[name]
+    return matrix
+
+
+def attach_features(contexts: list) -> list:
+    """
+    Computes the feature rows for all contexts in one batch and stores each
+    under context["features"]. Returns the contexts.
+    """
+    if contexts:
+        matrix = build_feature_matrix(contexts)
+        for context, row in zip(contexts, matrix):
+            context["features"] = row
+    return contexts
+
+
+def get_features(context: dict) -> np.ndarray:
+    """
+    The context's feature row, computed (and attached) if missing.
+    """
+    row = context.get("features")
+    if not isinstance(row, np.ndarray) or row.shape != (N_FEATURES,):
+        row = attach_features([context])[0]["features"]
+    return row
+
+
+def _sig(value: float, digits: int = 4):
+    if value == 0 or not math.isfinite(value):
+        return value
+    return round(value, digits - 1 - int(math.floor(math.log10(abs(value)))))
+
+
+def quantize_features(row: np.ndarray) -> tuple:
+    """
+    Cache-key form of a feature row: fixed-step buckets per column, or 4
+    significant digits for price/size columns.
+    """
+    return tuple(
+        _sig(float(v)) if q is None else int(round(float(v) / q))
+        for v, q in zip(row, _QUANTA)
+    )
+
+
+def feature_dict(row: np.ndarray) -> dict:
+    """
+    JSON-friendly {column: value} view of a row, for logs.
+    """
+    return {"version": FEATURE_VERSION, **{name: round(float(v), 8) for name, v in zip(FEATURE_COLUMNS, row)}}
+
+
+def loggable_context(context: dict) -> dict:
+    """
+    Context copy with the feature row turned into a dict, safe to serialise.
+    """
+    row = context.get("features")
+    if not isinstance(row, np.ndarray):
+        return context
+    return {**context, "features": feature_dict(row)}
+
+
+def market_lines(row: np.ndarray) -> list:
+    """
+    [(column, prompt line)] for the market block, in schema order.
+    """
+    return [(FEATURE_COLUMNS[i], f"- {label}: {fmt.format(float(row[i]))}") for i, label, fmt in _MARKET_LINES]
+
+
+def describe_market(row: np.ndarray) -> str:
+    """
+    Market block of the prompt, rendered from the feature row.
+    """
+    return "\n".join(line for _, line in market_lines(row))
+
+
+def describe_position(row: np.ndarray, side=None) -> str:
+    if not row[COLUMN_INDEX["has_position"]]:
+        return "None"
+    return (
+        f"Side: {side or 'SHORT'}, Size: {float(row[COLUMN_INDEX['position_size']]):.8g}, "
+        f"Price vs Entry: {float(row[COLUMN_INDEX['entry_gap']]):+.3%}, "
+        f"UnrealizedPnL: {float(row[COLUMN_INDEX['pnl_usdt']]):.4f}"
+    )
+
+
+_dump_lock = threading.Lock()
+
+
+def append_feature_dump(path: str, contexts: list, decisions: list):
+    """
+    Appends one JSONL record per decided context (feature row, symbol, candle
+    time, action, model) for offline training.
+    """
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    lines = []
+    for context, decision in zip(contexts, decisions):
+        market = context.get("market") or {}
+        lines.append(json.dumps({
+            "version": FEATURE_VERSION,
+            "symbol": market.get("symbol"),
+            "candle_time": market.get("candle_time"),
+            "features": [round(float(v), 8) for v in get_features(context)],
+            "action": decision.get("action"),
+            "confidence": decision.get("confidence"),
+            "model": (decision.get("ai_log") or {}).get("model"),
+        }))
+    with _dump_lock, open(path, "a") as f:
+        f.write("\n".join(lines) + "\n")
+
+
+def load_feature_dump(path: str) -> tuple:
+    """
+    Reads a dump written by append_feature_dump().
+    Returns (X float32 [n, N_FEATURES], records without "features"); records
+    from other feature versions are skipped.
+    """
+    rows, records = [], []
+    with open(path) as f:
+        for line in f:
+            try:
+                record = json.loads(line)
+            except ValueError:
+                continue
+            if record.get("version") != FEATURE_VERSION:
+                continue
+            rows.append(record.pop("features"))
+            records.append(record)
+    return np.asarray(rows, dtype=np.float32).reshape(-1, N_FEATURES), records
@@ -1,47 +1,144 @@
-import json
 
+from ai.backends import get_backend
+from ai.feature import loggable_context
+from ai.json_stream import parse_json_response
 from ai.llm_client import call_llm
-from ai.schema import DecisionSchema
+from ai.schema import validate_decision
+from config.settings import INFERENCE_BACKEND, INFERENCE_FALLBACK_BACKEND, INFERENCE_MODEL_PATH
 from utils.logger import get_logger
 
 logger = get_logger("AI_INFERENCE")
 
-from ai.prompt import build_prompt
+from ai.prompt import build_batch_prompt
 
 def run_inference(context: dict) -> dict:
     """
-    Calls LLM with provided context and validates against schema.
+    Decides one symbol with the configured backend and validates against schema.
+    When the LLM cannot answer (deadline missed, API error) the local fallback
+    backend decides instead, if one is configured.
     """
-    # 1. Build Prompt
-    prompt_text = build_prompt(context)
+    backend = get_backend(INFERENCE_BACKEND, INFERENCE_MODEL_PATH)
+    try:
+        result = backend.decide(context)
+    except RuntimeError as e:
+        fallback = _fallback_backend(backend)
+        if fallback is None:
+            raise
+        return _run_fallback(fallback, context, e)
+
+    _check_allowed(result, context)
+    return _attach_ai_log(result, context, backend.model)
+
+def run_batch_inference(contexts: list) -> list:
+    """
+    Decides several symbols with one LLM call.
+    Returns a list aligned with contexts holding either a validated decision
+    (with its own ai_log) or the Exception raised for that symbol. Symbols the
+    batch answer misses or gets wrong are retried with run_inference; if the
+    batch call itself fails, the local fallback backend decides them all.
+    Local backends are fast enough that they simply decide symbol by symbol.
+    """
+    if not contexts:
+        return []
 
-    # 2. Call LLM
+    backend = get_backend(INFERENCE_BACKEND, INFERENCE_MODEL_PATH)
+    if backend.local:
+        return [_safe(run_inference, context) for context in contexts]
+
+    results = [None] * len(contexts)
+    entries = {}
     try:
-        raw_response = call_llm(prompt_text)
+        raw_response = call_llm(build_batch_prompt(contexts))
     except Exception as e:
-        raise RuntimeError(f"LLM call failed: {e}")
+        fallback = _fallback_backend(backend)
+        if fallback is not None:
+            return [_safe(_run_fallback, fallback, context, e) for context in contexts]
+        logger.error(f"Batch inference failed, falling back per symbol: {e}")
+    else:
+        try:
+            data = parse_json_response(raw_response)
+            if isinstance(data, dict):
+                data = data.get("decisions", [data])
+            entries = {
+                str(item.get("symbol")): item
+                for item in data
+                if isinstance(item, dict) and item.get("symbol")
+            }
+        except Exception as e:
+            logger.error(f"Batch inference failed, falling back per symbol: {e}")
+
+    for i, context in enumerate(contexts):
+        symbol = context.get("market", {}).get("symbol")
+        entry = entries.get(str(symbol))
+        if entry is not None:
+            try:
+                decision = {k: v for k, v in entry.items() if k != "symbol"}
+                result = validate_decision(decision)
+                _check_allowed(result, context)
+                results[i] = _attach_ai_log(result, context, backend.model)
+                continue
+            except Exception as e:
+                logger.warning(f"Batch decision for {symbol} rejected: {e}")
+
+        logger.info(f"Falling back to single-symbol inference for {symbol}")
+        results[i] = _safe(run_inference, context)
+
+    return results
+
+def set_inference_backend(name: str, model_path: str | None = None, fallback: str | None = None):
+    """
+    Overrides the settings.yaml backend choice at runtime (e.g. for backtests).
+    """
+    global INFERENCE_BACKEND, INFERENCE_MODEL_PATH, INFERENCE_FALLBACK_BACKEND
+    get_backend(name, model_path if model_path is not None else INFERENCE_MODEL_PATH)
+    INFERENCE_BACKEND = name
+    if model_path is not None:
+        INFERENCE_MODEL_PATH = model_path
+    if fallback is not None:
+        INFERENCE_FALLBACK_BACKEND = fallback
+
+def uses_llm() -> bool:
+    """
+    True when the configured backend calls the LLM endpoint.
+    """
+    return not get_backend(INFERENCE_BACKEND, INFERENCE_MODEL_PATH).local
 
-    # 3. Parse & Validate
+def _fallback_backend(backend):
+    if backend.local or not INFERENCE_FALLBACK_BACKEND or INFERENCE_FALLBACK_BACKEND == backend.name:
+        return None
     try:
-        # Assuming LLM returns standard markdown code block or plain JSON
-        cleaned_json = raw_response.replace("```json", "").replace("```", "").strip()
-        data = json.loads(cleaned_json)
-        
-        # Validation
-        validated = DecisionSchema(**data)
-        result = validated.model_dump() # Pydantic v2
-        
-        # Attach Metadata for logging
-        result["ai_log"] = {
-            "stage": "Decision Making",
-            "model": "gpt-4o-mini",
-            "input": context, # Pass full dict
-            "output": result.copy(), # Pass full dict
-            "explanation": result.get("reason", "")
-        }
-        
-        return result
+        return get_backend(INFERENCE_FALLBACK_BACKEND, INFERENCE_MODEL_PATH)
+    except Exception as e:
+        logger.error(f"Fallback backend '{INFERENCE_FALLBACK_BACKEND}' unavailable: {e}")
+        return None
+
+def _run_fallback(fallback, context: dict, error: Exception) -> dict:
+    symbol = context.get("market", {}).get("symbol")
+    logger.warning(f"LLM unavailable for {symbol} ({error}); deciding with {fallback.model}")
+    result = fallback.decide(context)
+    _check_allowed(result, context)
+    # Degraded answer: the decision cache must not serve it in place of the LLM
+    result["fallback"] = True
+    return _attach_ai_log(result, context, fallback.model, note=f"[fallback: {error}] ")
+
+def _check_allowed(result: dict, context: dict):
+    allowed_actions = context.get("constraints", {}).get("allowed_actions")
+    if allowed_actions and result["action"] not in allowed_actions:
+        raise ValueError(f"action {result['action']} not in {allowed_actions}")
 
+def _safe(fn, *args):
+    try:
+        return fn(*args)
     except Exception as e:
-        logger.error(f"Validation failed: {e}. Raw: {raw_response}")
-        raise ValueError(f"Invalid AI response: {e}")
+        return e
+
+def _attach_ai_log(result: dict, context: dict, model: str, note: str = "") -> dict:
+    # Attach Metadata for logging
+    result["ai_log"] = {
+        "stage": "Decision Making",
+        "model": model,
+        "input": loggable_context(context), # Pass full dict
+        "output": result.copy(), # Pass full dict
+        "explanation": note + result.get("reason", "")
+    }
+    return result
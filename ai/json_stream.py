@@ -0,0 +1,109 @@
+"""
+Incremental extraction of the JSON value in an LLM answer, fed as it streams.
+"""
+import json
+
+
+class JSONStreamParser:
+    """
+    Finds the first top-level JSON object or array in text fed chunk by chunk.
+    Anything before it (prose, a ```json fence) is skipped and anything after
+    its closing bracket is ignored, so a stream can be cut as soon as `done`.
+
+    For an object, each top-level member with a scalar value is decoded as
+    soon as it is complete and passed to on_field(key, value): "action" and
+    "leverage" are known while "reason" is still being generated.
+    """
+
+    def __init__(self, on_field=None):
+        self.on_field = on_field
+        self.fields = {}
+        self.value = None
+        self.done = False
+        self._text = ""
+        self._pos = 0
+        self._start = None
+        self._depth = 0
+        self._in_string = False
+        self._escape = False
+        self._member_start = None
+
+    def feed(self, chunk: str) -> bool:
+        """
+        Consumes `chunk`; returns True once the value is complete (then
+        `value` holds it). Raises ValueError if the completed text is not JSON.
+        """
+        if self.done or not chunk:
+            return self.done
+        self._text += chunk
+        text = self._text
+        for i in range(self._pos, len(text)):
+            char = text[i]
+            if self._start is None:
+                if char in "{[":
+                    self._start = i
+                    self._depth = 1
+                    self._member_start = i + 1 if char == "{" else None
+                continue
+            if self._in_string:
+                if self._escape:
+                    self._escape = False
+                elif char == "\\":
+                    self._escape = True
+                elif char == '"':
+                    self._in_string = False
+                continue
+            if char == '"':
+                self._in_string = True
+            elif char in "{[":
+                self._depth += 1
+            elif char in "}]":
+                self._depth -= 1
+                if self._depth == 0:
+                    self._member_done(i)
+                    self._pos = i + 1
+                    self.value = json.loads(text[self._start:i + 1])
+                    self.done = True
+                    return True
+            elif char == "," and self._depth == 1:
+                self._member_done(i)
+                self._member_start = i + 1
+        self._pos = len(text)
+        return False
+
+    @property
+    def text(self) -> str:
+        """
+        The JSON text consumed so far (the whole value once done).
+        """
+        if self._start is None:
+            return ""
+        return self._text[self._start:self._pos]
+
+    def _member_done(self, end: int):
+        if self._member_start is None:
+            return
+        member = self._text[self._member_start:end]
+        _, sep, value = member.partition(":")
+        value = value.strip()
+        if not sep or not value or value[0] in "{[":
+            return
+        try:
+            decoded = json.loads(f"{{{member}}}")
+        except ValueError:
+            return
+        for key, value in decoded.items():
+            self.fields[key] = value
+            if self.on_field is not None:
+                self.on_field(key, value)
+
+
+def parse_json_response(raw: str):
+    """
+    The first JSON object or array in a complete answer, ignoring fences and
+    surrounding prose.
+    """
+    parser = JSONStreamParser()
+    if not parser.feed(raw):
+        raise ValueError("No complete JSON value in response")
+    return parser.value
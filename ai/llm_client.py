@@ -1,21 +1,438 @@
-import os
-from openai import OpenAI
+import asyncio
+import bisect
+import threading
+import time
 
-# Initialize client once
-client = OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
+from config.settings import (
+    LLM_MODEL,
+    LLM_BASE_URL,
+    LLM_TEMPERATURE,
+    LLM_TIMEOUT_SEC,
+    LLM_MAX_CONCURRENCY,
+    LLM_MAX_RETRIES,
+    LLM_HEDGE_ENABLED,
+    LLM_HEDGE_MIN_SAMPLES,
+    LLM_STREAM,
+)
+from ai.json_stream import JSONStreamParser
+from utils.logger import get_logger
+from utils.metrics import metrics, timed
 
-def call_llm(prompt: str) -> str:
+logger = get_logger("LLM_CLIENT")
+
+
+class LLMTimeoutError(RuntimeError):
     """
-    Calls OpenAI GPT-4o-mini with the given prompt.
-    Uses the new v1.0+ client syntax.
+    Raised when a completion misses its deadline (retries and hedges included).
     """
-    try:
-        response = client.chat.completions.create(
-            model="gpt-4o-mini",
+
+
+class LatencyHistogram:
+    """
+    Fixed-bucket latency histogram; quantiles are bucket upper bounds.
+    """
+
+    BOUNDS_MS = (50, 100, 200, 300, 500, 750, 1000, 1500, 2000, 3000, 5000, 7500, 10000, 15000, 20000, 30000, 60000)
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.counts = [0] * (len(self.BOUNDS_MS) + 1)
+        self.count = 0
+        self.total_ms = 0.0
+        self.max_ms = 0.0
+
+    def observe(self, seconds: float):
+        elapsed_ms = seconds * 1000
+        with self._lock:
+            self.counts[bisect.bisect_left(self.BOUNDS_MS, elapsed_ms)] += 1
+            self.count += 1
+            self.total_ms += elapsed_ms
+            self.max_ms = max(self.max_ms, elapsed_ms)
+
+    def quantile(self, q: float) -> float | None:
+        """
+        Latency in seconds under which a fraction q of the calls completed.
+        """
+        with self._lock:
+            if not self.count:
+                return None
+            rank = q * self.count
+            seen = 0
+            for i, n in enumerate(self.counts):
+                seen += n
+                if seen >= rank:
+                    bound = self.BOUNDS_MS[i] if i < len(self.BOUNDS_MS) else self.max_ms
+                    return min(bound, self.max_ms) / 1000
+            return self.max_ms / 1000
+
+    def snapshot(self) -> dict:
+        quantiles = {f"p{int(q * 100)}_ms": round((self.quantile(q) or 0.0) * 1000, 1) for q in (0.5, 0.95, 0.99)}
+        with self._lock:
+            return {
+                "count": self.count,
+                "avg_ms": round(self.total_ms / self.count, 1) if self.count else 0.0,
+                "max_ms": round(self.max_ms, 1),
+                **quantiles,
+                "buckets": {
+                    (f"le_{b}" if i < len(self.BOUNDS_MS) else "inf"): n
+                    for i, (b, n) in enumerate(zip(self.BOUNDS_MS + (None,), self.counts))
+                },
+            }
+
+
+class LLMClient:
+    """
+    Chat-completions client with per-call deadlines, bounded concurrency and
+    hedged requests.
+
+    All requests run on one background event loop, so the HTTP connection pool
+    is shared by every caller: threads use complete(), coroutines use
+    complete_async(). Once `hedge_min_samples` calls have been observed, a
+    request still pending after the running p95 latency gets a duplicate and
+    whichever answers first wins; the loser is cancelled. With `stream`, a
+    call returns as soon as the answer's JSON value is complete.
+    """
+
+    def __init__(
+        self,
+        model=LLM_MODEL,
+        api_key=None,
+        base_url=LLM_BASE_URL,
+        temperature=LLM_TEMPERATURE,
+        timeout=LLM_TIMEOUT_SEC,
+        max_concurrency=LLM_MAX_CONCURRENCY,
+        max_retries=LLM_MAX_RETRIES,
+        hedge=LLM_HEDGE_ENABLED,
+        hedge_min_samples=LLM_HEDGE_MIN_SAMPLES,
+        backoff_factor=0.5,
+        stream=LLM_STREAM,
+    ):
+        self.model = model
+        self.api_key = api_key
+        self.base_url = base_url or None
+        self.temperature = temperature
+        self.timeout = float(timeout)
+        self.max_concurrency = max(1, int(max_concurrency))
+        self.max_retries = max(0, int(max_retries))
+        self.hedge = hedge
+        self.hedge_min_samples = hedge_min_samples
+        self.backoff_factor = backoff_factor
+        self.stream = stream
+        self.latency = LatencyHistogram()
+        self.usage = {
+            "requests": 0,
+            "errors": 0,
+            "retries": 0,
+            "timeouts": 0,
+            "hedged": 0,
+            "hedge_wins": 0,
+            "streamed": 0,
+            "early_stops": 0,
+            "prompt_tokens": 0,
+            "cached_tokens": 0,
+            "cache_hits": 0,
+            "usage_reports": 0,
+            "completion_tokens": 0,
+            "total_tokens": 0,
+        }
+        self._usage_lock = threading.Lock()
+        self._client = None
+        self._semaphore = None
+        self._loop = None
+        self._thread = None
+        self._loop_lock = threading.Lock()
+        self._drains = set()
+
+    def _ensure_loop(self):
+        with self._loop_lock:
+            if self._loop is None or self._loop.is_closed():
+                self._loop = asyncio.new_event_loop()
+                self._thread = threading.Thread(target=self._loop.run_forever, name="llm-client", daemon=True)
+                self._thread.start()
+            return self._loop
+
+    def _get_client(self):
+        # Created on the client's own loop; max_retries=0 because retries are ours.
+        # openai takes ~1s to import, so it is only loaded here, on first use.
+        if self._client is None:
+            from openai import AsyncOpenAI
+            self._client = AsyncOpenAI(api_key=self.api_key, base_url=self.base_url, timeout=self.timeout, max_retries=0)
+            self._semaphore = asyncio.Semaphore(self.max_concurrency)
+        return self._client
+
+    def _count(self, key: str, n: int = 1):
+        with self._usage_lock:
+            self.usage[key] += n
+
+    def complete(self, prompt: str, timeout: float | None = None, on_field=None) -> str:
+        """
+        Blocking completion; safe to call from any thread.
+        When streaming, the answer is returned as soon as its JSON value is
+        complete, and on_field(key, value) is called for each top-level field
+        as it completes. on_field runs on the client's loop and must not block.
+        """
+        future = asyncio.run_coroutine_threadsafe(self._complete(prompt, timeout, on_field), self._ensure_loop())
+        return future.result()
+
+    async def complete_async(self, prompt: str, timeout: float | None = None, on_field=None) -> str:
+        loop = self._ensure_loop()
+        if asyncio.get_running_loop() is loop:
+            return await self._complete(prompt, timeout, on_field)
+        return await asyncio.wrap_future(asyncio.run_coroutine_threadsafe(self._complete(prompt, timeout, on_field), loop))
+
+    async def _complete(self, prompt: str, timeout: float | None, on_field=None) -> str:
+        deadline = float(timeout or self.timeout)
+        try:
+            return await asyncio.wait_for(self._complete_with_retries(prompt, on_field), deadline)
+        except asyncio.TimeoutError:
+            self._count("timeouts")
+            raise LLMTimeoutError(f"LLM call exceeded {deadline:g}s deadline")
+
+    async def _complete_with_retries(self, prompt: str, on_field=None) -> str:
+        from openai import APIConnectionError, APIStatusError, APITimeoutError
+        for attempt in range(self.max_retries + 1):
+            try:
+                return await self._hedged(prompt, on_field)
+            except (APIConnectionError, APITimeoutError, APIStatusError) as e:
+                retryable = not isinstance(e, APIStatusError) or e.status_code == 429 or e.status_code >= 500
+                if not retryable or attempt == self.max_retries:
+                    raise
+                self._count("retries")
+                delay = self.backoff_factor * (2 ** attempt)
+                logger.warning(f"LLM call failed ({e}); retrying in {delay:.2f}s")
+                await asyncio.sleep(delay)
+
+    def warm_up(self, timeout: float = 5.0) -> bool:
+        """
+        Loads the SDK and opens a pooled connection to the endpoint (GET /models)
+        ahead of the first completion. Any HTTP answer counts as reachable.
+        """
+        future = asyncio.run_coroutine_threadsafe(self._warm_up(timeout), self._ensure_loop())
+        return future.result()
+
+    async def _warm_up(self, timeout: float) -> bool:
+        from openai import APIStatusError
+        client = self._get_client()
+        try:
+            await asyncio.wait_for(client.models.list(), timeout)
+        except APIStatusError:
+            pass
+        except Exception as e:
+            logger.warning(f"LLM warm-up failed: {e}")
+            return False
+        return True
+
+    def hedge_delay(self) -> float | None:
+        if not self.hedge or self.latency.count < self.hedge_min_samples:
+            return None
+        return self.latency.quantile(0.95)
+
+    async def _hedged(self, prompt: str, on_field=None) -> str:
+        first = asyncio.ensure_future(self._attempt(prompt, on_field))
+        hedge_after = self.hedge_delay()
+        if hedge_after is None:
+            return await first
+
+        done, _ = await asyncio.wait({first}, timeout=hedge_after)
+        if done:
+            return first.result()
+
+        self._count("hedged")
+        second = asyncio.ensure_future(self._attempt(prompt, on_field))
+        pending = {first, second}
+        error = None
+        try:
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.exception() is None:
+                        if task is second:
+                            self._count("hedge_wins")
+                        return task.result()
+                    error = task.exception()
+            raise error
+        finally:
+            for task in (first, second):
+                if not task.done():
+                    task.cancel()
+
+    async def _attempt(self, prompt: str, on_field=None) -> str:
+        client = self._get_client()
+        async with self._semaphore:
+            self._count("requests")
+            start = time.perf_counter()
+            try:
+                if self.stream:
+                    content = await self._stream(client, prompt, on_field)
+                else:
+                    response = await client.chat.completions.create(
+                        model=self.model,
+                        messages=[{"role": "user", "content": prompt}],
+                        temperature=self.temperature,
+                    )
+                    self._record_usage(getattr(response, "usage", None))
+                    content = response.choices[0].message.content
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                self._count("errors")
+                raise
+            self.latency.observe(time.perf_counter() - start)
+        return content
+
+    async def _stream(self, client, prompt: str, on_field=None) -> str:
+        """
+        Reads a streamed completion until its JSON value is complete. The rest
+        of the stream is left to _drain(); text that is not JSON is read to
+        the end and returned whole for the caller's parser to reject.
+        """
+        self._count("streamed")
+        stream = await client.chat.completions.create(
+            model=self.model,
             messages=[{"role": "user", "content": prompt}],
-            temperature=0.2
+            temperature=self.temperature,
+            stream=True,
+            stream_options={"include_usage": True},
         )
-        return response.choices[0].message.content
+        parser = JSONStreamParser(on_field=on_field)
+        parts = []
+        try:
+            async for chunk in stream:
+                self._record_usage(chunk.usage)
+                delta = chunk.choices[0].delta.content if chunk.choices else None
+                if not delta:
+                    continue
+                parts.append(delta)
+                if parser is None:
+                    continue
+                try:
+                    done = parser.feed(delta)
+                except ValueError:
+                    parser = None
+                    continue
+                if done:
+                    drain = asyncio.ensure_future(self._drain(stream))
+                    self._drains.add(drain)
+                    drain.add_done_callback(self._drains.discard)
+                    stream = None
+                    return parser.text
+        finally:
+            if stream is not None:
+                await stream.close()
+        return "".join(parts)
+
+    async def _drain(self, stream):
+        """
+        After the decision: collects the usage chunk, but closes the stream
+        (ending generation) if the model keeps writing text.
+        """
+        try:
+            async for chunk in stream:
+                self._record_usage(chunk.usage)
+                if chunk.choices and chunk.choices[0].delta.content:
+                    self._count("early_stops")
+                    break
+        except Exception:
+            pass
+        finally:
+            await stream.close()
+
+    def _record_usage(self, usage):
+        if usage is None:
+            return
+        # Prompt tokens the provider served from its prefix cache
+        details = getattr(usage, "prompt_tokens_details", None)
+        cached = (getattr(details, "cached_tokens", None) or 0) if details is not None else 0
+        with self._usage_lock:
+            self.usage["prompt_tokens"] += usage.prompt_tokens or 0
+            self.usage["cached_tokens"] += cached
+            self.usage["cache_hits"] += 1 if cached else 0
+            self.usage["usage_reports"] += 1
+            self.usage["completion_tokens"] += usage.completion_tokens or 0
+            self.usage["total_tokens"] += usage.total_tokens or 0
+            hit_rate = self.usage["cache_hits"] / self.usage["usage_reports"]
+        metrics.inc("llm_prefix_cache_total", outcome="hit" if cached else "miss")
+        metrics.set("llm_prefix_cache_hit_rate", hit_rate)
+        metrics.inc("llm_tokens_total", usage.prompt_tokens or 0, kind="prompt")
+        metrics.inc("llm_tokens_total", cached, kind="cached")
+        metrics.inc("llm_tokens_total", usage.completion_tokens or 0, kind="completion")
+
+    def stats(self) -> dict:
+        with self._usage_lock:
+            usage = dict(self.usage)
+        reports = usage["usage_reports"]
+        return {
+            "model": self.model,
+            "latency": self.latency.snapshot(),
+            "usage": usage,
+            "prefix_cache": {
+                "hit_rate": round(usage["cache_hits"] / reports, 3) if reports else 0.0,
+                "cached_token_share": round(usage["cached_tokens"] / usage["prompt_tokens"], 3) if usage["prompt_tokens"] else 0.0,
+            },
+        }
+
+    def close(self):
+        loop = self._loop
+        if loop is None or loop.is_closed():
+            return
+        if self._client is not None:
+            asyncio.run_coroutine_threadsafe(self._client.close(), loop).result(5)
+            self._client = None
+        loop.call_soon_threadsafe(loop.stop)
+        self._thread.join(5)
+        loop.close()
+
+
+_default_client = None
+_default_lock = threading.Lock()
+
+
+def get_llm_client() -> LLMClient:
+    """
+    Process-wide client, created on first use.
+    """
+    global _default_client
+    with _default_lock:
+        if _default_client is None:
+            _default_client = LLMClient()
+        return _default_client
+
+
+def set_llm_client(client: LLMClient | None) -> LLMClient | None:
+    """
+    Replaces the process-wide client (e.g. with one pointed at a fake server).
+    Returns the previous client; None resets to a settings-built client.
+    """
+    global _default_client
+    with _default_lock:
+        previous, _default_client = _default_client, client
+        return previous
+
+
+@timed("llm_call_seconds")
+def call_llm(prompt: str, timeout: float | None = None, on_field=None) -> str:
+    """
+    Calls the configured chat model (gpt-4o-mini by default) with the given prompt.
+    Raises LLMTimeoutError when the deadline is missed, RuntimeError otherwise.
+    """
+    try:
+        return get_llm_client().complete(prompt, timeout, on_field)
+    except LLMTimeoutError:
+        raise
     except Exception as e:
         # Re-raise to be caught by decision_engine's fallback logic
         raise RuntimeError(f"OpenAI API call failed: {e}")
+
+
+@timed("llm_call_seconds")
+async def call_llm_async(prompt: str, timeout: float | None = None, on_field=None) -> str:
+    try:
+        return await get_llm_client().complete_async(prompt, timeout, on_field)
+    except LLMTimeoutError:
+        raise
+    except Exception as e:
+        raise RuntimeError(f"OpenAI API call failed: {e}")
+
+
+def llm_stats() -> dict:
+    return get_llm_client().stats()
@@ -1,32 +1,140 @@
-from config.settings import ALLOWED_SYMBOLS, MAX_LEVERAGE, MAX_RISK_PER_TRADE_PCT, TRADE_NOTIONAL_USDT, TAKE_PROFIT_USDT, STOP_LOSS_USDT
+"""
+Decision prompts as a byte-identical static prefix plus a compact per-call
+suffix.
 
-def build_prompt(context: dict) -> str:
+Everything that does not change between calls (role, rules, limits, output
+format) lives in the prefix, built once from settings; symbol, market block,
+account, position, allowed actions and required size go in the suffix at the
+end. Providers that cache prompt prefixes (OpenAI caches from 1024 tokens in
+128-token steps) then only bill and process the suffix anew.
+
+Neither prefix reaches that minimum today (about 560 tokens single, 600
+batch), so on OpenAI the split does not earn cache hits yet; it pays off on
+providers with a lower minimum or once the static rules grow. Each template
+reports whether it is `cacheable` and warns once on first use when it is not;
+actual hits are read from the provider's usage (LLMClient.stats()
+"prefix_cache" and the llm_prefix_cache_hit_rate metric).
+
+Each symbol's suffix is held to PROMPT_SYMBOL_TOKEN_BUDGET tokens by dropping
+market lines in reverse MARKET_PRIORITY order. Tokens are counted with
+tiktoken when it is installed, otherwise estimated.
+"""
+import math
+import re
+import threading
+from functools import cached_property
+
+from ai.feature import describe_position, get_features, market_lines
+from config.settings import (
+    ALLOWED_SYMBOLS,
+    LLM_MODEL,
+    MAX_LEVERAGE,
+    MAX_RISK_PER_TRADE_PCT,
+    PROMPT_SYMBOL_TOKEN_BUDGET,
+    STOP_LOSS_USDT,
+    TAKE_PROFIT_USDT,
+    TRADE_NOTIONAL_USDT,
+)
+from utils.logger import get_logger
+from utils.metrics import metrics
+
+logger = get_logger("PROMPT")
+
+# Shortest prompt prefix OpenAI caches; shorter prefixes never produce hits
+PROVIDER_CACHE_MIN_TOKENS = 1024
+
+# Market lines kept first when a suffix is over budget; the tail is dropped first
+MARKET_PRIORITY = (
+    "price", "rsi", "ema_gap", "atr_pct", "funding", "ret_1", "ret_5",
+    "volatility", "vwap_gap", "bb_position", "bb_width", "volume_ratio",
+)
+
+_WORD = re.compile(r"[A-Za-z]+|\d+|[^\sA-Za-z\d]")
+_encoding = None
+_encoding_lock = threading.Lock()
+
+
+def count_tokens(text: str) -> int:
     """
-    Constructs the exact system prompt required for the WEEX AI Wars competition.
+    Tokens in `text` for LLM_MODEL (tiktoken), or an estimate without it:
+    ~4 letters or 3 digits per token, one per symbol.
     """
-    
-    market = context.get("market", {})
-    account = context.get("account", {})
-    position = context.get("position", {})
-    constraints = context.get("constraints", {})
+    global _encoding
+    if _encoding is None:
+        with _encoding_lock:
+            if _encoding is None:
+                _encoding = _load_encoding()
+    if _encoding is not False:
+        return len(_encoding.encode(text))
+    return sum(
+        math.ceil(len(w) / 4) if w[0].isalpha() else math.ceil(len(w) / 3) if w[0].isdigit() else 1
+        for w in _WORD.findall(text)
+    )
 
-    # Format market data into a readable string
-    market_text = "\n".join([f"- {k.upper()}: {v}" for k, v in market.items()])
-
-    # Format account data
-    account_text = f"Equity: {account.get('equity', 0)}, Balance: {account.get('balance', 0)}"
-    position_text = "None"
-    if position:
-        position_text = (
-            f"Side: {position.get('side')}, Entry: {position.get('entry_price')}, "
-            f"Size: {position.get('size')}, UnrealizedPnL: {position.get('pnl_usdt')}"
-        )
-    allowed_actions = constraints.get("allowed_actions", ["SELL", "HOLD"])
-    required_size = constraints.get("required_size")
 
-    return f"""🔒 SYSTEM PROMPT — PROFIT-ORIENTED AI TRADER (WEEX COMPETITION)
+def _load_encoding():
+    try:
+        import tiktoken
+    except ImportError:
+        return False
+    try:
+        return tiktoken.encoding_for_model(LLM_MODEL)
+    except KeyError:
+        return tiktoken.get_encoding("o200k_base")
 
-You are a professional crypto futures trader AI competing in a live trading competition.
+
+class PromptTemplate:
+    """
+    A static prefix and per-call token accounting.
+    """
+
+    def __init__(self, name: str, prefix: str):
+        self.name = name
+        self.prefix = prefix
+        self.calls = 0
+        self.suffix_tokens = 0
+        self.trimmed_lines = 0
+        self._lock = threading.Lock()
+
+    @cached_property
+    def prefix_tokens(self) -> int:
+        return count_tokens(self.prefix)
+
+    @property
+    def cacheable(self) -> bool:
+        return self.prefix_tokens >= PROVIDER_CACHE_MIN_TOKENS
+
+    def render(self, suffix: str, suffix_tokens: int, trimmed_lines: int = 0) -> str:
+        with self._lock:
+            first = self.calls == 0
+            self.calls += 1
+            self.suffix_tokens += suffix_tokens
+            self.trimmed_lines += trimmed_lines
+        if first and not self.cacheable:
+            logger.warning(
+                f"{self.name} prompt prefix is {self.prefix_tokens} tokens, below the "
+                f"{PROVIDER_CACHE_MIN_TOKENS}-token provider cache minimum; expect no prefix cache hits"
+            )
+        metrics.inc("prompt_tokens_total", self.prefix_tokens, template=self.name, part="prefix")
+        metrics.inc("prompt_tokens_total", suffix_tokens, template=self.name, part="suffix")
+        if trimmed_lines:
+            metrics.inc("prompt_trimmed_lines_total", trimmed_lines, template=self.name)
+        return self.prefix + suffix
+
+    def stats(self) -> dict:
+        with self._lock:
+            calls, suffix_tokens, trimmed = self.calls, self.suffix_tokens, self.trimmed_lines
+        return {
+            "calls": calls,
+            "prefix_tokens": self.prefix_tokens,
+            "cacheable": self.cacheable,
+            "avg_suffix_tokens": round(suffix_tokens / calls, 1) if calls else 0.0,
+            "avg_tokens_per_call": round(self.prefix_tokens + suffix_tokens / calls, 1) if calls else 0.0,
+            "trimmed_lines": trimmed,
+        }
+
+
+_RULES = f"""You are a professional crypto futures trader AI competing in a live trading competition.
 
 OBJECTIVE:
 Maximize total account equity over a 2-week period while avoiding liquidation.
@@ -40,16 +148,13 @@ TRADING PHILOSOPHY:
   - Low confidence → HOLD
 - Capital preservation is more important than frequency.
 
-INPUTS YOU WILL RECEIVE:
-- Recent OHLCV data
-- RSI, EMA, volatility
+INPUTS YOU WILL RECEIVE{{inputs_scope}}:
+- Recent OHLCV-derived indicators: RSI, EMA, ATR, volatility
 - Funding rate
-- Open interest (if available)
-- Current positions and balance
+- Current position and balance
 
 OUTPUT RULES:
-- Respond ONLY in valid JSON.
-- Choose exactly one action: {', '.join(allowed_actions)}.
+{{output_rules}}
 - Explain reasoning concisely.
 - Do NOT hallucinate prices or indicators.
 
@@ -68,28 +173,127 @@ Every HOLD preserves optionality.
 - Stop Loss: -{STOP_LOSS_USDT} USDT
 - Strict JSON output
 
+ENTRY/EXIT RULES:
+- If there is no position, only SELL (short) or HOLD are allowed.
+- If there is an open short position, only CLOSE or HOLD are allowed.
+- If unrealized PnL >= +{TAKE_PROFIT_USDT} or <= -{STOP_LOSS_USDT}, you MUST return CLOSE.
+- Use the REQUIRED SIZE value exactly for any SELL or CLOSE action.
+"""
+
+SINGLE_TEMPLATE = PromptTemplate("single", "🔒 SYSTEM PROMPT — PROFIT-ORIENTED AI TRADER (WEEX COMPETITION)\n\n" + _RULES.format(
+    inputs_scope="",
+    output_rules="- Respond ONLY in valid JSON.\n- Choose exactly one action from the ALLOWED ACTIONS given below.",
+) + """
 📤 STRICT OUTPUT FORMAT (REQUIRED)
-{{
-  "action": "{' | '.join(allowed_actions)}",
+{
+  "action": "<one of ALLOWED ACTIONS>",
   "confidence": 0.0,
   "leverage": 1,
-  "size": {required_size if required_size is not None else 0.0},
+  "size": <REQUIRED SIZE>,
   "reason": "Clear, specific explanation suitable for permanent AI logs"
-}}
+}
 
 ---
-CURRENT MARKET DATA:
-{market_text}
+""")
 
-ACCOUNT STATUS:
-{account_text}
+BATCH_TEMPLATE = PromptTemplate("batch", "🔒 SYSTEM PROMPT — PROFIT-ORIENTED AI TRADER (WEEX COMPETITION)\n\n" + _RULES.format(
+    inputs_scope=" (per symbol)",
+    output_rules=(
+        "- Respond ONLY in valid JSON: an array with exactly one object per symbol below.\n"
+        "- For each symbol choose exactly one action from that symbol's ALLOWED ACTIONS."
+    ),
+) + """
+📤 STRICT OUTPUT FORMAT (REQUIRED)
+[
+  {
+    "symbol": "<symbol>",
+    "action": "<one of ALLOWED ACTIONS>",
+    "confidence": 0.0,
+    "leverage": 1,
+    "size": <REQUIRED SIZE>,
+    "reason": "Clear, specific explanation suitable for permanent AI logs"
+  }
+]
 
-CURRENT POSITION:
-{position_text}
+---
+""")
 
-ENTRY/EXIT RULES:
-- If there is no position, only SELL (short) or HOLD are allowed.
-- If there is an open short position, only CLOSE or HOLD are allowed.
-- If unrealized PnL >= +{TAKE_PROFIT_USDT} or <= -{STOP_LOSS_USDT}, you MUST return CLOSE.
-- Use the provided size value exactly for any SELL or CLOSE action.
-"""
+
+def _symbol_block(context: dict, header: str, budget: int = PROMPT_SYMBOL_TOKEN_BUDGET) -> tuple:
+    """
+    (text, tokens, trimmed lines) for one symbol: header, market lines,
+    position, allowed actions and required size, within `budget` tokens
+    (0 = unlimited). Only market lines are ever dropped.
+    """
+    position = context.get("position", {})
+    constraints = context.get("constraints", {})
+    allowed_actions = constraints.get("allowed_actions", ["SELL", "HOLD"])
+    required_size = constraints.get("required_size")
+
+    features = get_features(context)
+    lines = dict(market_lines(features))
+    head = f"{header}\nMARKET DATA:\n"
+    tail = (
+        f"\nCURRENT POSITION: {describe_position(features, position.get('side') if position else None)}"
+        f"\nALLOWED ACTIONS: {', '.join(allowed_actions)}"
+        f"\nREQUIRED SIZE: {required_size if required_size is not None else 0.0}"
+    )
+    text = head + "\n".join(lines.values()) + tail
+    tokens = count_tokens(text)
+    if not budget or tokens <= budget:
+        return text, tokens, 0
+
+    kept = [column for column in MARKET_PRIORITY if column in lines]
+    kept += [column for column in lines if column not in kept]
+    line_tokens = {column: count_tokens(lines[column]) + 1 for column in kept}  # +1 for the newline
+    trimmed = 0
+    # Price always stays; everything else can go, lowest priority first
+    while tokens > budget and len(kept) > 1:
+        tokens -= line_tokens[kept.pop()]
+        trimmed += 1
+
+    order = {column: i for i, column in enumerate(lines)}
+    market_text = "\n".join(lines[column] for column in sorted(kept, key=order.get))
+    return head + market_text + tail, tokens, trimmed
+
+
+def _account_text(account: dict) -> str:
+    return f"ACCOUNT STATUS: Equity: {account.get('equity', 0)}, Balance: {account.get('balance', 0)}"
+
+
+def build_prompt(context: dict) -> str:
+    """
+    Constructs the exact system prompt required for the WEEX AI Wars competition:
+    SINGLE_TEMPLATE's static prefix, then this symbol's data.
+    """
+    symbol = context.get("market", {}).get("symbol")
+    block, tokens, trimmed = _symbol_block(context, f"SYMBOL: {symbol}")
+    account_text = _account_text(context.get("account", {}))
+    suffix = f"{account_text}\n{block}\n"
+    return SINGLE_TEMPLATE.render(suffix, tokens + count_tokens(account_text) + 1, trimmed)
+
+
+def build_batch_prompt(contexts: list) -> str:
+    """
+    One prompt covering several symbols. The shared instructions are the
+    static prefix; each symbol gets its own market/position block, allowed
+    actions and size. The model must answer with a JSON array holding one
+    decision per symbol.
+    """
+    account_text = _account_text(contexts[0].get("account", {}) if contexts else {})
+    sections, tokens, trimmed = [], count_tokens(account_text) + 2, 0
+    for context in contexts:
+        block, block_tokens, block_trimmed = _symbol_block(context, f"### {context.get('market', {}).get('symbol')}")
+        sections.append(block)
+        tokens += block_tokens + 2
+        trimmed += block_trimmed
+    suffix = f"{account_text}\n\nSYMBOLS:\n" + "\n\n".join(sections) + "\n"
+    return BATCH_TEMPLATE.render(suffix, tokens, trimmed)
+
+
+def prompt_stats() -> dict:
+    """
+    Per-template prompt sizes: prefix tokens, average suffix and total tokens
+    per call, and market lines trimmed to stay within budget.
+    """
+    return {template.name: template.stats() for template in (SINGLE_TEMPLATE, BATCH_TEMPLATE)}
@@ -31,3 +31,29 @@ class DecisionSchema(BaseModel):
             raise ValueError("Size must be > 0 for BUY/SELL/CLOSE")
         return v
 
+
+
+_FIELDS = frozenset(DecisionSchema.model_fields)
+_ACTIONS = frozenset(["BUY", "SELL", "HOLD", "CLOSE"])
+
+
+def validate_decision(data: dict) -> dict:
+    """
+    DecisionSchema(**data).model_dump(), without building the model when data
+    already has exactly the schema's fields in canonical form (upper-case
+    action, int leverage, numeric confidence/size in range). Anything else,
+    including values the model would coerce or reject, takes the Pydantic path.
+    """
+    if type(data) is dict and data.keys() == _FIELDS:
+        action, confidence, leverage, size, reason = (
+            data["action"], data["confidence"], data["leverage"], data["size"], data["reason"]
+        )
+        if (
+            action in _ACTIONS
+            and type(leverage) is int and 1 <= leverage <= 20
+            and type(confidence) in (int, float) and 0.0 <= confidence <= 1.0
+            and type(size) in (int, float) and (size > 0 if action != "HOLD" else size >= 0)
+            and type(reason) is str and len(reason) >= 10
+        ):
+            return {"action": action, "confidence": float(confidence), "leverage": leverage, "size": float(size), "reason": reason}
+    return DecisionSchema(**data).model_dump()
@@ -0,0 +1,288 @@
+"""
+Replays history through the real Trader pipeline
+(Trader.process_symbol -> decide_trade -> check_trade_allowed -> place_order)
+against a SimulatedExchange installed as the shared WEEX client.
+
+    python -m backtest.engine --days 90 --backend rule_based
+    python -m backtest.engine --synthetic --days 30 --json report.json
+
+Each step is one closed bar for every symbol: the exchange advances to the bar
+(firing TP/SL, settling funding), the Trader decides on a snapshot built from
+the trailing CANDLE_WINDOW bars, and market orders fill at the next bar's open
+plus slippage. Snapshot indicators for the whole run are computed up front in
+one vectorized pass over sliding windows, with the same code as live snapshots.
+"""
+import argparse
+import json
+import logging
+import math
+import os
+import time
+
+import numpy as np
+
+from backtest.history import load_history, synthetic_history
+from config.settings import ALLOWED_SYMBOLS, CANDLE_WINDOW, TIMEFRAME
+from exchange.sim_exchange import SimulatedExchange, SimulatedWeexClient
+from exchange.weex_client import WeexClient
+from market.data import indicator_columns, snapshot_from_columns
+from utils.logger import get_logger
+from utils.time import now_ms, timeframe_to_ms
+
+logger = get_logger("BACKTEST")
+
+_CHUNK = 4096
+
+
+def _snapshot_columns(ohlcv: np.ndarray, window: int) -> dict:
+    """
+    indicator_columns() for every trailing window of `ohlcv` (bars, 5);
+    row k describes the window ending at bar k + window - 1.
+    """
+    windows = np.lib.stride_tricks.sliding_window_view(ohlcv, window, axis=0).swapaxes(1, 2)
+    chunks = [indicator_columns(np.ascontiguousarray(windows[i:i + _CHUNK])) for i in range(0, len(windows), _CHUNK)]
+    return {key: np.concatenate([c[key] for c in chunks]) for key in chunks[0]}
+
+
+class Backtest:
+    def __init__(self, histories: dict, initial_balance: float = 1000.0, taker_fee: float = 0.0006,
+                 slippage_bps: float = 2.0, inference_mode: str = "per_symbol", window: int = CANDLE_WINDOW):
+        self.symbols = list(histories)
+        self.window = window
+        self.inference_mode = inference_mode
+        self.exchange = SimulatedExchange(initial_balance, taker_fee=taker_fee, slippage_bps=slippage_bps)
+
+        # Replay only timestamps every symbol has
+        times = histories[self.symbols[0]].time
+        for history in histories.values():
+            times = np.intersect1d(times, history.time)
+        dropped = max(len(h) for h in histories.values()) - len(times)
+        if dropped:
+            logger.warning(f"Dropping {dropped} bars not shared by all symbols")
+        if len(times) <= window:
+            raise ValueError(f"Need more than {window} common bars, got {len(times)}")
+        self.times = times
+
+        self.bars = {}
+        self.funding = {}
+        for symbol, history in histories.items():
+            idx = np.searchsorted(history.time, times)
+            self.bars[symbol] = history.ohlcv()[idx]
+            # funding_idx[i]: settlements up to and including bar i
+            self.funding[symbol] = (history.funding_rate, np.searchsorted(history.funding_time, times, side="right"))
+
+    def run(self) -> dict:
+        from account.state import invalidate_account_state
+        from runner.trader import Trader
+
+        t0 = time.perf_counter()
+        columns = {symbol: _snapshot_columns(bars, self.window) for symbol, bars in self.bars.items()}
+        prep_elapsed = time.perf_counter() - t0
+
+        trader = Trader(workers=1, inference_mode=self.inference_mode, upload_ai_logs=False, position_book_path="")
+        previous = WeexClient.set_shared(SimulatedWeexClient(self.exchange))
+        n_bars = len(self.times)
+        steps = n_bars - self.window + 1
+        equity = np.empty(steps)
+        stage_totals = {}
+
+        t0 = time.perf_counter()
+        try:
+            for k in range(steps):
+                i = k + self.window - 1
+                t = int(self.times[i])
+                snapshots = self._advance(i, t, columns, k)
+                # Same per-cycle reconciliation as the live loop (TP/SL fired in _advance)
+                invalidate_account_state()
+                trader.sync_positions()
+
+                if self.inference_mode == "batch":
+                    trader._run_batch_cycle(None, snapshots, self.symbols)
+                else:
+                    for symbol in self.symbols:
+                        trader.process_symbol(symbol, snapshots[symbol])
+
+                equity[k] = self.exchange.equity()
+                with trader._timings_lock:
+                    for _, timings in trader._cycle_timings:
+                        for stage, elapsed in timings.items():
+                            total = stage_totals.setdefault(stage, [0.0, 0])
+                            total[0] += elapsed
+                            total[1] += 1
+                    trader._cycle_timings.clear()
+        finally:
+            WeexClient.set_shared(previous)
+            invalidate_account_state()
+        replay_elapsed = time.perf_counter() - t0
+
+        report = summarize(self.exchange, equity, self.times[self.window - 1:], timeframe_to_ms(TIMEFRAME))
+        report["performance"] = {
+            "symbols": len(self.symbols),
+            "steps": steps,
+            "symbol_bars": steps * len(self.symbols),
+            "indicator_sec": round(prep_elapsed, 3),
+            "replay_sec": round(replay_elapsed, 3),
+            "symbol_bars_per_sec": round(steps * len(self.symbols) / replay_elapsed) if replay_elapsed else None,
+            "stage_avg_us": {s: round(v[0] / v[1] * 1e6, 1) for s, v in stage_totals.items() if v[1]},
+        }
+        return report
+
+    def _advance(self, i: int, t: int, columns: dict, k: int) -> dict:
+        """
+        Moves the exchange to bar i (TP/SL, funding) and returns the snapshots.
+        """
+        snapshots = {}
+        last = len(self.times) - 1
+        for symbol in self.symbols:
+            bars = self.bars[symbol]
+            o, h, l, c, v = bars[i]
+            fill = bars[i + 1][0] if i < last else c
+            self.exchange.set_bar(symbol, t, o, h, l, c, v, fill_price=fill)
+
+            rates, funding_idx = self.funding[symbol]
+            start = funding_idx[i - 1] if i > 0 else funding_idx[i]
+            for j in range(start, funding_idx[i]):
+                self.exchange.apply_funding(symbol, float(rates[j]))
+            rate = float(rates[funding_idx[i] - 1]) if funding_idx[i] else 0.0
+            snapshots[symbol] = snapshot_from_columns(symbol, t, columns[symbol], k, rate)
+        return snapshots
+
+
+def summarize(exchange: SimulatedExchange, equity: np.ndarray, times: np.ndarray, bar_ms: int) -> dict:
+    """
+    PnL, drawdown and trade statistics for a finished run.
+    """
+    start_equity = exchange.initial_balance
+    final_equity = float(equity[-1]) if len(equity) else start_equity
+    peaks = np.maximum.accumulate(np.concatenate([[start_equity], equity]))[1:]
+    drawdowns = (peaks - equity) / peaks
+    dd_idx = int(drawdowns.argmax()) if len(drawdowns) else 0
+
+    returns = np.diff(np.concatenate([[start_equity], equity])) / np.concatenate([[start_equity], equity[:-1]])
+    bars_per_year = 365 * 24 * 3600 * 1000 / bar_ms
+    sharpe = float(returns.mean() / returns.std() * math.sqrt(bars_per_year)) if len(returns) > 1 and returns.std() > 0 else 0.0
+
+    trades = exchange.trades
+    net = np.array([t["net_pnl"] for t in trades])
+    wins, losses = net[net > 0], net[net <= 0]
+    by_symbol, by_reason = {}, {}
+    for trade in trades:
+        stats = by_symbol.setdefault(trade["symbol"], {"trades": 0, "net_pnl": 0.0})
+        stats["trades"] += 1
+        stats["net_pnl"] = round(stats["net_pnl"] + trade["net_pnl"], 4)
+        by_reason[trade["reason"]] = by_reason.get(trade["reason"], 0) + 1
+    holding = [(t["closed_at"] - t["opened_at"]) / bar_ms for t in trades]
+
+    return {
+        "period": {
+            "start": int(times[0]) if len(times) else None,
+            "end": int(times[-1]) if len(times) else None,
+            "bars": len(times),
+        },
+        "pnl": {
+            "initial_equity": round(start_equity, 4),
+            "final_equity": round(final_equity, 4),
+            "net_pnl": round(final_equity - start_equity, 4),
+            "return_pct": round((final_equity / start_equity - 1) * 100, 3),
+            "fees": round(exchange.fees_paid, 4),
+            "funding": round(exchange.funding_paid, 4),
+            "unrealized": round(sum(exchange.unrealized_pnl(s) for s in exchange.positions), 4),
+        },
+        "risk": {
+            "max_drawdown_pct": round(float(drawdowns.max()) * 100, 3) if len(drawdowns) else 0.0,
+            "max_drawdown_at": int(times[dd_idx]) if len(times) else None,
+            "sharpe": round(sharpe, 3),
+        },
+        "trades": {
+            "count": len(trades),
+            "win_rate": round(len(wins) / len(trades), 4) if trades else 0.0,
+            "avg_win": round(float(wins.mean()), 4) if len(wins) else 0.0,
+            "avg_loss": round(float(losses.mean()), 4) if len(losses) else 0.0,
+            "profit_factor": round(float(wins.sum() / -losses.sum()), 3) if len(losses) and losses.sum() < 0 else None,
+            "avg_holding_bars": round(float(np.mean(holding)), 1) if holding else 0.0,
+            "by_reason": by_reason,
+            "by_symbol": by_symbol,
+            "open_positions": len(exchange.positions),
+            "orders": exchange.orders,
+            "rejected_orders": exchange.rejected,
+        },
+    }
+
+
+def format_report(report: dict) -> str:
+    pnl, risk, trades, perf = report["pnl"], report["risk"], report["trades"], report["performance"]
+    lines = [
+        f"Bars: {report['period']['bars']} x {perf['symbols']} symbols "
+        f"(replayed in {perf['replay_sec']}s, {perf['symbol_bars_per_sec']} symbol-bars/s; indicators {perf['indicator_sec']}s)",
+        f"Equity: {pnl['initial_equity']} -> {pnl['final_equity']} ({pnl['return_pct']:+.2f}%), "
+        f"fees {pnl['fees']}, funding {pnl['funding']}, unrealized {pnl['unrealized']}",
+        f"Max drawdown: {risk['max_drawdown_pct']:.2f}%  Sharpe: {risk['sharpe']}",
+        f"Trades: {trades['count']}  win rate {trades['win_rate']:.1%}  avg win {trades['avg_win']}  "
+        f"avg loss {trades['avg_loss']}  profit factor {trades['profit_factor']}  avg hold {trades['avg_holding_bars']} bars",
+        f"Exits: {trades['by_reason']}  open: {trades['open_positions']}  orders: {trades['orders']} ({trades['rejected_orders']} rejected)",
+    ]
+    for symbol, stats in sorted(trades["by_symbol"].items()):
+        lines.append(f"  {symbol}: {stats['trades']} trades, net {stats['net_pnl']}")
+    lines.append("Stage avg (us): " + ", ".join(f"{k}={v}" for k, v in perf["stage_avg_us"].items()))
+    return "\n".join(lines)
+
+
+def _history_client():
+    try:
+        return WeexClient.from_env()
+    except KeyError:
+        # Candle and funding history are public endpoints
+        return WeexClient("", "", "", os.getenv("WEEX_BASE_URL", "https://api-contract.weex.com"))
+
+
+def main():
+    from ai.inference import set_inference_backend
+
+    parser = argparse.ArgumentParser(description="Backtest the Trader pipeline on historical bars")
+    parser.add_argument("--symbols", nargs="+", default=ALLOWED_SYMBOLS)
+    parser.add_argument("--days", type=float, default=30)
+    parser.add_argument("--end", type=int, help="End time in ms (default: now)")
+    parser.add_argument("--synthetic", action="store_true", help="Use generated bars instead of exchange history")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--cache-dir", default=os.path.join(os.path.dirname(os.path.dirname(__file__)), "data", "history"))
+    parser.add_argument("--refresh", action="store_true", help="Refetch history even if cached")
+    parser.add_argument("--backend", default="rule_based", help="llm, rule_based or linear")
+    parser.add_argument("--model", help="Model file for the linear backend")
+    parser.add_argument("--mode", default="per_symbol", choices=["per_symbol", "batch"])
+    parser.add_argument("--balance", type=float, default=1000.0)
+    parser.add_argument("--fee-bps", type=float, default=6.0)
+    parser.add_argument("--slippage-bps", type=float, default=2.0)
+    parser.add_argument("--json", help="Write the report to this file")
+    parser.add_argument("--verbose", action="store_true", help="Keep per-decision logging")
+    args = parser.parse_args()
+
+    end_ms = args.end or now_ms()
+    bar_ms = timeframe_to_ms(TIMEFRAME)
+    bars = int(args.days * 24 * 3600 * 1000 / bar_ms) + CANDLE_WINDOW
+    if args.synthetic:
+        histories = synthetic_history(args.symbols, TIMEFRAME, bars, end_ms, seed=args.seed)
+    else:
+        histories = load_history(_history_client(), args.symbols, TIMEFRAME, end_ms - bars * bar_ms, end_ms, args.cache_dir, refresh=args.refresh)
+
+    set_inference_backend(args.backend, model_path=args.model)
+    if not args.verbose:
+        logging.disable(logging.WARNING)
+    try:
+        report = Backtest(
+            histories,
+            initial_balance=args.balance,
+            taker_fee=args.fee_bps / 10_000,
+            slippage_bps=args.slippage_bps,
+            inference_mode=args.mode,
+        ).run()
+    finally:
+        logging.disable(logging.NOTSET)
+
+    print(format_report(report))
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(report, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
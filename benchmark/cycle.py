@@ -0,0 +1,273 @@
+"""
+End-to-end benchmark of the bot's hot path: Trader.run_cycle over
+ALLOWED_SYMBOLS against the local WEEX simulator and the fake LLM server,
+both with injectable latency.
+
+    python -m benchmark.cycle --cycles 30 --llm-latency-ms 400 --exchange-latency-ms 40 --json bench.json
+    python -m benchmark.cycle --cycles 30 --compare bench.json
+
+Reports p50/p95/p99 per stage and for the whole cycle. Stages are timed by
+wrapping the functions the pipeline calls, so the code under test is unchanged:
+
+    candle_fetch, funding_fetch, indicators, account_fetch, decision,
+    prompt_build, inference, llm_call, schema_validation, guardrails,
+    order_post, ai_log_enqueue, ai_log_post (background worker)
+
+Each stage sample is one call; `cycle` is one full run_cycle.
+"""
+import argparse
+import functools
+import json
+import logging
+import os
+import subprocess
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+from config.settings import ALLOWED_SYMBOLS, INFERENCE_MODE, SYMBOL_WORKERS
+from utils.logger import get_logger
+
+logger = get_logger("BENCHMARK")
+
+QUANTILES = (50, 95, 99)
+
+
+class StageTimer:
+    """
+    Thread-safe per-stage duration samples (seconds).
+    """
+
+    def __init__(self):
+        self.samples = {}
+        self.enabled = True
+        self._lock = threading.Lock()
+
+    def observe(self, stage: str, seconds: float):
+        if not self.enabled:
+            return
+        with self._lock:
+            self.samples.setdefault(stage, []).append(seconds)
+
+    def wrap(self, fn, stage: str):
+        @functools.wraps(fn)
+        def timed(*args, **kwargs):
+            t0 = time.perf_counter()
+            try:
+                return fn(*args, **kwargs)
+            finally:
+                self.observe(stage, time.perf_counter() - t0)
+        return timed
+
+    def instrument(self, module, name: str, stage: str):
+        setattr(module, name, self.wrap(getattr(module, name), stage))
+
+    def reset(self):
+        with self._lock:
+            self.samples = {}
+
+    def summary(self) -> dict:
+        with self._lock:
+            samples = {stage: list(values) for stage, values in self.samples.items()}
+        return {stage: summarize(values) for stage, values in samples.items()}
+
+
+def summarize(values: list) -> dict:
+    ms = np.asarray(values) * 1000
+    stats = {"count": len(ms), "mean_ms": round(float(ms.mean()), 3), "max_ms": round(float(ms.max()), 3)}
+    for q, value in zip(QUANTILES, np.percentile(ms, QUANTILES)):
+        stats[f"p{q}_ms"] = round(float(value), 3)
+    return stats
+
+
+def _instrument_pipeline(timer: StageTimer):
+    import account.state
+    import ai.backends
+    import ai.inference
+    import market.data
+    import runner.trader
+    import strategy.decision_engine
+
+    timer.instrument(market.data, "_fetch_candles", "candle_fetch")
+    timer.instrument(market.data, "_get_funding_rates", "funding_fetch")
+    timer.instrument(market.data, "_build_snapshots", "indicators")
+    timer.instrument(account.state, "get_account_state", "account_fetch")
+    timer.instrument(runner.trader, "decide_trade", "decision")
+    timer.instrument(runner.trader, "decide_trades", "decision")
+    timer.instrument(strategy.decision_engine, "run_inference", "inference")
+    timer.instrument(strategy.decision_engine, "run_batch_inference", "inference")
+    timer.instrument(ai.backends, "build_prompt", "prompt_build")
+    timer.instrument(ai.inference, "build_batch_prompt", "prompt_build")
+    timer.instrument(ai.backends, "call_llm", "llm_call")
+    timer.instrument(ai.inference, "call_llm", "llm_call")
+    timer.instrument(ai.backends, "parse_decision", "schema_validation")
+    timer.instrument(runner.trader, "check_trade_allowed", "guardrails")
+    timer.instrument(runner.trader, "place_order", "order_post")
+    timer.instrument(runner.trader, "enqueue_ai_log", "ai_log_enqueue")
+
+
+def _git_commit() -> str | None:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, timeout=5,
+            cwd=os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+        ).stdout.strip() or None
+    except (OSError, subprocess.SubprocessError):
+        return None
+
+
+def run_benchmark(cycles: int = 20, warmup: int = 2, workers: int = SYMBOL_WORKERS, mode: str = INFERENCE_MODE,
+                  backend: str = "llm", llm_latency_ms: float = 300.0,
+                  llm_jitter_ms: float = 50.0, llm_slow_rate: float = 0.0, llm_error_rate: float = 0.0, trade_rate: float = 0.2,
+                  llm_cache_min_tokens: int = 1024,
+                  exchange_latency_ms: float = 30.0, exchange_jitter_ms: float = 10.0,
+                  exchange_error_rate: float = 0.0, seed: int = 0) -> dict:
+    from ai.fake_llm_server import FakeLLMServer, trading_responder
+    from ai.inference import set_inference_backend
+    from ai.llm_client import LLMClient, set_llm_client
+    from ai.prompt import prompt_stats
+    from exchange.ai_log_uploader import AILogQueue, _upload_once, flush_ai_logs, set_ai_log_queue
+    from exchange.sim_server import WeexSimServer, live_histories
+    from exchange.weex_client import WeexClient
+    from runner.trader import Trader
+
+    timer = StageTimer()
+    _instrument_pipeline(timer)
+
+    exchange = WeexSimServer(
+        live_histories(ALLOWED_SYMBOLS, future_bars=cycles + warmup + 1, seed=seed),
+        latency_ms=exchange_latency_ms, jitter_ms=exchange_jitter_ms, error_rate=exchange_error_rate, seed=seed,
+    )
+    llm = FakeLLMServer(
+        latency=llm_latency_ms / 1000, jitter=llm_jitter_ms / 1000, slow_rate=llm_slow_rate,
+        error_rate=llm_error_rate, responder=trading_responder(trade_rate, seed=seed), seed=seed,
+        cache_min_tokens=llm_cache_min_tokens,
+    )
+    exchange.start()
+    llm.start()
+    spool_dir = tempfile.TemporaryDirectory(prefix="bench-ai-log-")
+    ai_log_queue = AILogQueue(spool_path=os.path.join(spool_dir.name, "spool.jsonl"), upload=timer.wrap(_upload_once, "ai_log_post"))
+    ai_log_queue.start()
+
+    previous_client = WeexClient.set_shared(exchange.client())
+    llm_client = LLMClient(api_key="bench", base_url=llm.base_url)
+    previous_llm = set_llm_client(llm_client)
+    previous_queue = set_ai_log_queue(ai_log_queue)
+    set_inference_backend(backend)
+
+    trader = Trader(workers=workers, inference_mode=mode, position_book_path="")
+    executor = ThreadPoolExecutor(max_workers=trader.workers, thread_name_prefix="symbol") if trader.workers > 1 else None
+    try:
+        for i in range(warmup + cycles):
+            if i == warmup:
+                timer.reset()
+            t0 = time.perf_counter()
+            trader.run_cycle(executor)
+            timer.observe("cycle", time.perf_counter() - t0)
+            exchange.advance()
+        flush_ai_logs(30)
+    finally:
+        if executor:
+            executor.shutdown(wait=False)
+        WeexClient.set_shared(previous_client)
+        set_llm_client(previous_llm)
+        llm_client.close()
+        set_ai_log_queue(previous_queue)
+        llm.stop()
+        exchange.stop()
+        spool_dir.cleanup()
+
+    return {
+        "commit": _git_commit(),
+        "config": {
+            "cycles": cycles, "warmup": warmup, "workers": workers, "mode": mode, "backend": backend,
+            "symbols": len(ALLOWED_SYMBOLS), "llm_latency_ms": llm_latency_ms, "llm_jitter_ms": llm_jitter_ms,
+            "llm_slow_rate": llm_slow_rate, "llm_error_rate": llm_error_rate, "trade_rate": trade_rate,
+            "llm_cache_min_tokens": llm_cache_min_tokens,
+            "exchange_latency_ms": exchange_latency_ms, "exchange_jitter_ms": exchange_jitter_ms,
+            "exchange_error_rate": exchange_error_rate,
+        },
+        "stages": timer.summary(),
+        "llm": llm_client.stats(),
+        "prompt": prompt_stats(),
+        "exchange": {"requests": dict(exchange.stats), "injected_errors": exchange.injected_errors,
+                     "orders": exchange.exchange.orders, "trades": len(exchange.exchange.trades)},
+    }
+
+
+def format_report(report: dict, baseline: dict | None = None) -> str:
+    header = f"{'stage':<18}{'count':>7}{'p50':>10}{'p95':>10}{'p99':>10}{'max':>10}"
+    if baseline:
+        header += f"{'p95 vs base':>14}"
+    lines = [f"commit {report['commit']} {report['config']}", header]
+    stages = report["stages"]
+    base_stages = (baseline or {}).get("stages", {})
+    for stage in sorted(stages, key=lambda s: (s == "cycle", s)):
+        s = stages[stage]
+        line = f"{stage:<18}{s['count']:>7}{s['p50_ms']:>10.2f}{s['p95_ms']:>10.2f}{s['p99_ms']:>10.2f}{s['max_ms']:>10.2f}"
+        base = base_stages.get(stage)
+        if base and base["p95_ms"]:
+            line += f"{(s['p95_ms'] / base['p95_ms'] - 1) * 100:>+13.1f}%"
+        lines.append(line)
+    llm = report.get("llm", {})
+    if llm.get("usage", {}).get("requests"):
+        usage, cache = llm["usage"], llm.get("prefix_cache", {})
+        answered = llm["latency"]["count"] or 1
+        lines.append(
+            f"llm: {usage['prompt_tokens'] / answered:.0f} prompt tokens/call, "
+            f"prefix cache hit rate {cache.get('hit_rate', 0.0):.0%} ({cache.get('cached_token_share', 0.0):.0%} of prompt tokens)"
+        )
+    return "\n".join(lines)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark Trader.run_cycle end to end")
+    parser.add_argument("--cycles", type=int, default=20)
+    parser.add_argument("--warmup", type=int, default=2)
+    parser.add_argument("--workers", type=int, default=SYMBOL_WORKERS)
+    parser.add_argument("--mode", default=INFERENCE_MODE, choices=["per_symbol", "batch"])
+    parser.add_argument("--backend", default="llm", help="llm, rule_based or linear")
+    parser.add_argument("--llm-latency-ms", type=float, default=300.0)
+    parser.add_argument("--llm-jitter-ms", type=float, default=50.0)
+    parser.add_argument("--llm-slow-rate", type=float, default=0.0)
+    parser.add_argument("--llm-error-rate", type=float, default=0.0)
+    parser.add_argument("--trade-rate", type=float, default=0.2, help="Fraction of LLM answers that trade instead of HOLD")
+    parser.add_argument("--llm-cache-min-tokens", type=int, default=1024, help="Shortest prompt prefix the fake LLM reports as cached")
+    parser.add_argument("--exchange-latency-ms", type=float, default=30.0)
+    parser.add_argument("--exchange-jitter-ms", type=float, default=10.0)
+    parser.add_argument("--exchange-error-rate", type=float, default=0.0)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--json", help="Write the report to this file")
+    parser.add_argument("--compare", help="Baseline report to compare p95 against")
+    parser.add_argument("--verbose", action="store_true", help="Keep per-symbol logging")
+    args = parser.parse_args()
+
+    if not args.verbose:
+        logging.disable(logging.WARNING)
+    try:
+        report = run_benchmark(
+            cycles=args.cycles, warmup=args.warmup, workers=args.workers, mode=args.mode, backend=args.backend,
+            llm_latency_ms=args.llm_latency_ms, llm_jitter_ms=args.llm_jitter_ms,
+            llm_slow_rate=args.llm_slow_rate, llm_error_rate=args.llm_error_rate, trade_rate=args.trade_rate,
+            llm_cache_min_tokens=args.llm_cache_min_tokens,
+            exchange_latency_ms=args.exchange_latency_ms, exchange_jitter_ms=args.exchange_jitter_ms,
+            exchange_error_rate=args.exchange_error_rate, seed=args.seed,
+        )
+    finally:
+        logging.disable(logging.NOTSET)
+
+    baseline = None
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+    print(format_report(report, baseline))
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(report, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -24,6 +24,55 @@ _DEFAULT_SETTINGS = {
     "trade_notional_usdt": 10,
     "take_profit_usdt": 10,
     "stop_loss_usdt": 1,
+    "symbol_workers": 8,
+    "http_pool_size": 16,
+    "http_max_retries": 3,
+    "http_backoff_factor": 0.2,
+    "http_timeout_sec": 10,
+    "candle_window": 50,
+    "candle_tail": 2,
+    "account_cache_ttl_sec": 30,
+    "rate_limit_market_per_sec": 20,
+    "rate_limit_account_per_sec": 10,
+    "rate_limit_trade_per_sec": 10,
+    "cycle_interval_sec": 60,
+    "cycle_offset_sec": 1.0,
+    "funding_cache_ttl_sec": 300,
+    "market_stream_enabled": False,
+    "market_stream_url": "ws://127.0.0.1:8765",
+    "market_stream_stale_sec": 10,
+    "ai_log_workers": 2,
+    "ai_log_queue_size": 1000,
+    "ai_log_max_attempts": 5,
+    "ai_log_max_pending_sec": 300,
+    "ai_log_spool_path": "data/ai_log_spool.jsonl",
+    "decision_cache_enabled": True,
+    "decision_cache_ttl_sec": 300,
+    "decision_cache_size": 256,
+    "inference_mode": "per_symbol",
+    "llm_model": "gpt-4o-mini",
+    "llm_base_url": "",
+    "llm_temperature": 0.2,
+    "llm_timeout_sec": 20,
+    "llm_max_concurrency": 8,
+    "llm_max_retries": 2,
+    "llm_hedge_enabled": True,
+    "llm_hedge_min_samples": 20,
+    "llm_stream": True,
+    "inference_backend": "llm",
+    "inference_fallback_backend": "rule_based",
+    "inference_model_path": "",
+    "feature_dump_path": "",
+    "metrics_enabled": True,
+    "metrics_host": "127.0.0.1",
+    "metrics_port": 9108,
+    "metrics_summary_interval_sec": 60,
+    "position_book_path": "data/positions.db",
+    "order_max_retries": 2,
+    "order_retry_backoff_sec": 0.2,
+    "startup_warmup": True,
+    "prompt_symbol_token_budget": 256,
+    "startup_warmup_timeout_sec": 10,
 }
 
 _SETTINGS_PATH = os.path.join(os.path.dirname(__file__), "settings.yaml")
@@ -39,6 +88,104 @@ MAX_RISK_PER_TRADE_PCT = float(
 TRADE_NOTIONAL_USDT = float(_SETTINGS.get("trade_notional_usdt", _DEFAULT_SETTINGS["trade_notional_usdt"]))
 TAKE_PROFIT_USDT = float(_SETTINGS.get("take_profit_usdt", _DEFAULT_SETTINGS["take_profit_usdt"]))
 STOP_LOSS_USDT = float(_SETTINGS.get("stop_loss_usdt", _DEFAULT_SETTINGS["stop_loss_usdt"]))
+# Number of symbols processed concurrently per cycle (1 = serial loop)
+SYMBOL_WORKERS = max(1, int(_SETTINGS.get("symbol_workers", _DEFAULT_SETTINGS["symbol_workers"])))
+
+# Cycle scheduling: wall-clock aligned, offset_sec after each boundary
+CYCLE_INTERVAL_SEC = float(_SETTINGS.get("cycle_interval_sec", _DEFAULT_SETTINGS["cycle_interval_sec"]))
+CYCLE_OFFSET_SEC = float(_SETTINGS.get("cycle_offset_sec", _DEFAULT_SETTINGS["cycle_offset_sec"]))
+
+# Shared WEEX HTTP transport
+HTTP_POOL_SIZE = int(_SETTINGS.get("http_pool_size", _DEFAULT_SETTINGS["http_pool_size"]))
+HTTP_MAX_RETRIES = int(_SETTINGS.get("http_max_retries", _DEFAULT_SETTINGS["http_max_retries"]))
+HTTP_BACKOFF_FACTOR = float(_SETTINGS.get("http_backoff_factor", _DEFAULT_SETTINGS["http_backoff_factor"]))
+HTTP_TIMEOUT_SEC = float(_SETTINGS.get("http_timeout_sec", _DEFAULT_SETTINGS["http_timeout_sec"]))
+
+# Client-side token buckets per endpoint class (requests per second)
+RATE_LIMIT_MARKET_PER_SEC = float(_SETTINGS.get("rate_limit_market_per_sec", _DEFAULT_SETTINGS["rate_limit_market_per_sec"]))
+RATE_LIMIT_ACCOUNT_PER_SEC = float(_SETTINGS.get("rate_limit_account_per_sec", _DEFAULT_SETTINGS["rate_limit_account_per_sec"]))
+RATE_LIMIT_TRADE_PER_SEC = float(_SETTINGS.get("rate_limit_trade_per_sec", _DEFAULT_SETTINGS["rate_limit_trade_per_sec"]))
+
+# Rolling candle store: window kept per symbol and bars refetched each cycle
+CANDLE_WINDOW = int(_SETTINGS.get("candle_window", _DEFAULT_SETTINGS["candle_window"]))
+CANDLE_TAIL = max(1, int(_SETTINGS.get("candle_tail", _DEFAULT_SETTINGS["candle_tail"])))
+
+# Funding rates change at most every few hours; reuse them across cycles
+FUNDING_CACHE_TTL_SEC = float(_SETTINGS.get("funding_cache_ttl_sec", _DEFAULT_SETTINGS["funding_cache_ttl_sec"]))
+
+# Optional WebSocket market feed (ws://127.0.0.1:8765 is market/replay_server.py;
+# the feed speaks that server's format, not the WEEX WebSocket protocol)
+MARKET_STREAM_ENABLED = bool(_SETTINGS.get("market_stream_enabled", _DEFAULT_SETTINGS["market_stream_enabled"]))
+MARKET_STREAM_URL = str(_SETTINGS.get("market_stream_url", _DEFAULT_SETTINGS["market_stream_url"]))
+MARKET_STREAM_STALE_SEC = float(_SETTINGS.get("market_stream_stale_sec", _DEFAULT_SETTINGS["market_stream_stale_sec"]))
+
+# Account snapshot reuse within a cycle (0 disables caching)
+ACCOUNT_CACHE_TTL_SEC = float(_SETTINGS.get("account_cache_ttl_sec", _DEFAULT_SETTINGS["account_cache_ttl_sec"]))
+
+# Background AI log upload queue backed by an append-only spool file
+AI_LOG_WORKERS = max(1, int(_SETTINGS.get("ai_log_workers", _DEFAULT_SETTINGS["ai_log_workers"])))
+AI_LOG_QUEUE_SIZE = int(_SETTINGS.get("ai_log_queue_size", _DEFAULT_SETTINGS["ai_log_queue_size"]))
+AI_LOG_MAX_ATTEMPTS = max(1, int(_SETTINGS.get("ai_log_max_attempts", _DEFAULT_SETTINGS["ai_log_max_attempts"])))
+AI_LOG_MAX_PENDING_SEC = float(_SETTINGS.get("ai_log_max_pending_sec", _DEFAULT_SETTINGS["ai_log_max_pending_sec"]))
+AI_LOG_SPOOL_PATH = os.path.join(
+    os.path.dirname(os.path.dirname(__file__)),
+    _SETTINGS.get("ai_log_spool_path", _DEFAULT_SETTINGS["ai_log_spool_path"]),
+)
+
+# Reuse of validated AI decisions when the quantized context is unchanged
+DECISION_CACHE_ENABLED = bool(_SETTINGS.get("decision_cache_enabled", _DEFAULT_SETTINGS["decision_cache_enabled"]))
+DECISION_CACHE_TTL_SEC = float(_SETTINGS.get("decision_cache_ttl_sec", _DEFAULT_SETTINGS["decision_cache_ttl_sec"]))
+DECISION_CACHE_SIZE = int(_SETTINGS.get("decision_cache_size", _DEFAULT_SETTINGS["decision_cache_size"]))
+
+# "per_symbol": one LLM call per symbol; "batch": one call per cycle for all symbols
+INFERENCE_MODE = str(_SETTINGS.get("inference_mode", _DEFAULT_SETTINGS["inference_mode"]))
+
+# Decision backend: "llm", "rule_based" or "linear" (NumPy model file at
+# inference_model_path). The fallback decides when the LLM misses its deadline
+# or fails; "" disables it.
+INFERENCE_BACKEND = str(_SETTINGS.get("inference_backend", _DEFAULT_SETTINGS["inference_backend"]))
+INFERENCE_FALLBACK_BACKEND = str(_SETTINGS.get("inference_fallback_backend", _DEFAULT_SETTINGS["inference_fallback_backend"]) or "")
+_model_path = str(_SETTINGS.get("inference_model_path", _DEFAULT_SETTINGS["inference_model_path"]) or "")
+INFERENCE_MODEL_PATH = os.path.join(os.path.dirname(os.path.dirname(__file__)), _model_path) if _model_path else ""
+
+# JSONL of feature rows and decisions for offline training ("" disables)
+_dump_path = str(_SETTINGS.get("feature_dump_path", _DEFAULT_SETTINGS["feature_dump_path"]) or "")
+FEATURE_DUMP_PATH = os.path.join(os.path.dirname(os.path.dirname(__file__)), _dump_path) if _dump_path else ""
+
+# LLM client: per-call deadline (retries included), concurrent requests and
+# hedging (a duplicate request once a call outlives the observed p95)
+LLM_MODEL = str(_SETTINGS.get("llm_model", _DEFAULT_SETTINGS["llm_model"]))
+LLM_BASE_URL = str(_SETTINGS.get("llm_base_url", _DEFAULT_SETTINGS["llm_base_url"]) or "")
+LLM_TEMPERATURE = float(_SETTINGS.get("llm_temperature", _DEFAULT_SETTINGS["llm_temperature"]))
+LLM_TIMEOUT_SEC = float(_SETTINGS.get("llm_timeout_sec", _DEFAULT_SETTINGS["llm_timeout_sec"]))
+LLM_MAX_CONCURRENCY = max(1, int(_SETTINGS.get("llm_max_concurrency", _DEFAULT_SETTINGS["llm_max_concurrency"])))
+LLM_MAX_RETRIES = max(0, int(_SETTINGS.get("llm_max_retries", _DEFAULT_SETTINGS["llm_max_retries"])))
+LLM_HEDGE_ENABLED = bool(_SETTINGS.get("llm_hedge_enabled", _DEFAULT_SETTINGS["llm_hedge_enabled"]))
+LLM_HEDGE_MIN_SAMPLES = int(_SETTINGS.get("llm_hedge_min_samples", _DEFAULT_SETTINGS["llm_hedge_min_samples"]))
+# Stream completions and return as soon as the JSON answer is complete
+LLM_STREAM = bool(_SETTINGS.get("llm_stream", _DEFAULT_SETTINGS["llm_stream"]))
 
 # System constraints
 TIMEFRAME = "5m"  # as per "3-10 minutes" horizon implies short term
+
+# Hot-path metrics: Prometheus text on metrics_host:metrics_port/metrics
+# (port 0 disables the endpoint) and a summary log line every interval
+METRICS_ENABLED = bool(_SETTINGS.get("metrics_enabled", _DEFAULT_SETTINGS["metrics_enabled"]))
+METRICS_HOST = str(_SETTINGS.get("metrics_host", _DEFAULT_SETTINGS["metrics_host"]))
+METRICS_PORT = int(_SETTINGS.get("metrics_port", _DEFAULT_SETTINGS["metrics_port"]))
+METRICS_SUMMARY_INTERVAL_SEC = float(_SETTINGS.get("metrics_summary_interval_sec", _DEFAULT_SETTINGS["metrics_summary_interval_sec"]))
+
+# Open positions and fill journal persisted across restarts ("" keeps them in memory only)
+_book_path = str(_SETTINGS.get("position_book_path", _DEFAULT_SETTINGS["position_book_path"]) or "")
+POSITION_BOOK_PATH = os.path.join(os.path.dirname(os.path.dirname(__file__)), _book_path) if _book_path else ""
+
+# Order resubmission (same client_oid) after a timeout, connection error or 5xx/429
+ORDER_MAX_RETRIES = max(0, int(_SETTINGS.get("order_max_retries", _DEFAULT_SETTINGS["order_max_retries"])))
+ORDER_RETRY_BACKOFF_SEC = float(_SETTINGS.get("order_retry_backoff_sec", _DEFAULT_SETTINGS["order_retry_backoff_sec"]))
+
+# Before the first cycle, open WEEX/LLM connections and reconcile positions in parallel
+STARTUP_WARMUP = bool(_SETTINGS.get("startup_warmup", _DEFAULT_SETTINGS["startup_warmup"]))
+STARTUP_WARMUP_TIMEOUT_SEC = float(_SETTINGS.get("startup_warmup_timeout_sec", _DEFAULT_SETTINGS["startup_warmup_timeout_sec"]))
+
+# Token cap per symbol block of a prompt (market lines are trimmed to fit; 0 = no cap)
+PROMPT_SYMBOL_TOKEN_BUDGET = max(0, int(_SETTINGS.get("prompt_symbol_token_budget", _DEFAULT_SETTINGS["prompt_symbol_token_budget"])))
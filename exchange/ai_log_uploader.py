@@ -1,64 +1,325 @@
 from exchange.weex_client import WeexClient
 from utils.logger import get_logger
+from utils.metrics import metrics, timed
+from config.settings import (
+    AI_LOG_MAX_ATTEMPTS,
+    AI_LOG_MAX_PENDING_SEC,
+    AI_LOG_QUEUE_SIZE,
+    AI_LOG_SPOOL_PATH,
+    AI_LOG_WORKERS,
+)
 import json
+import os
+import queue
+import threading
+import time
+import uuid
 
 logger = get_logger("AI_LOG")
-client = WeexClient.from_env()
 
 FAIL_COUNT = 0
 MAX_FAILURES = 3
 
+_queue = None
+_queue_lock = threading.Lock()
+
+@timed("ai_log_upload_seconds")
 def upload_ai_log(order_id: str, ai_log: dict):
     """
     Uploads AI log to WEEX validation endpoint.
     Payload must match competition specs.
     HALTS TRADING if repeated failures occur.
     """
-    global FAIL_COUNT
-    
     try:
-        # Prepare Payload
-        # NOTE: input/output MUST represent dicts. If they come as strings, user must fix upstream.
-        # Check types explicitly to prevent serialization errors or API rejection.
-        _input = ai_log.get("input", {})
-        if not isinstance(_input, dict):
-            _input = {"raw": str(_input)}
-            
-        _output = ai_log.get("output", {})
-        if not isinstance(_output, dict):
-            _output = {"raw": str(_output)}
-
-        # Explanation length check (max 1000)
-        expl = ai_log.get("explanation", "No explanation provided")
-        if len(expl) > 1000:
-            expl = expl[:997] + "..."
-
-        payload = {
-            "orderId": order_id if order_id else None,
-            "stage": ai_log.get("stage", "Decision Making"),
-            "model": ai_log.get("model", "gpt-4o-mini"),
-            "input": _input,
-            "output": _output,
-            "explanation": expl
-        }
-        
-        # DEBUG: Print exact payload so user can verify structure in logs
-        logger.debug(f"AI_LOG_PAYLOAD: {json.dumps(payload, default=str)}")
+        payload = _build_payload(order_id, ai_log)
 
         # Use the specific from_env client which has credentials
-        response = client.post("/capi/v2/order/uploadAiLog", payload)
-        
-        if response.get("code") == "00000":
-             logger.info(f"AI Log uploaded orderId={order_id} (Success)")
-             FAIL_COUNT = 0 # Reset on success
-        else:
-            logger.error(f"AI Log Upload Failed: {response}")
-            FAIL_COUNT += 1
+        response = WeexClient.shared().post("/capi/v2/order/uploadAiLog", payload)
+        _record_response(order_id, response)
+
+    except Exception as e:
+        _record_exception(e)
+
+    _check_kill_switch()
+
+@timed("ai_log_upload_seconds")
+async def upload_ai_log_async(order_id: str, ai_log: dict):
+    """
+    Async variant of upload_ai_log using the shared AsyncWeexClient.
+    Same payload rules and kill-switch semantics.
+    """
+    from exchange.async_weex_client import AsyncWeexClient
+    try:
+        payload = _build_payload(order_id, ai_log)
+        response = await AsyncWeexClient.shared().post("/capi/v2/order/uploadAiLog", payload)
+        _record_response(order_id, response)
 
     except Exception as e:
-        logger.error(f"Failed to upload AI log: {e}")
+        _record_exception(e)
+
+    _check_kill_switch()
+
+@timed("ai_log_enqueue_seconds")
+def enqueue_ai_log(order_id: str, ai_log: dict):
+    """
+    Hands the AI log to the background upload queue and returns immediately.
+    Raises SystemExit when the queue's kill switch has tripped.
+    """
+    get_ai_log_queue().put(order_id, ai_log)
+
+def get_ai_log_queue() -> "AILogQueue":
+    global _queue
+    if _queue is None:
+        with _queue_lock:
+            if _queue is None:
+                _queue = AILogQueue()
+                _queue.start()
+    return _queue
+
+def set_ai_log_queue(ai_log_queue: "AILogQueue | None") -> "AILogQueue | None":
+    """
+    Replaces the process-wide queue (e.g. with a throwaway spool for
+    benchmarks). The new queue must already be started. Returns the previous one.
+    """
+    global _queue
+    with _queue_lock:
+        previous, _queue = _queue, ai_log_queue
+        return previous
+
+def flush_ai_logs(timeout: float = 30.0) -> bool:
+    """
+    Waits until every queued log is uploaded. Returns False on timeout.
+    """
+    return _queue.flush(timeout) if _queue is not None else True
+
+class AILogQueue:
+    """
+    Background AI log uploader.
+
+    Every log is appended (and fsynced) to an on-disk spool before it is
+    queued and an ack line is appended once WEEX accepts it, so pending logs
+    survive crashes and power loss and are replayed on startup. Failed
+    uploads are retried with backoff and re-queued, never dropped.
+
+    Kill switch: MAX_FAILURES now counts consecutive logs that exhausted all
+    AI_LOG_MAX_ATTEMPTS, not single transient errors. The bot is also stopped
+    when a log stays pending longer than AI_LOG_MAX_PENDING_SEC or the
+    in-memory queue overflows.
+    """
+
+    def __init__(self, spool_path: str = AI_LOG_SPOOL_PATH, workers: int = AI_LOG_WORKERS, maxsize: int = AI_LOG_QUEUE_SIZE, max_attempts: int = AI_LOG_MAX_ATTEMPTS, max_pending_sec: float = AI_LOG_MAX_PENDING_SEC, upload=None):
+        self.spool_path = spool_path
+        self.workers = workers
+        self.max_attempts = max_attempts
+        self.max_pending_sec = max_pending_sec
+        self.upload = upload or _upload_once
+        self._queue = queue.Queue(maxsize=maxsize)
+        self._pending = {}  # id -> enqueue time (monotonic)
+        self._lock = threading.Lock()
+        self._spool = None
+        self._threads = []
+        self._tripped = None
+        self.stats = {"uploaded": 0, "retries": 0, "failed": 0}
+
+    def start(self):
+        os.makedirs(os.path.dirname(self.spool_path) or ".", exist_ok=True)
+        recovered = self._recover()
+        self._spool = open(self.spool_path, "a", encoding="utf-8")
+        with self._lock:
+            for record in recovered:
+                self._pending[record["id"]] = time.monotonic()
+        for record in recovered:
+            self._enqueue(record)
+        if recovered:
+            logger.info(f"Recovered {len(recovered)} pending AI logs from spool")
+
+        for i in range(self.workers):
+            thread = threading.Thread(target=self._worker, name=f"ai-log-{i}", daemon=True)
+            thread.start()
+            self._threads.append(thread)
+
+    def put(self, order_id: str, ai_log: dict):
+        self.check()
+        record = {"id": uuid.uuid4().hex, "order_id": order_id, "ai_log": ai_log}
+        with self._lock:
+            # Spool line and pending entry land together, so compaction never
+            # sees the log as sent before it is
+            self._write(record, sync=True)
+            self._pending[record["id"]] = time.monotonic()
+        self._enqueue(record)
+
+    def check(self):
+        """
+        Raises SystemExit if the kill switch has tripped (called on the trading path).
+        """
+        if self._tripped is None:
+            with self._lock:
+                oldest = min(self._pending.values(), default=None)
+            if oldest is not None and time.monotonic() - oldest > self.max_pending_sec:
+                self._trip(f"an AI log has been pending for over {self.max_pending_sec:.0f}s")
+        if self._tripped is not None:
+            logger.critical(self._tripped)
+            raise SystemExit(self._tripped)
+
+    def flush(self, timeout: float = 30.0) -> bool:
+        deadline = time.monotonic() + timeout
+        while time.monotonic() < deadline:
+            with self._lock:
+                if not self._pending:
+                    return True
+            time.sleep(0.05)
+        return False
+
+    def pending(self) -> int:
+        with self._lock:
+            return len(self._pending)
+
+    def _enqueue(self, record: dict):
+        # The record is already spooled and in self._pending
+        try:
+            self._queue.put_nowait(record)
+        except queue.Full:
+            # Still in the spool, so it is replayed after the restart
+            self._trip(f"AI log queue full ({self._queue.maxsize} pending)")
+
+    def _worker(self):
+        global FAIL_COUNT
+        while True:
+            record = self._queue.get()
+            for attempt in range(self.max_attempts):
+                if attempt:
+                    with self._lock:
+                        self.stats["retries"] += 1
+                    time.sleep(min(0.5 * 2 ** (attempt - 1), 10.0))
+                if self.upload(record["order_id"], record["ai_log"]):
+                    with self._lock:
+                        self._pending.pop(record["id"], None)
+                        self._write({"ack": record["id"]})
+                        self._compact_if_idle()
+                        self.stats["uploaded"] += 1
+                        FAIL_COUNT = 0
+                    break
+            else:
+                with self._lock:
+                    self.stats["failed"] += 1
+                    FAIL_COUNT += 1
+                logger.error(f"AI log {record['id']} failed {self.max_attempts} attempts ({FAIL_COUNT} in a row); re-queued")
+                if FAIL_COUNT >= MAX_FAILURES:
+                    self._trip(f"AI Logging failed {FAIL_COUNT} logs in a row")
+                time.sleep(1.0)
+                try:
+                    self._queue.put_nowait(record)
+                except queue.Full:
+                    self._trip("AI log queue full while re-queuing a failed log")
+
+    def _trip(self, reason: str):
+        if self._tripped is None:
+            self._tripped = f"CRITICAL: {reason}. Stopping bot to prevent disqualification."
+            logger.critical(self._tripped)
+
+    def _write(self, record: dict, sync: bool = False):
+        # Caller must hold self._lock. Logs are fsynced; a lost ack only
+        # means one re-upload after a crash, so acks are just flushed.
+        self._spool.write(json.dumps(record, default=str) + "\n")
+        self._spool.flush()
+        if sync:
+            os.fsync(self._spool.fileno())
+
+    def _compact_if_idle(self):
+        # Caller must hold self._lock. Nothing pending, so the spool can be emptied.
+        if not self._pending and self._spool.tell() > 1_000_000:
+            self._spool.seek(0)
+            self._spool.truncate()
+
+    def _recover(self) -> list:
+        """
+        Reads the spool and rewrites it atomically with only the records that
+        were never acked; returns those records.
+        """
+        if not os.path.exists(self.spool_path):
+            return []
+        records = {}
+        with open(self.spool_path, encoding="utf-8") as f:
+            for line in f:
+                try:
+                    entry = json.loads(line)
+                except ValueError:
+                    continue  # torn final line after a crash
+                if "ack" in entry:
+                    records.pop(entry["ack"], None)
+                elif "id" in entry:
+                    records[entry["id"]] = entry
+        tmp_path = self.spool_path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            for record in records.values():
+                f.write(json.dumps(record, default=str) + "\n")
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, self.spool_path)
+        return list(records.values())
+
+@timed("ai_log_upload_seconds")
+def _upload_once(order_id: str, ai_log: dict) -> bool:
+    try:
+        payload = _build_payload(order_id, ai_log)
+        response = WeexClient.shared().post("/capi/v2/order/uploadAiLog", payload)
+    except Exception as e:
+        metrics.inc("ai_log_uploads_total", outcome="error")
+        logger.warning(f"AI log upload attempt failed: {e}")
+        return False
+    if response.get("code") == "00000":
+        metrics.inc("ai_log_uploads_total", outcome="accepted")
+        logger.info(f"AI Log uploaded orderId={order_id} (Success)")
+        return True
+    metrics.inc("ai_log_uploads_total", outcome="rejected")
+    logger.warning(f"AI log upload rejected: {response}")
+    return False
+
+def _build_payload(order_id: str, ai_log: dict) -> dict:
+    # Prepare Payload
+    # NOTE: input/output MUST represent dicts. If they come as strings, user must fix upstream.
+    # Check types explicitly to prevent serialization errors or API rejection.
+    _input = ai_log.get("input", {})
+    if not isinstance(_input, dict):
+        _input = {"raw": str(_input)}
+        
+    _output = ai_log.get("output", {})
+    if not isinstance(_output, dict):
+        _output = {"raw": str(_output)}
+
+    # Explanation length check (max 1000)
+    expl = ai_log.get("explanation", "No explanation provided")
+    if len(expl) > 1000:
+        expl = expl[:997] + "..."
+
+    payload = {
+        "orderId": order_id if order_id else None,
+        "stage": ai_log.get("stage", "Decision Making"),
+        "model": ai_log.get("model", "gpt-4o-mini"),
+        "input": _input,
+        "output": _output,
+        "explanation": expl
+    }
+    
+    # DEBUG: Print exact payload so user can verify structure in logs
+    logger.debug(f"AI_LOG_PAYLOAD: {json.dumps(payload, default=str)}")
+    return payload
+
+def _record_response(order_id: str, response: dict):
+    global FAIL_COUNT
+    if response.get("code") == "00000":
+         logger.info(f"AI Log uploaded orderId={order_id} (Success)")
+         FAIL_COUNT = 0 # Reset on success
+    else:
+        logger.error(f"AI Log Upload Failed: {response}")
         FAIL_COUNT += 1
 
+def _record_exception(e: Exception):
+    global FAIL_COUNT
+    logger.error(f"Failed to upload AI log: {e}")
+    FAIL_COUNT += 1
+
+def _check_kill_switch():
     # CRITICAL: Disqualification Protection
     if FAIL_COUNT >= MAX_FAILURES:
         msg = f"CRITICAL: AI Logging failed {FAIL_COUNT} times. Stopping bot to prevent disqualification."
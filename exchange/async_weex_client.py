@@ -0,0 +1,106 @@
+import asyncio
+import time
+
+import aiohttp
+
+from config.settings import HTTP_POOL_SIZE, HTTP_MAX_RETRIES, HTTP_BACKOFF_FACTOR, HTTP_TIMEOUT_SEC
+from exchange.weex_client import RETRY_STATUSES, WeexClient
+from utils.rate_limiter import parse_retry_after
+
+
+class AsyncWeexClient(WeexClient):
+    """
+    asyncio counterpart of WeexClient built on aiohttp.
+    Signing (_sign/_headers) and the endpoint helpers (get_candles, place_order, ...)
+    are inherited; get/post are coroutines so every endpoint call must be awaited.
+    """
+
+    def __init__(
+        self,
+        api_key,
+        secret_key,
+        passphrase,
+        base_url,
+        pool_size=HTTP_POOL_SIZE,
+        max_retries=HTTP_MAX_RETRIES,
+        backoff_factor=HTTP_BACKOFF_FACTOR,
+        timeout=HTTP_TIMEOUT_SEC,
+        rate_limiter=None,
+    ):
+        super().__init__(
+            api_key,
+            secret_key,
+            passphrase,
+            base_url,
+            pool_size=pool_size,
+            max_retries=max_retries,
+            backoff_factor=backoff_factor,
+            timeout=timeout,
+            rate_limiter=rate_limiter,
+        )
+        self.pool_size = pool_size
+
+    @staticmethod
+    def _build_session(pool_size, max_retries, backoff_factor):
+        # aiohttp sessions must be created inside a running loop; see _get_session
+        return None
+
+    def _get_session(self):
+        if self.session is None or self.session.closed:
+            connector = aiohttp.TCPConnector(limit=self.pool_size, keepalive_timeout=30)
+            self.session = aiohttp.ClientSession(
+                connector=connector,
+                timeout=aiohttp.ClientTimeout(total=self.timeout),
+                headers={"Accept-Encoding": "gzip, deflate"},
+            )
+        return self.session
+
+    async def _request(self, method, path, url, **kwargs):
+        """
+        Mirrors WeexClient's retry policy: GETs are retried on 5xx with
+        backoff and on 429 once the paused bucket lets them through; POSTs
+        only on connection failures.
+        """
+        session = self._get_session()
+        attempt = 0
+        while True:
+            await self.rate_limiter.acquire_async(path)
+            start = time.perf_counter()
+            ok = False
+            try:
+                async with session.request(method, url, **kwargs) as response:
+                    if response.status == 429:
+                        self.rate_limiter.throttled(path, parse_retry_after(response.headers.get("Retry-After")))
+                    if method == "GET" and response.status in RETRY_STATUSES and attempt < self.max_retries:
+                        # After a 429 the bucket itself holds the retry back
+                        delay = 0.0 if response.status == 429 else self.backoff_factor * (2 ** attempt)
+                    else:
+                        response.raise_for_status()
+                        data = await response.json(content_type=None)
+                        ok = True
+                        return data
+            except aiohttp.ClientConnectorError:
+                if attempt >= self.max_retries:
+                    raise
+                delay = self.backoff_factor * (2 ** attempt)
+            finally:
+                self._record(path, time.perf_counter() - start, ok)
+            attempt += 1
+            if delay:
+                await asyncio.sleep(delay)
+
+    async def get(self, path, params=None, private=False):
+        url, headers = self._prepare_get(path, params, private)
+        return await self._request("GET", path, url, headers=headers)
+
+    async def post(self, path, body, private=True):
+        url, headers, body_json = self._prepare_post(path, body)
+        return await self._request("POST", path, url, headers=headers, data=body_json)
+
+    async def close(self):
+        if self.session is not None and not self.session.closed:
+            await self.session.close()
+
+    async def upload_ai_log(self, payload):
+        return super().upload_ai_log(payload)
+
@@ -1,91 +1,356 @@
+import asyncio
+import json
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+
+from config.settings import ORDER_MAX_RETRIES, ORDER_RETRY_BACKOFF_SEC
 from exchange.weex_client import WeexClient
 from utils.logger import get_logger
+from utils.metrics import metrics, timed
 
 logger = get_logger("EXCHANGE")
 
-# Global client instance (could be singleton or passed in)
-client = WeexClient.from_env()
 
+@timed("place_order_seconds")
 def place_order(symbol: str, side: str, size: float, leverage: int, take_profit: float | None = None, stop_loss: float | None = None) -> str:
     """
     Executes a market order on WEEX.
     Returns: orderId (str) or None if failed.
     """
-    if side not in ["BUY", "SELL"]: # Explicitly reject everything else
-        return None
+    return get_gateway().submit(symbol, side, size, leverage, take_profit, stop_loss)
 
-    logger.info(f"Placing {side} order for {symbol}: size={size}, lev={leverage}x")
-
-    try:
-
-        # 2. Place Market Order
-        # WEEX API: /capi/v2/order/placeOrder
-        # "type": "market" might be mapped to type code, checking docs or user prompt examples.
-        # User prompt example 2 uses "type": "1" (Limit). 
-        # Standard WEEX usually: type="market" or type="2" (Market). 
-        # Safest assumption implies text "market" or explicit param.
-        # Let's use string "market" as user prompt says "Support market orders only".
-        
-        # We need to ensure 'side' matches API expectation (usually 1=open long, 2=close short...)
-        # STARTUP WARNING: This part requires exact API knowledge.
-        # For now, we assume strict mapping:
-        # If the client library handles mapping "BUY" -> proper code, good.
-        # If not, we might fail. Given WeexClient is generic, we should map here if we knew codes.
-        # Assuming "side": "BUY" works or Weex accepts standard strings.
-        
-        if side == "SELL" and (take_profit is None or stop_loss is None):
-            logger.error("Refusing to place entry order without TP/SL.")
-            return None
+@timed("place_order_seconds")
+async def place_order_async(symbol: str, side: str, size: float, leverage: int, take_profit: float | None = None, stop_loss: float | None = None) -> str:
+    """
+    Async variant of place_order using the shared AsyncWeexClient.
+    """
+    return await get_gateway().submit_async(symbol, side, size, leverage, take_profit, stop_loss)
 
-        payload = {
-            "symbol": symbol,
-            "side": side, # "BUY" or "SELL"
-            "type": "market", # Market order
-            "quantity": str(size), # Usually quantity/size
-            "leverage": str(leverage)
-        }
+def set_leverage(symbol: str, leverage: int):
+    get_gateway().ensure_leverage(symbol, leverage)
+
+async def set_leverage_async(symbol: str, leverage: int):
+    await get_gateway().ensure_leverage_async(symbol, leverage)
+
+
+class OrderTemplate:
+    """
+    Pre-serialized JSON for one symbol's market orders. The constant fields
+    are encoded once; render() only appends the per-order fields, and the
+    resulting string is signed and sent as is.
+    """
 
+    def __init__(self, symbol: str):
+        self.symbol = symbol
+        # '{"symbol": "...", "type": "market"' without the closing brace
+        self.prefix = json.dumps({"symbol": symbol, "type": "market"})[:-1]
+
+    def render(self, client_oid: str, side: str, size: float, leverage: int, take_profit: float | None, stop_loss: float | None) -> str:
+        parts = [
+            self.prefix,
+            f', "side": "{side}", "quantity": "{size}", "leverage": "{leverage}", "client_oid": "{client_oid}"',
+        ]
         if take_profit is not None:
-            payload["presetTakeProfitPrice"] = str(take_profit)
+            parts.append(f', "presetTakeProfitPrice": "{take_profit}"')
         if stop_loss is not None:
-            payload["presetStopLossPrice"] = str(stop_loss)
-        
-        # Double check types
+            parts.append(f', "presetStopLossPrice": "{stop_loss}"')
+        parts.append("}")
+        return "".join(parts)
+
+
+class ExecutionGateway:
+    """
+    Order entry for the shared WEEX client.
+
+    - Leverage is cached per symbol; change_leverage is only POSTed when the
+      requested value differs from the last one the exchange accepted.
+    - Every order carries a client_oid. After a timeout, connection error or
+      5xx the order may or may not exist, so it is looked up by client_oid and
+      only resubmitted (same id, up to ORDER_MAX_RETRIES) when the exchange
+      has no such order. WEEX refuses a client_oid it has already seen; that
+      rejection is treated as "look it up" too, never as a failed order.
+    - Bodies come from per-symbol OrderTemplates and are sent pre-serialized.
+
+    Thread-safe: symbols deciding in the same cycle submit concurrently.
+    """
+
+    def __init__(self, max_retries: int = ORDER_MAX_RETRIES, retry_backoff: float = ORDER_RETRY_BACKOFF_SEC):
+        self.max_retries = max_retries
+        self.retry_backoff = retry_backoff
+        self._templates = {}
+        self._leverage = {}
+        self._leverage_client = None
+        self._pending = {}  # symbol -> (leverage, future) of a prewarm in flight
+        self._prewarm_pool = ThreadPoolExecutor(max_workers=2, thread_name_prefix="leverage")
+        self._lock = threading.Lock()
+
+    # ---- Leverage ----
+    def _cached_leverage(self, client, symbol: str):
+        with self._lock:
+            if client is not self._leverage_client:
+                # A different account (e.g. simulator swapped in): forget everything
+                self._leverage = {}
+                self._leverage_client = client
+            return self._leverage.get(symbol)
+
+    def _remember_leverage(self, client, symbol: str, leverage: int, response) -> bool:
+        ok = isinstance(response, dict) and response.get("code") == "00000"
+        if ok:
+            with self._lock:
+                if client is self._leverage_client:
+                    self._leverage[symbol] = leverage
+        else:
+            logger.warning(f"Leverage change for {symbol} rejected: {response}")
+        return ok
+
+    def prewarm_leverage(self, symbol: str, leverage: int):
+        """
+        Starts ensure_leverage in the background, e.g. as soon as a streamed
+        decision names its leverage; the order's own ensure_leverage then
+        waits for this request instead of sending another.
+        """
+        leverage = int(leverage)
+        if self._cached_leverage(WeexClient.shared(), symbol) == leverage:
+            return
+        with self._lock:
+            pending = self._pending.get(symbol)
+            if pending is not None and pending[0] == leverage and not pending[1].done():
+                return
+            self._pending[symbol] = (leverage, self._prewarm_pool.submit(self._set_leverage, symbol, leverage))
+
+    def ensure_leverage(self, symbol: str, leverage: int) -> bool:
+        leverage = int(leverage)
+        with self._lock:
+            pending = self._pending.pop(symbol, None)
+        if pending is not None:
+            # Let an in-flight change land first so the two cannot race
+            ok = pending[1].result()
+            if pending[0] == leverage:
+                return ok
+        return self._set_leverage(symbol, leverage)
+
+    def _set_leverage(self, symbol: str, leverage: int) -> bool:
+        client = WeexClient.shared()
+        if self._cached_leverage(client, symbol) == leverage:
+            metrics.inc("leverage_cache_total", outcome="hit")
+            return True
+        metrics.inc("leverage_cache_total", outcome="miss")
+        try:
+            return self._remember_leverage(client, symbol, leverage, client.change_leverage(symbol, leverage))
+        except Exception as e:
+            logger.warning(f"Failed to set leverage: {e}")
+            return False
+
+    async def ensure_leverage_async(self, symbol: str, leverage: int) -> bool:
+        from exchange.async_weex_client import AsyncWeexClient
+        client = AsyncWeexClient.shared()
+        leverage = int(leverage)
+        if self._cached_leverage(client, symbol) == leverage:
+            metrics.inc("leverage_cache_total", outcome="hit")
+            return True
+        metrics.inc("leverage_cache_total", outcome="miss")
+        try:
+            return self._remember_leverage(client, symbol, leverage, await client.change_leverage(symbol, leverage))
+        except Exception as e:
+            logger.warning(f"Failed to set leverage: {e}")
+            return False
+
+    # ---- Orders ----
+    def prepare(self, symbol: str, side: str, size: float, leverage: int, take_profit: float | None = None, stop_loss: float | None = None) -> tuple | None:
+        """
+        Validates an order and renders its body. Returns (client_oid, body_json)
+        or None when the order must not be sent.
+        """
+        if side not in ("BUY", "SELL"):  # Explicitly reject everything else
+            return None
+        if side == "SELL" and (take_profit is None or stop_loss is None):
+            logger.error("Refusing to place entry order without TP/SL.")
+            return None
         if not isinstance(size, (int, float)) or size <= 0:
-             logger.error(f"Invalid size: {size}")
-             return None
-
-        response = client.place_order(payload)
-
-        if isinstance(response, dict):
-            if response.get("code") == "00000":
-                order_id = response.get("data", {}).get("orderId") or response.get("data", {}).get("order_id")
-                logger.info(f"Order executed: {order_id}")
-                return order_id
-            if "order_id" in response:
-                order_id = response.get("order_id")
-                logger.info(f"Order executed: {order_id}")
-                return order_id
-            logger.error(f"Order failed: {response}")
+            logger.error(f"Invalid size: {size}")
+            return None
+
+        template = self._templates.get(symbol)
+        if template is None:
+            template = self._templates.setdefault(symbol, OrderTemplate(symbol))
+        client_oid = uuid.uuid4().hex
+        logger.info(f"Placing {side} order for {symbol}: size={size}, lev={leverage}x, client_oid={client_oid}")
+        return client_oid, template.render(client_oid, side, size, leverage, take_profit, stop_loss)
+
+    def submit(self, symbol: str, side: str, size: float, leverage: int, take_profit: float | None = None, stop_loss: float | None = None) -> str | None:
+        prepared = self.prepare(symbol, side, size, leverage, take_profit, stop_loss)
+        if prepared is None:
+            return None
+        client_oid, body = prepared
+        self.ensure_leverage(symbol, leverage)
+
+        client = WeexClient.shared()
+        uncertain = False
+        # One extra round so the last uncertain submission is still looked up
+        for attempt in range(self.max_retries + 2):
+            if uncertain:
+                time.sleep(self.retry_backoff * 2 ** (attempt - 1))
+                try:
+                    record = _find_order(client.get_history_orders(symbol), client_oid) or _find_order(client.get_current_orders(symbol), client_oid)
+                except Exception as e:
+                    logger.warning(f"Lookup of order {client_oid} for {symbol} failed: {e}")
+                    continue
+                if record is not None:
+                    return _recovered_order_id(symbol, client_oid, record)
+                if attempt > self.max_retries:
+                    break
+                metrics.inc("order_retries_total")
+                logger.warning(f"Order {client_oid} for {symbol} is not on the exchange; resubmitting")
+            try:
+                response = client.place_order(body)
+            except Exception as e:
+                if not _retryable(e):
+                    metrics.inc("orders_total", outcome="error")
+                    logger.error(f"Execution exception for {symbol}: {e}")
+                    return None
+                uncertain = True
+                logger.warning(f"Order {client_oid} for {symbol} uncertain ({e}); looking it up before any retry")
+                continue
+            if _duplicate_client_oid(response):
+                uncertain = True
+                continue
+            return _parse_order_response(response)
+        return _unresolved(symbol, client_oid)
+
+    async def submit_async(self, symbol: str, side: str, size: float, leverage: int, take_profit: float | None = None, stop_loss: float | None = None) -> str | None:
+        from exchange.async_weex_client import AsyncWeexClient
+        prepared = self.prepare(symbol, side, size, leverage, take_profit, stop_loss)
+        if prepared is None:
             return None
+        client_oid, body = prepared
+        await self.ensure_leverage_async(symbol, leverage)
+
+        client = AsyncWeexClient.shared()
+        uncertain = False
+        for attempt in range(self.max_retries + 2):
+            if uncertain:
+                await asyncio.sleep(self.retry_backoff * 2 ** (attempt - 1))
+                try:
+                    record = _find_order(await client.get_history_orders(symbol), client_oid) or _find_order(await client.get_current_orders(symbol), client_oid)
+                except Exception as e:
+                    logger.warning(f"Lookup of order {client_oid} for {symbol} failed: {e}")
+                    continue
+                if record is not None:
+                    return _recovered_order_id(symbol, client_oid, record)
+                if attempt > self.max_retries:
+                    break
+                metrics.inc("order_retries_total")
+                logger.warning(f"Order {client_oid} for {symbol} is not on the exchange; resubmitting")
+            try:
+                response = await client.place_order(body)
+            except Exception as e:
+                if not _retryable(e):
+                    metrics.inc("orders_total", outcome="error")
+                    logger.error(f"Execution exception for {symbol}: {e}")
+                    return None
+                uncertain = True
+                logger.warning(f"Order {client_oid} for {symbol} uncertain ({e}); looking it up before any retry")
+                continue
+            if _duplicate_client_oid(response):
+                uncertain = True
+                continue
+            return _parse_order_response(response)
+        return _unresolved(symbol, client_oid)
+
+
+def _retryable(e: Exception) -> bool:
+    """
+    Failures after which the order may or may not exist on the exchange.
+    """
+    import aiohttp
+
+    if isinstance(e, (requests.Timeout, requests.ConnectionError, asyncio.TimeoutError, aiohttp.ClientConnectionError)):
+        return True
+    status = getattr(getattr(e, "response", None), "status_code", None) or getattr(e, "status", None)
+    return status is not None and (status == 429 or status >= 500)
+
 
-        logger.error(f"Unexpected order response: {response}")
+def _duplicate_client_oid(response) -> bool:
+    """
+    WEEX refuses a client_oid it has already seen, which means an earlier
+    attempt reached the exchange. Matched on the message, since the error
+    code is not documented.
+    """
+    if not isinstance(response, dict) or response.get("code") in (None, "00000"):
+        return False
+    message = str(response.get("msg", "")).lower().replace("clientoid", "client_oid")
+    return "client_oid" in message and ("duplicate" in message or "exist" in message)
+
+
+def _find_order(response, client_oid: str) -> dict | None:
+    """
+    The order with `client_oid` in a current/history orders response.
+    """
+    data = response.get("data", response) if isinstance(response, dict) else response
+    if isinstance(data, dict):
+        data = data.get("list") or data.get("orders") or []
+    for record in data if isinstance(data, list) else []:
+        if isinstance(record, dict) and client_oid in (record.get("client_oid"), record.get("clientOid")):
+            return record
+    return None
+
+
+# Order states in which nothing was (or will be) filled
+_DEAD_ORDER_STATUSES = {"canceled", "cancelled", "rejected", "failed", "expired"}
+
+def _recovered_order_id(symbol: str, client_oid: str, record: dict) -> str | None:
+    order_id = record.get("order_id") or record.get("orderId")
+    status = str(record.get("status", "")).lower()
+    if status in _DEAD_ORDER_STATUSES:
+        metrics.inc("orders_total", outcome="rejected")
+        logger.error(f"Order {client_oid} for {symbol} reached the exchange but was {status}")
         return None
+    metrics.inc("orders_total", outcome="recovered")
+    logger.info(f"Order {client_oid} for {symbol} found on the exchange: {order_id}")
+    return order_id
+
+def _unresolved(symbol: str, client_oid: str) -> None:
+    metrics.inc("orders_total", outcome="unknown")
+    logger.error(
+        f"Order {client_oid} for {symbol} could not be confirmed or ruled out; "
+        f"position reconciliation will adopt it if it filled"
+    )
+    return None
+
+
+_gateway = None
+_gateway_lock = threading.Lock()
 
-    except Exception as e:
-        logger.error(f"Execution exception for {symbol}: {e}")
+def get_gateway() -> ExecutionGateway:
+    global _gateway
+    if _gateway is None:
+        with _gateway_lock:
+            if _gateway is None:
+                _gateway = ExecutionGateway()
+    return _gateway
+
+def _parse_order_response(response) -> str | None:
+    if isinstance(response, dict):
+        if response.get("code") == "00000":
+            order_id = response.get("data", {}).get("orderId") or response.get("data", {}).get("order_id")
+            metrics.inc("orders_total", outcome="accepted")
+            logger.info(f"Order executed: {order_id}")
+            return order_id
+        if "order_id" in response:
+            order_id = response.get("order_id")
+            metrics.inc("orders_total", outcome="accepted")
+            logger.info(f"Order executed: {order_id}")
+            return order_id
+        metrics.inc("orders_total", outcome="rejected")
+        logger.error(f"Order failed: {response}")
         return None
 
-def set_leverage(symbol: str, leverage: int):
-    try:
-        # Check config/cache if leverage needs update?
-        # For safety, we set it every time or catch errors
-        client.change_leverage(symbol, leverage)
-    except Exception as e:
-        logger.warning(f"Failed to set leverage: {e}")
-
-class OrderManager:
-    # Legacy class, kept for compatibility if needed or removed if unused.
-    # The prompt asked to "Implement exchange/orders.py" with responsibilities.
-    # I will keep the function-based approach for 'place_order' as requested by runner/trader.py
-    pass
+    logger.error(f"Unexpected order response: {response}")
+    return None
+
+# The old placeholder name for the order-entry class
+OrderManager = ExecutionGateway
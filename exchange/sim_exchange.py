@@ -0,0 +1,338 @@
+import itertools
+import json
+import threading
+
+from config.settings import MAX_LEVERAGE
+from exchange.weex_client import WeexClient
+from utils.logger import get_logger
+
+logger = get_logger("SIM_EXCHANGE")
+
+OK = "00000"
+
+
+class SimulatedExchange:
+    """
+    In-memory WEEX futures account with a market-order matching engine.
+
+    Prices come from set_bar(): market orders fill at the bar's `fill_price`
+    (normally the next bar's open) plus slippage, and preset TP/SL levels are
+    checked against each new bar's high/low. Positions are one-way (net) per
+    symbol, taker fees are charged on every fill and funding is settled by
+    apply_funding(). handle() answers requests in WEEX response shapes so the
+    engine can sit behind SimulatedWeexClient or an HTTP server.
+    """
+
+    def __init__(self, initial_balance: float = 1000.0, taker_fee: float = 0.0006, slippage_bps: float = 2.0, max_leverage: int = MAX_LEVERAGE):
+        self.initial_balance = float(initial_balance)
+        self.balance = float(initial_balance)
+        self.taker_fee = taker_fee
+        self.slippage = slippage_bps / 10_000
+        self.max_leverage = max_leverage
+        self.positions = {}
+        self.leverage = {}
+        self.bars = {}
+        self.funding_rates = {}
+        self.trades = []
+        self.fees_paid = 0.0
+        self.funding_paid = 0.0
+        self.ai_logs = 0
+        self.now = 0
+        self._order_ids = itertools.count(1)
+        self.orders = 0
+        self.rejected = 0
+        self.order_history = []  # filled orders, newest last, as the history endpoint lists them
+        self.client_orders = {}  # client_oid -> history entry; a reused client_oid is rejected
+        self._lock = threading.RLock()
+
+    # ---- Market data ----
+    def set_bar(self, symbol: str, time_ms: int, open_: float, high: float, low: float, close: float, volume: float = 0.0, fill_price: float | None = None) -> list:
+        """
+        Advances `symbol` to a new bar and fires any TP/SL it crosses.
+        Returns the trades closed by triggers.
+        """
+        with self._lock:
+            self.now = max(self.now, int(time_ms))
+            self.bars[symbol] = {
+                "time": int(time_ms),
+                "open": float(open_),
+                "high": float(high),
+                "low": float(low),
+                "close": float(close),
+                "volume": float(volume),
+                "fill": float(fill_price if fill_price is not None else close),
+            }
+            position = self.positions.get(symbol)
+            if position is None or position["opened_at"] >= time_ms:
+                return []
+            return self._check_triggers(symbol, position, self.bars[symbol])
+
+    def _check_triggers(self, symbol: str, position: dict, bar: dict) -> list:
+        short = position["side"] == "SHORT"
+        sl, tp = position.get("stop_loss"), position.get("take_profit")
+        # Both levels inside one bar: assume the stop filled first
+        if sl and (bar["high"] >= sl if short else bar["low"] <= sl):
+            # A gap through the level fills at the open
+            price = max(sl, bar["open"]) if short else min(sl, bar["open"])
+            return [self._close(symbol, self._slipped(price, buy=short), "stop_loss")]
+        if tp and (bar["low"] <= tp if short else bar["high"] >= tp):
+            price = min(tp, bar["open"]) if short else max(tp, bar["open"])
+            return [self._close(symbol, price, "take_profit")]
+        return []
+
+    def apply_funding(self, symbol: str, rate: float):
+        """
+        Settles one funding interval at the current mark: longs pay shorts
+        when the rate is positive.
+        """
+        with self._lock:
+            self.funding_rates[symbol] = float(rate)
+            position = self.positions.get(symbol)
+            if position is None:
+                return
+            notional = position["size"] * self.mark_price(symbol)
+            payment = notional * rate * (1 if position["side"] == "LONG" else -1)
+            self.balance -= payment
+            self.funding_paid += payment
+            position["funding"] = position.get("funding", 0.0) + payment
+
+    def mark_price(self, symbol: str) -> float:
+        bar = self.bars.get(symbol)
+        return bar["close"] if bar else 0.0
+
+    # ---- Account ----
+    def unrealized_pnl(self, symbol: str) -> float:
+        position = self.positions.get(symbol)
+        if position is None:
+            return 0.0
+        move = self.mark_price(symbol) - position["entry_price"]
+        return move * position["size"] * (1 if position["side"] == "LONG" else -1)
+
+    def equity(self) -> float:
+        with self._lock:
+            return self.balance + sum(self.unrealized_pnl(s) for s in self.positions)
+
+    def used_margin(self) -> float:
+        return sum(p["size"] * p["entry_price"] / p["leverage"] for p in self.positions.values())
+
+    def available(self) -> float:
+        with self._lock:
+            return self.equity() - self.used_margin()
+
+    # ---- Orders ----
+    def _slipped(self, price: float, buy: bool) -> float:
+        return price * (1 + self.slippage) if buy else price * (1 - self.slippage)
+
+    def place_order(self, symbol: str, side: str, quantity: float, leverage: int | None = None, take_profit: float | None = None, stop_loss: float | None = None) -> tuple:
+        """
+        Market order. Returns (order_id, None) or (None, error message).
+        An order against the open side reduces/closes; otherwise it opens or adds.
+        """
+        with self._lock:
+            self.orders += 1
+            bar = self.bars.get(symbol)
+            if bar is None:
+                return self._reject(f"No market for {symbol}")
+            if side not in ("BUY", "SELL") or quantity <= 0:
+                return self._reject(f"Invalid order {side} {quantity}")
+            leverage = int(leverage or self.leverage.get(symbol, 1))
+            if not 1 <= leverage <= self.max_leverage:
+                return self._reject(f"Leverage {leverage} out of range")
+
+            buy = side == "BUY"
+            price = self._slipped(bar["fill"], buy)
+            position = self.positions.get(symbol)
+            order_id = f"sim-{next(self._order_ids)}"
+
+            if position is not None and (position["side"] == "SHORT") == buy:
+                self._close(symbol, price, "order", quantity=quantity)
+                return order_id, None
+
+            notional = quantity * price
+            fee = notional * self.taker_fee
+            if notional / leverage + fee > self.available():
+                return self._reject(f"Insufficient balance for {notional:.2f} notional at {leverage}x")
+
+            self.balance -= fee
+            self.fees_paid += fee
+            if position is None:
+                self.positions[symbol] = {
+                    "side": "LONG" if buy else "SHORT",
+                    "size": quantity,
+                    "entry_price": price,
+                    "leverage": leverage,
+                    "take_profit": take_profit,
+                    "stop_loss": stop_loss,
+                    "opened_at": bar["time"],
+                    "fees": fee,
+                    "funding": 0.0,
+                }
+            else:
+                total = position["size"] + quantity
+                position["entry_price"] = (position["entry_price"] * position["size"] + price * quantity) / total
+                position["size"] = total
+                position["fees"] += fee
+                position["take_profit"] = take_profit or position["take_profit"]
+                position["stop_loss"] = stop_loss or position["stop_loss"]
+            return order_id, None
+
+    def _reject(self, message: str) -> tuple:
+        self.rejected += 1
+        return None, message
+
+    def _close(self, symbol: str, price: float, reason: str, quantity: float | None = None) -> dict:
+        position = self.positions[symbol]
+        size = min(quantity or position["size"], position["size"])
+        fee = size * price * self.taker_fee
+        direction = 1 if position["side"] == "LONG" else -1
+        pnl = (price - position["entry_price"]) * size * direction
+        self.balance += pnl - fee
+        self.fees_paid += fee
+
+        share = size / position["size"]
+        trade = {
+            "symbol": symbol,
+            "side": position["side"],
+            "size": size,
+            "entry_price": position["entry_price"],
+            "exit_price": price,
+            "opened_at": position["opened_at"],
+            "closed_at": self.bars[symbol]["time"],
+            "pnl": pnl,
+            "fees": position["fees"] * share + fee,
+            "funding": position.get("funding", 0.0) * share,
+            "reason": reason,
+        }
+        trade["net_pnl"] = trade["pnl"] - trade["fees"] - trade["funding"]
+        self.trades.append(trade)
+
+        if size >= position["size"]:
+            del self.positions[symbol]
+        else:
+            position["size"] -= size
+            position["fees"] *= 1 - share
+            position["funding"] = position.get("funding", 0.0) * (1 - share)
+        return trade
+
+    # ---- WEEX request routing ----
+    def handle(self, method: str, path: str, params: dict | None = None, body: dict | None = None) -> dict:
+        params = params or {}
+        body = body or {}
+        route = path.rsplit("/", 1)[-1]
+        handler = getattr(self, f"_route_{route}", None)
+        if handler is None:
+            return {"code": "40404", "msg": f"Unsupported endpoint {method} {path}"}
+        return handler(params, body)
+
+    def _route_ticker(self, params, body):
+        symbol = params.get("symbol")
+        if symbol not in self.bars:
+            return {"code": "40034", "msg": f"Unknown symbol {symbol}"}
+        return {"code": OK, "data": {"symbol": symbol, "ticker": {"last": str(self.mark_price(symbol))}}}
+
+    def _route_currentFundRate(self, params, body):
+        symbol = params.get("symbol")
+        symbols = [symbol] if symbol else list(self.bars)
+        return {"code": OK, "data": [
+            {"symbol": s, "fundingRate": str(self.funding_rates.get(s, 0.0))} for s in symbols
+        ]}
+
+    def _route_getAccounts(self, params, body):
+        with self._lock:
+            return {"code": OK, "data": {
+                "collateral": [{"coin": "USDT", "amount": str(round(self.equity(), 8))}],
+                "position": [
+                    {
+                        "symbol": symbol,
+                        "side": p["side"],
+                        "size": str(p["size"]),
+                        "open_value": str(p["size"] * p["entry_price"]),
+                        "leverage": str(p["leverage"]),
+                        "unrealizePnl": str(round(self.unrealized_pnl(symbol), 8)),
+                    }
+                    for symbol, p in self.positions.items()
+                ],
+            }}
+
+    def _route_leverage(self, params, body):
+        symbol = body.get("symbol")
+        try:
+            leverage = int(float(body.get("leverage", 0)))
+        except (TypeError, ValueError):
+            leverage = 0
+        if not 1 <= leverage <= self.max_leverage:
+            return {"code": "40017", "msg": f"Invalid leverage {body.get('leverage')}"}
+        self.leverage[symbol] = leverage
+        return {"code": OK, "data": {"symbol": symbol, "leverage": str(leverage)}}
+
+    def _route_placeOrder(self, params, body):
+        def number(key):
+            value = body.get(key)
+            return float(value) if value not in (None, "") else None
+
+        client_oid = body.get("client_oid")
+        with self._lock:
+            if client_oid and client_oid in self.client_orders:
+                # Like WEEX: a resubmission is refused, not answered with the first order
+                self.rejected += 1
+                return {"code": "40762", "msg": f"Duplicate client_oid {client_oid}: order already exists"}
+            try:
+                order_id, error = self.place_order(
+                    body.get("symbol"),
+                    str(body.get("side", "")).upper(),
+                    number("quantity") or 0.0,
+                    leverage=int(float(body["leverage"])) if body.get("leverage") else None,
+                    take_profit=number("presetTakeProfitPrice"),
+                    stop_loss=number("presetStopLossPrice"),
+                )
+            except (TypeError, ValueError) as e:
+                order_id, error = None, f"Bad order parameters: {e}"
+            if error:
+                return {"code": "40762", "msg": error}
+            entry = {
+                "order_id": order_id,
+                "client_oid": client_oid,
+                "symbol": body.get("symbol"),
+                "side": str(body.get("side", "")).upper(),
+                "size": str(body.get("quantity")),
+                "status": "filled",
+                "createTime": self.now,
+            }
+            self.order_history.append(entry)
+            if client_oid:
+                self.client_orders[client_oid] = entry
+        return {"code": OK, "data": {"orderId": order_id, "client_oid": client_oid}}
+
+    def _route_history(self, params, body):
+        symbol = params.get("symbol")
+        limit = int(params.get("pageSize") or 100)
+        with self._lock:
+            orders = [dict(o) for o in reversed(self.order_history) if not symbol or o["symbol"] == symbol]
+        return {"code": OK, "data": {"list": orders[:limit]}}
+
+    def _route_current(self, params, body):
+        # Market orders fill (or are rejected) on arrival, so nothing is ever open
+        return {"code": OK, "data": {"list": []}}
+
+    def _route_uploadAiLog(self, params, body):
+        self.ai_logs += 1
+        return {"code": OK, "data": {}}
+
+
+class SimulatedWeexClient(WeexClient):
+    """
+    WeexClient whose get/post are answered in-process by a SimulatedExchange.
+    Endpoint helpers (get_accounts, place_order, ...) are inherited unchanged.
+    """
+
+    def __init__(self, exchange: SimulatedExchange):
+        super().__init__("sim", "sim", "sim", "http://simulated")
+        self.exchange = exchange
+
+    def get(self, path, params=None, private=False):
+        return self.exchange.handle("GET", path, params=params)
+
+    def post(self, path, body, private=True):
+        if isinstance(body, str):
+            body = json.loads(body)
+        return self.exchange.handle("POST", path, body=body)
@@ -0,0 +1,335 @@
+"""
+Localhost WEEX futures API backed by SimulatedExchange, so the bot, the
+connection checks and benchmarks can run without credentials or network.
+
+    python -m exchange.sim_server --port 8088 --bar-interval 5 --latency-ms 40
+
+then export WEEX_BASE_URL=http://127.0.0.1:8088 and the printed sim keys.
+Serves the /capi/v2 endpoints WeexClient uses: candles, historyCandles,
+ticker, currentFundRate, getHistoryFundRate, getAccounts, leverage,
+placeOrder, order current/history and uploadAiLog. Private endpoints check
+the ACCESS-* headers and the HMAC signature exactly as WEEX does. Prices come from a SymbolHistory per
+symbol; the clock moves one bar per advance() (or every `bar_interval`
+seconds), firing TP/SL and funding in the matching engine.
+"""
+import argparse
+import asyncio
+import base64
+import hashlib
+import hmac
+import json
+import os
+import random
+import threading
+
+import numpy as np
+
+from config.settings import ALLOWED_SYMBOLS, CANDLE_WINDOW, TIMEFRAME
+from exchange.sim_exchange import OK, SimulatedExchange
+from utils.logger import get_logger
+from utils.time import now_ms, timeframe_to_ms
+
+logger = get_logger("SIM_SERVER")
+
+SIM_API_KEY = "sim-key"
+SIM_SECRET_KEY = "sim-secret"
+SIM_PASSPHRASE = "sim-pass"
+
+PRIVATE_ROUTES = {"getAccounts", "leverage", "placeOrder", "current", "history", "uploadAiLog"}
+MARKET_ROUTES = {"candles", "historyCandles", "getHistoryFundRate"}
+
+
+class WeexSimServer:
+    """
+    Each request waits `latency_ms` (+/- jitter); with probability
+    `error_rate` it answers HTTP 500 and with `throttle_rate` HTTP 429 with a
+    Retry-After header. Requests are counted per endpoint in `stats`.
+    """
+
+    def __init__(self, histories: dict, exchange: SimulatedExchange | None = None, start_index: int = CANDLE_WINDOW - 1,
+                 host: str = "127.0.0.1", port: int = 0, api_key: str = SIM_API_KEY, secret_key: str = SIM_SECRET_KEY,
+                 passphrase: str = SIM_PASSPHRASE, verify_signatures: bool = True, max_clock_skew_ms: int = 30_000,
+                 latency_ms: float = 0.0, jitter_ms: float = 0.0, error_rate: float = 0.0, throttle_rate: float = 0.0,
+                 bar_interval: float = 0.0, seed=None):
+        self.exchange = exchange or SimulatedExchange()
+        self.symbols = list(histories)
+        times = histories[self.symbols[0]].time
+        for history in histories.values():
+            times = np.intersect1d(times, history.time)
+        self.times = times
+        self.bars = {}
+        self.funding = {}
+        for symbol, history in histories.items():
+            self.bars[symbol] = history.ohlcv()[np.searchsorted(history.time, times)]
+            self.funding[symbol] = (history.funding_time, history.funding_rate)
+
+        self.host = host
+        self.port = port
+        self.api_key = api_key
+        self.secret_key = secret_key
+        self.passphrase = passphrase
+        self.verify_signatures = verify_signatures
+        self.max_clock_skew_ms = max_clock_skew_ms
+        self.latency_ms = latency_ms
+        self.jitter_ms = jitter_ms
+        self.error_rate = error_rate
+        self.throttle_rate = throttle_rate
+        self.bar_interval = bar_interval
+        self.stats = {}
+        self.auth_failures = 0
+        self.injected_errors = 0
+        self._rng = random.Random(seed)
+        self._clock_lock = threading.Lock()
+        self.index = -1
+        self._loop = None
+        self._runner = None
+        self._stopped = None
+        self._thread = None
+        self._ready = threading.Event()
+        self.seek(min(start_index, len(times) - 1))
+
+    @property
+    def base_url(self) -> str:
+        return f"http://{self.host}:{self.port}"
+
+    @property
+    def now(self) -> int:
+        return int(self.times[self.index])
+
+    # ---- Clock ----
+    def seek(self, index: int):
+        """
+        Moves the clock forward to bar `index`, replaying every bar on the way
+        through the matching engine (TP/SL, funding).
+        """
+        with self._clock_lock:
+            if index <= self.index:
+                return
+            for i in range(max(self.index + 1, 0), index + 1):
+                t = int(self.times[i])
+                previous = int(self.times[i - 1]) if i else t - 1
+                for symbol in self.symbols:
+                    o, h, l, c, v = self.bars[symbol][i]
+                    self.exchange.set_bar(symbol, t, o, h, l, c, v)
+                    funding_time, funding_rate = self.funding[symbol]
+                    lo, hi = np.searchsorted(funding_time, [previous, t], side="right")
+                    for j in range(lo, hi):
+                        self.exchange.apply_funding(symbol, float(funding_rate[j]))
+            self.index = index
+
+    def advance(self, bars: int = 1) -> bool:
+        """
+        Steps the clock; returns False once the history is exhausted.
+        """
+        target = min(self.index + bars, len(self.times) - 1)
+        self.seek(target)
+        return target < len(self.times) - 1
+
+    # ---- Market data routes ----
+    def _rows(self, symbol: str, lo: int, hi: int) -> list:
+        # WEEX candle rows: [openTime, open, high, low, close, baseVolume, quoteVolume], newest first
+        bars = self.bars[symbol]
+        return [
+            [str(int(self.times[i]))] + [repr(float(x)) for x in bars[i]] + [repr(float(bars[i][3] * bars[i][4]))]
+            for i in range(hi, lo - 1, -1)
+        ]
+
+    def _route_candles(self, params: dict) -> dict:
+        symbol = params.get("symbol")
+        if symbol not in self.bars:
+            return {"code": "40034", "msg": f"Unknown symbol {symbol}"}
+        limit = min(int(params.get("limit", 100)), 1000)
+        with self._clock_lock:
+            return {"code": OK, "data": self._rows(symbol, max(0, self.index - limit + 1), self.index)}
+
+    def _route_historyCandles(self, params: dict) -> dict:
+        symbol = params.get("symbol")
+        if symbol not in self.bars:
+            return {"code": "40034", "msg": f"Unknown symbol {symbol}"}
+        limit = min(int(params.get("limit", 100)), 1000)
+        with self._clock_lock:
+            start = int(params.get("startTime", 0))
+            end = min(int(params.get("endTime", self.now)), self.now)
+            lo = int(np.searchsorted(self.times, start))
+            hi = int(np.searchsorted(self.times, end, side="right")) - 1
+            lo = max(lo, hi - limit + 1)
+            return {"code": OK, "data": self._rows(symbol, lo, hi) if hi >= lo else []}
+
+    def _route_getHistoryFundRate(self, params: dict) -> dict:
+        symbol = params.get("symbol")
+        if symbol not in self.funding:
+            return {"code": "40034", "msg": f"Unknown symbol {symbol}"}
+        limit = int(params.get("limit", 10))
+        funding_time, funding_rate = self.funding[symbol]
+        hi = int(np.searchsorted(funding_time, self.now, side="right"))
+        return {"code": OK, "data": [
+            {"symbol": symbol, "fundingRate": str(funding_rate[i]), "fundingTime": int(funding_time[i])}
+            for i in range(hi - 1, max(-1, hi - 1 - limit), -1)
+        ]}
+
+    # ---- HTTP ----
+    def _check_signature(self, request, body: str) -> str | None:
+        headers = request.headers
+        if headers.get("ACCESS-KEY") != self.api_key or headers.get("ACCESS-PASSPHRASE") != self.passphrase:
+            return "Invalid ACCESS-KEY or ACCESS-PASSPHRASE"
+        timestamp = headers.get("ACCESS-TIMESTAMP", "")
+        if not timestamp.isdigit() or abs(now_ms() - int(timestamp)) > self.max_clock_skew_ms:
+            return f"Request timestamp {timestamp!r} expired"
+        query = "?" + request.query_string if request.query_string else ""
+        message = timestamp + request.method.upper() + request.path + query + body
+        expected = base64.b64encode(hmac.new(self.secret_key.encode(), message.encode(), hashlib.sha256).digest()).decode()
+        if not hmac.compare_digest(expected, headers.get("ACCESS-SIGN", "")):
+            return "Signature mismatch"
+        return None
+
+    async def _dispatch(self, request):
+        from aiohttp import web
+
+        route = request.path.rsplit("/", 1)[-1]
+        self.stats[route] = self.stats.get(route, 0) + 1
+        try:
+            body_text = await request.text()
+        except ConnectionResetError:
+            return web.Response(status=400)
+
+        delay = max(0.0, self.latency_ms + self._rng.uniform(-self.jitter_ms, self.jitter_ms)) / 1000
+        if delay:
+            await asyncio.sleep(delay)
+        roll = self._rng.random()
+        if roll < self.throttle_rate:
+            self.injected_errors += 1
+            return web.json_response({"code": "429", "msg": "Too many requests"}, status=429, headers={"Retry-After": "1"})
+        if roll < self.throttle_rate + self.error_rate:
+            self.injected_errors += 1
+            return web.json_response({"code": "50000", "msg": "injected failure"}, status=500)
+
+        if route in PRIVATE_ROUTES and self.verify_signatures:
+            error = self._check_signature(request, body_text)
+            if error:
+                self.auth_failures += 1
+                return web.json_response({"code": "40009", "msg": error}, status=401)
+
+        params = dict(request.query)
+        try:
+            body = json.loads(body_text) if body_text else {}
+        except ValueError:
+            return web.json_response({"code": "40001", "msg": "Malformed JSON body"}, status=400)
+
+        if route in MARKET_ROUTES:
+            try:
+                response = getattr(self, f"_route_{route}")(params)
+            except (TypeError, ValueError) as e:
+                response = {"code": "40001", "msg": f"Bad parameters: {e}"}
+        else:
+            response = self.exchange.handle(request.method, request.path, params=params, body=body)
+        status = 404 if response.get("code") == "40404" else 200
+        return web.json_response(response, status=status)
+
+    async def _clock(self):
+        while self.bar_interval > 0:
+            await asyncio.sleep(self.bar_interval)
+            if not self.advance():
+                logger.info("History exhausted; clock stopped")
+                return
+
+    async def _serve(self):
+        from aiohttp import web
+
+        self._loop = asyncio.get_running_loop()
+        self._stopped = asyncio.Event()
+        app = web.Application()
+        app.router.add_route("*", "/capi/v2/{group}/{endpoint}", self._dispatch)
+        self._runner = web.AppRunner(app)
+        await self._runner.setup()
+        site = web.TCPSite(self._runner, self.host, self.port)
+        await site.start()
+        self.port = site._server.sockets[0].getsockname()[1]
+        clock = asyncio.create_task(self._clock())
+        self._ready.set()
+        try:
+            await self._stopped.wait()
+        finally:
+            clock.cancel()
+            await self._runner.cleanup()
+
+    def start(self) -> str:
+        """
+        Serves in a background thread and returns the base URL.
+        """
+        self._thread = threading.Thread(target=lambda: asyncio.run(self._serve()), name="weex-sim-server", daemon=True)
+        self._thread.start()
+        self._ready.wait(5)
+        logger.info(f"WEEX simulator listening on {self.base_url}")
+        return self.base_url
+
+    def stop(self):
+        if self._loop and self._stopped:
+            self._loop.call_soon_threadsafe(self._stopped.set)
+        if self._thread:
+            self._thread.join(5)
+
+    def client(self, **kwargs):
+        """
+        WeexClient signed with the simulator's keys.
+        """
+        from exchange.weex_client import WeexClient
+        return WeexClient(self.api_key, self.secret_key, self.passphrase, self.base_url, **kwargs)
+
+
+def live_histories(symbols: list = ALLOWED_SYMBOLS, timeframe: str = TIMEFRAME, future_bars: int = 12 * 24, seed: int = 0) -> dict:
+    """
+    Synthetic bars whose current bar is the wall-clock one, with `future_bars`
+    more to step through, so candle times line up with the bot's clock.
+    Pair with start_index=CANDLE_WINDOW - 1.
+    """
+    from backtest.history import synthetic_history
+
+    step = timeframe_to_ms(timeframe)
+    return synthetic_history(symbols, timeframe, CANDLE_WINDOW + future_bars, now_ms() + future_bars * step, seed=seed)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Local WEEX futures API simulator")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8088)
+    parser.add_argument("--symbols", nargs="+", default=ALLOWED_SYMBOLS)
+    parser.add_argument("--history", help="Directory of backtest .npz history to replay instead of synthetic bars")
+    parser.add_argument("--bar-interval", type=float, default=timeframe_to_ms(TIMEFRAME) / 1000,
+                        help="Seconds per simulated bar (0 = frozen clock)")
+    parser.add_argument("--balance", type=float, default=1000.0)
+    parser.add_argument("--latency-ms", type=float, default=0.0)
+    parser.add_argument("--jitter-ms", type=float, default=0.0)
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Fraction of requests answered with HTTP 500")
+    parser.add_argument("--throttle-rate", type=float, default=0.0, help="Fraction of requests answered with HTTP 429")
+    parser.add_argument("--no-auth", action="store_true", help="Skip signature verification")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    if args.history:
+        from backtest.history import SymbolHistory
+        histories = {
+            s: SymbolHistory.load(s, os.path.join(args.history, f"{s}_{TIMEFRAME}.npz")) for s in args.symbols
+        }
+    else:
+        histories = live_histories(args.symbols, seed=args.seed)
+
+    server = WeexSimServer(
+        histories,
+        exchange=SimulatedExchange(args.balance),
+        host=args.host,
+        port=args.port,
+        verify_signatures=not args.no_auth,
+        latency_ms=args.latency_ms,
+        jitter_ms=args.jitter_ms,
+        error_rate=args.error_rate,
+        throttle_rate=args.throttle_rate,
+        bar_interval=args.bar_interval,
+        seed=args.seed,
+    )
+    print(f"export WEEX_BASE_URL=http://{args.host}:{args.port}")
+    print(f"export WEEX_API_KEY={SIM_API_KEY} WEEX_SECRET_KEY={SIM_SECRET_KEY} WEEX_PASSPHRASE={SIM_PASSPHRASE}")
+    asyncio.run(server._serve())
+
+
+if __name__ == "__main__":
+    main()
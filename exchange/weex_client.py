@@ -3,15 +3,146 @@ import hmac
 import hashlib
 import base64
 import json
+import threading
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+from config.settings import (
+    HTTP_POOL_SIZE,
+    HTTP_MAX_RETRIES,
+    HTTP_BACKOFF_FACTOR,
+    HTTP_TIMEOUT_SEC,
+    RATE_LIMIT_MARKET_PER_SEC,
+    RATE_LIMIT_ACCOUNT_PER_SEC,
+    RATE_LIMIT_TRADE_PER_SEC,
+)
+from utils.metrics import metrics
+from utils.rate_limiter import RateLimiter, parse_retry_after
+
+
+# Answers a GET is retried on (with backoff; 429 also pauses the rate limiter)
+RETRY_STATUSES = (429, 500, 502, 503, 504)
+
+_shared_clients = {}
+_shared_lock = threading.Lock()
+
+# One limiter per process: sync and async clients share the same API key limits
+DEFAULT_RATE_LIMITER = RateLimiter(
+    market_per_sec=RATE_LIMIT_MARKET_PER_SEC,
+    account_per_sec=RATE_LIMIT_ACCOUNT_PER_SEC,
+    trade_per_sec=RATE_LIMIT_TRADE_PER_SEC,
+)
 
 
 class WeexClient:
-    def __init__(self, api_key, secret_key, passphrase, base_url):
+    def __init__(
+        self,
+        api_key,
+        secret_key,
+        passphrase,
+        base_url,
+        pool_size=HTTP_POOL_SIZE,
+        max_retries=HTTP_MAX_RETRIES,
+        backoff_factor=HTTP_BACKOFF_FACTOR,
+        timeout=HTTP_TIMEOUT_SEC,
+        rate_limiter=None,
+    ):
         self.api_key = api_key
         self.secret_key = secret_key
         self.passphrase = passphrase
         self.base_url = base_url.rstrip("/")
+        self.timeout = timeout
+        self.max_retries = max_retries
+        self.backoff_factor = backoff_factor
+        self.rate_limiter = rate_limiter or DEFAULT_RATE_LIMITER
+        self.session = self._build_session(pool_size, max_retries, backoff_factor)
+        self._stats = {}
+        self._stats_lock = threading.Lock()
+
+    @staticmethod
+    def _build_session(pool_size, max_retries, backoff_factor):
+        """
+        Keep-alive session shared by every request of this client.
+        The adapter only retries transport failures: connections that could
+        not be established (any method) and read errors on GETs. POSTs
+        (orders, leverage, AI logs) are never resent once they may have
+        reached the exchange. 429/5xx answers are retried by _request, so a
+        429 pauses the rate limiter before the retry goes out.
+        """
+        retry = Retry(
+            total=max_retries,
+            connect=max_retries,
+            read=max_retries,
+            status=0,
+            backoff_factor=backoff_factor,
+            allowed_methods=frozenset(["GET"]),
+            raise_on_status=False,
+        )
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size, max_retries=retry)
+        session = requests.Session()
+        session.mount("https://", adapter)
+        session.mount("http://", adapter)
+        session.headers.update({"Accept-Encoding": "gzip, deflate", "Connection": "keep-alive"})
+        return session
+
+    def _record(self, path, elapsed, ok):
+        metrics.observe("weex_request_seconds", elapsed, path=path)
+        if not ok:
+            metrics.inc("weex_request_errors_total", path=path)
+        with self._stats_lock:
+            stats = self._stats.setdefault(path, {"count": 0, "errors": 0, "total_ms": 0.0, "max_ms": 0.0})
+            elapsed_ms = elapsed * 1000
+            stats["count"] += 1
+            stats["total_ms"] += elapsed_ms
+            stats["max_ms"] = max(stats["max_ms"], elapsed_ms)
+            if not ok:
+                stats["errors"] += 1
+
+    def latency_stats(self):
+        """
+        Per-endpoint request counters: count, errors, avg_ms and max_ms.
+        """
+        with self._stats_lock:
+            return {
+                path: {
+                    "count": s["count"],
+                    "errors": s["errors"],
+                    "avg_ms": round(s["total_ms"] / s["count"], 2) if s["count"] else 0.0,
+                    "max_ms": round(s["max_ms"], 2),
+                }
+                for path, s in self._stats.items()
+            }
+
+    def _request(self, method, path, url, **kwargs):
+        """
+        GETs answered 429/5xx are retried up to max_retries times. Every
+        attempt goes through the token bucket, and a 429 pauses the bucket
+        (for Retry-After, if given) before anything else is sent.
+        """
+        attempt = 0
+        while True:
+            self.rate_limiter.acquire(path)
+            start = time.perf_counter()
+            ok = False
+            try:
+                response = self.session.request(method, url, timeout=self.timeout, **kwargs)
+                if response.status_code == 429:
+                    self.rate_limiter.throttled(path, parse_retry_after(response.headers.get("Retry-After")))
+                if method != "GET" or response.status_code not in RETRY_STATUSES or attempt >= self.max_retries:
+                    response.raise_for_status()
+                    ok = True
+                    return response.json()
+            finally:
+                self._record(path, time.perf_counter() - start, ok)
+            # After a 429 the bucket itself holds the retry back
+            delay = 0.0 if response.status_code == 429 else self.backoff_factor * (2 ** attempt)
+            attempt += 1
+            if delay:
+                time.sleep(delay)
+
+    def close(self):
+        self.session.close()
 
     def _timestamp(self):
         return str(int(time.time() * 1000))
@@ -35,7 +166,7 @@ class WeexClient:
             "locale": "en-US"
         }
 
-    def get(self, path, params=None, private=False):
+    def _prepare_get(self, path, params=None, private=False):
         query = ""
         if params:
             query = "?" + "&".join(f"{k}={v}" for k, v in params.items())
@@ -48,23 +179,32 @@ class WeexClient:
 
         headers = self._headers(signature, timestamp) if private else {}
         url = self.base_url + path + query
+        return url, headers
 
-        response = requests.get(url, headers=headers, timeout=10)
-        response.raise_for_status()
-        return response.json()
-
-    def post(self, path, body, private=True):
+    def _prepare_post(self, path, body):
+        """
+        body may be a dict or an already serialized JSON string (the order
+        gateway renders order bodies ahead of time); it is signed as sent.
+        """
         timestamp = self._timestamp()
-        body_json = json.dumps(body)
+        body_json = body if isinstance(body, str) else json.dumps(body)
         signature = self._sign(timestamp, "POST", path, "", body_json)
         headers = self._headers(signature, timestamp)
 
         url = self.base_url + path
-        response = requests.post(url, headers=headers, data=body_json, timeout=10)
-        response.raise_for_status()
-        return response.json()
+        return url, headers, body_json
+
+    def get(self, path, params=None, private=False):
+        url, headers = self._prepare_get(path, params, private)
+        return self._request("GET", path, url, headers=headers)
+
+    def post(self, path, body, private=True):
+        url, headers, body_json = self._prepare_post(path, body)
+        return self._request("POST", path, url, headers=headers, data=body_json)
 
     # ---- Market endpoints ----
+    # Endpoint helpers return whatever get/post return, so AsyncWeexClient
+    # inherits them unchanged and they yield awaitables there.
     def get_candles(self, symbol, granularity="5m", limit=50, price_type=None):
         params = {"symbol": symbol, "granularity": granularity, "limit": limit}
         if price_type:
@@ -101,6 +241,13 @@ class WeexClient:
     def place_order(self, payload):
         return self.post("/capi/v2/order/placeOrder", payload, private=True)
 
+    def get_current_orders(self, symbol):
+        return self.get("/capi/v2/order/current", params={"symbol": symbol}, private=True)
+
+    def get_history_orders(self, symbol, page_size=100):
+        params = {"symbol": symbol, "pageSize": page_size}
+        return self.get("/capi/v2/order/history", params=params, private=True)
+
     def upload_ai_log_endpoint(self, payload):
         return self.post("/capi/v2/order/uploadAiLog", payload, private=True)
 
@@ -114,6 +261,35 @@ class WeexClient:
             base_url=os.getenv("WEEX_BASE_URL", "https://api-contract.weex.com")
         )
 
+    @classmethod
+    def shared(cls):
+        """
+        Process-wide client built from env on first use, so every module
+        reuses the same connection pool. One instance per client class.
+        """
+        client = _shared_clients.get(cls)
+        if client is None:
+            with _shared_lock:
+                client = _shared_clients.get(cls)
+                if client is None:
+                    client = _shared_clients[cls] = cls.from_env()
+        return client
+
+    @classmethod
+    def set_shared(cls, client):
+        """
+        Replaces the process-wide client (e.g. with a simulated exchange).
+        Modules resolve shared() on every call, so this takes effect at once.
+        Returns the previous client, or None.
+        """
+        with _shared_lock:
+            previous = _shared_clients.get(cls)
+            if client is None:
+                _shared_clients.pop(cls, None)
+            else:
+                _shared_clients[cls] = client
+        return previous
+
     def upload_ai_log(self, payload):
         """
         Uploads AI decision log to the exchange.
@@ -1,12 +1,26 @@
-from dotenv import load_dotenv
-load_dotenv()
+import argparse
 
-from runner.trader import Trader
-from utils.logger import get_logger
+from utils.startup import StartupProfile
 
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Trade-Bot")
+    parser.add_argument("--startup-profile", action="store_true", help="Log import and initialization time by module before the first cycle")
+    args = parser.parse_args()
+
+    # Installed first so every later import is timed
+    profile = StartupProfile(enabled=args.startup_profile)
+
+    with profile.phase("dotenv"):
+        from dotenv import load_dotenv
+        load_dotenv()
+
+    with profile.phase("import"):
+        from runner.trader import Trader
+        from utils.logger import get_logger
+
     logger = get_logger("MAIN")
     logger.info("Initializing Trade-Bot...")
-    
-    trader = Trader()
-    trader.run()
+
+    with profile.phase("trader_init"):
+        trader = Trader()
+    trader.run(startup_profile=profile)
@@ -0,0 +1,55 @@
+import threading
+from collections import OrderedDict
+
+class CandleStore:
+    """
+    Per-symbol rolling window of candles keyed by open time (ms).
+    Merging is idempotent: a candle with an already-known open time replaces
+    the stored one, which is how the still-forming bar gets refreshed.
+    """
+
+    def __init__(self, maxlen: int = 50):
+        self.maxlen = maxlen
+        self._candles = {}
+        self._lock = threading.Lock()
+
+    def merge(self, symbol: str, candles: list) -> int:
+        """
+        Merges raw [t, o, h, l, c, v, ...] rows and trims to maxlen.
+        Returns the number of new open times added.
+        """
+        with self._lock:
+            book = self._candles.setdefault(symbol, OrderedDict())
+            added = 0
+            for candle in candles:
+                open_time = int(float(candle[0]))
+                if open_time not in book:
+                    added += 1
+                book[open_time] = candle
+
+            if added:
+                ordered = sorted(book.items())[-self.maxlen:]
+                book.clear()
+                book.update(ordered)
+            return added
+
+    def get(self, symbol: str) -> list:
+        """
+        Candles for symbol, oldest first.
+        """
+        with self._lock:
+            return list(self._candles.get(symbol, {}).values())
+
+    def last_open_time(self, symbol: str) -> int | None:
+        with self._lock:
+            book = self._candles.get(symbol)
+            if not book:
+                return None
+            return next(reversed(book))
+
+    def clear(self, symbol: str | None = None):
+        with self._lock:
+            if symbol is None:
+                self._candles.clear()
+            else:
+                self._candles.pop(symbol, None)
@@ -1,16 +1,72 @@
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+from config.settings import (
+    ALLOWED_SYMBOLS,
+    CANDLE_TAIL,
+    CANDLE_WINDOW,
+    FUNDING_CACHE_TTL_SEC,
+    MARKET_STREAM_STALE_SEC,
+    MARKET_STREAM_URL,
+    TIMEFRAME,
+)
 from exchange.weex_client import WeexClient
+from market import indicators
+from market.candle_store import CandleStore
+from market.stream import MarketStream
 from utils.logger import get_logger
+from utils.metrics import timed
+from utils.time import now_ms, timeframe_to_ms
 
 logger = get_logger("MARKET_DATA")
-client = WeexClient.from_env()
+candle_store = CandleStore(maxlen=CANDLE_WINDOW)
+
+# Set by start_market_stream(); when live, candles and prices come from memory
+_stream = None
+
+# symbol -> funding rate, refreshed in bulk every FUNDING_CACHE_TTL_SEC
+_funding_cache = {"rates": {}, "fetched_at": 0.0}
+_funding_lock = threading.Lock()
+
+def start_market_stream(symbols: list = ALLOWED_SYMBOLS, url: str = MARKET_STREAM_URL) -> MarketStream:
+    """
+    Starts the WebSocket feed that keeps candle_store and last prices current.
+    Bars missed while disconnected are backfilled over REST on reconnect.
+    """
+    global _stream
+    if _stream is None:
+        _stream = MarketStream(
+            url,
+            symbols,
+            candle_store,
+            TIMEFRAME,
+            backfill=_fetch_candles_rest,
+            stale_after=MARKET_STREAM_STALE_SEC,
+        )
+        _stream.start()
+    return _stream
+
+def stop_market_stream():
+    global _stream
+    if _stream is not None:
+        _stream.stop()
+        _stream = None
 
 def get_latest_price(symbol: str) -> float:
     """
     Fetches the latest price of a symbol from WEEX API.
     """
+    if _stream is not None and _stream.is_live(symbol):
+        price = _stream.last_price(symbol)
+        if price is not None:
+            return price
+
     try:
         # Assuming WEEX endpoint /capi/v2/market/ticker?symbol=...
-        response = client.get(f"/capi/v2/market/ticker", params={"symbol": symbol})
+        response = WeexClient.shared().get(f"/capi/v2/market/ticker", params={"symbol": symbol})
         if response.get("code") == "00000":
              # Structure might vary, assuming typical data.ticker.last
              return float(response["data"]["ticker"]["last"])
@@ -21,83 +77,326 @@ def get_latest_price(symbol: str) -> float:
         logger.error(f"Price exception {symbol}: {e}")
         return None
 
+@timed("market_snapshot_seconds")
 def get_market_snapshot(symbol: str) -> dict:
     """
     Returns a market snapshot including OHLCV and indicators.
     Calculates RSI/EMA locally from fetched candles.
     """
     try:
-        # 1. Get Candles (e.g. 5m candles)
-        # Endpoint: /capi/v2/market/candles?symbol=...&granularity=5m
-        response = client.get_candles(symbol=symbol, granularity="5m", limit=50)
+        candles = _fetch_candles(symbol)
+        if not candles:
+            return {}
+
+        # Funding Rate
+        funding = _get_funding_rates().get(symbol)
+        if funding is None:
+            funding = _parse_funding(WeexClient.shared().get_current_fund_rate(symbol=symbol))
+
+        return _build_snapshot(symbol, candles, funding)
+
+    except Exception as e:
+        logger.error(f"Snapshot error {symbol}: {e}")
+        return {"symbol": symbol, "price": 0.0}
+
+@timed("market_snapshots_seconds")
+def get_market_snapshots(symbols: list) -> dict:
+    """
+    Batched get_market_snapshot for one cycle: funding for every contract in a
+    single call, candles fetched concurrently, indicators computed as 2-D
+    (symbols x candles) array operations.
+    Returns {symbol: snapshot}, each shaped exactly like get_market_snapshot().
+    """
+    snapshots = {}
+    if not symbols:
+        return snapshots
+
+    funding_map = _get_funding_rates()
 
-        if isinstance(response, list):
-            candles = response
+    with ThreadPoolExecutor(max_workers=len(symbols), thread_name_prefix="candles") as pool:
+        futures = {symbol: pool.submit(_fetch_candles, symbol) for symbol in symbols}
+
+    candles_by_symbol = {}
+    for symbol, future in futures.items():
+        try:
+            candles = future.result()
+        except Exception as e:
+            logger.error(f"Snapshot error {symbol}: {e}")
+            snapshots[symbol] = {"symbol": symbol, "price": 0.0}
+            continue
+        if not candles:
+            snapshots[symbol] = {}
+            continue
+        candles_by_symbol[symbol] = candles
+
+    funding = {}
+    for symbol in candles_by_symbol:
+        if funding_map:
+            funding[symbol] = funding_map.get(symbol, 0.0)
         else:
-            if response.get("code") != "00000":
-                 logger.error(f"Kline fetch failed for {symbol}")
-                 return {}
-            candles = response.get("data", [])
+            # Bulk call failed; fall back to the per-symbol endpoint
+            try:
+                funding[symbol] = _parse_funding(WeexClient.shared().get_current_fund_rate(symbol=symbol))
+            except Exception as e:
+                logger.error(f"Funding fetch failed for {symbol}: {e}")
+                funding[symbol] = 0.0
+
+    try:
+        snapshots.update(_build_snapshots(candles_by_symbol, funding))
+    except Exception as e:
+        logger.error(f"Batch snapshot error: {e}")
+        for symbol in candles_by_symbol:
+            snapshots[symbol] = {"symbol": symbol, "price": 0.0}
 
+    return {symbol: snapshots[symbol] for symbol in symbols}
+
+async def get_latest_price_async(symbol: str) -> float:
+    """
+    Async variant of get_latest_price using the shared AsyncWeexClient.
+    """
+    from exchange.async_weex_client import AsyncWeexClient
+    aclient = AsyncWeexClient.shared()
+    try:
+        response = await aclient.get("/capi/v2/market/ticker", params={"symbol": symbol})
+        if response.get("code") == "00000":
+            return float(response["data"]["ticker"]["last"])
+        logger.error(f"Price fetch error {symbol}: {response}")
+        return None
+    except Exception as e:
+        logger.error(f"Price exception {symbol}: {e}")
+        return None
+
+async def get_market_snapshot_async(symbol: str) -> dict:
+    """
+    Async variant of get_market_snapshot; candles and funding are fetched concurrently.
+    """
+    import asyncio
+    from exchange.async_weex_client import AsyncWeexClient
+    aclient = AsyncWeexClient.shared()
+    try:
+        *responses, funding_resp = await asyncio.gather(
+            *[
+                getattr(aclient, method)(symbol=symbol, granularity=TIMEFRAME, **params)
+                for method, params in _candle_requests(symbol)
+            ],
+            aclient.get_current_fund_rate(symbol=symbol),
+        )
+        candles = _merge_candles(symbol, responses)
         if not candles:
             return {}
-
-        # Parse candles (Timestamp, Open, High, Low, Close, Vol, ...)
-        # Assuming standard format: [t, o, h, l, c, v]
-        closes = [float(c[4]) for c in candles]
-        
-        # 2. Calculate Indicators (Simple local calc for dependency-free speed)
-        current_price = closes[-1]
-        
-        # RSI (14)
-        rsi = calculate_rsi(closes, 14)
-        
-        # EMA (20)
-        ema = calculate_ema(closes, 20)
-        
-        # Funding Rate
-        funding_resp = client.get_current_fund_rate(symbol=symbol)
-        funding = 0.0
-        if isinstance(funding_resp, list) and funding_resp:
-            funding = float(funding_resp[0].get("fundingRate", 0.0))
-        elif isinstance(funding_resp, dict) and funding_resp.get("code") == "00000":
-            data = funding_resp.get("data", {})
-            if isinstance(data, list) and data:
-                funding = float(data[0].get("fundingRate", 0.0))
-            elif isinstance(data, dict) and "fundingRate" in data:
-                funding = float(data.get("fundingRate", 0.0))
-
-        return {
-            "symbol": symbol,
-            "price": current_price,
-            "rsi": round(rsi, 2),
-            "ema": round(ema, 2),
-            "atr": 0.0, # Skip for now or implement if critical
-            "funding": funding
-        }
+        return _build_snapshot(symbol, candles, _parse_funding(funding_resp))
 
     except Exception as e:
         logger.error(f"Snapshot error {symbol}: {e}")
         return {"symbol": symbol, "price": 0.0}
 
+def _get_funding_rates() -> dict:
+    """
+    All-contract funding rates from one bulk call, cached for FUNDING_CACHE_TTL_SEC.
+    Returns {} if the bulk call fails and nothing is cached.
+    """
+    with _funding_lock:
+        if _funding_cache["rates"] and time.monotonic() - _funding_cache["fetched_at"] < FUNDING_CACHE_TTL_SEC:
+            return _funding_cache["rates"]
+        try:
+            rates = _parse_funding_map(WeexClient.shared().get_current_fund_rate())
+        except Exception as e:
+            logger.error(f"Bulk funding fetch failed: {e}")
+            rates = {}
+        if rates:
+            _funding_cache["rates"] = rates
+            _funding_cache["fetched_at"] = time.monotonic()
+        return rates or _funding_cache["rates"]
+
+def _fetch_candles(symbol: str) -> list:
+    if _stream is not None and _stream.is_live(symbol):
+        return candle_store.get(symbol)
+    return _fetch_candles_rest(symbol)
+
+def _fetch_candles_rest(symbol: str) -> list:
+    # 1. Get Candles (e.g. 5m candles)
+    # Endpoint: /capi/v2/market/candles?symbol=...&granularity=5m
+    # Only the newest bars are fetched once the store is seeded.
+    responses = [
+        getattr(WeexClient.shared(), method)(symbol=symbol, granularity=TIMEFRAME, **params)
+        for method, params in _candle_requests(symbol)
+    ]
+    return _merge_candles(symbol, responses)
+
+def _candle_requests(symbol: str) -> list:
+    """
+    Plans the candle calls needed to bring the store up to date:
+    a full seed when empty or too far behind, otherwise the newest CANDLE_TAIL
+    bars plus a history backfill when cycles were missed.
+    """
+    last_open = candle_store.last_open_time(symbol)
+    if last_open is None:
+        return [("get_candles", {"limit": CANDLE_WINDOW})]
+
+    now = now_ms()
+    missed = (now - last_open) // timeframe_to_ms(TIMEFRAME)
+    if missed >= CANDLE_WINDOW:
+        logger.info(f"Candle gap of {missed} bars for {symbol}; reseeding")
+        candle_store.clear(symbol)
+        return [("get_candles", {"limit": CANDLE_WINDOW})]
+
+    plan = []
+    if missed >= CANDLE_TAIL:
+        plan.append((
+            "get_history_candles",
+            {"start_time": last_open, "end_time": now, "limit": missed + 1},
+        ))
+    plan.append(("get_candles", {"limit": CANDLE_TAIL}))
+    return plan
+
+def _merge_candles(symbol: str, responses: list) -> list:
+    """
+    Merges fetched candles into the store and returns the full window.
+    The newest response (the live tail) must succeed, otherwise the window
+    would be stale and the snapshot is dropped.
+    """
+    for response in responses:
+        candles = _parse_candles(symbol, response)
+        if not candles and response is responses[-1]:
+            return []
+        candle_store.merge(symbol, candles)
+    return candle_store.get(symbol)
+
+def _parse_candles(symbol: str, response) -> list:
+    if isinstance(response, list):
+        return response
+    if response.get("code") != "00000":
+        logger.error(f"Kline fetch failed for {symbol}")
+        return []
+    return response.get("data", [])
+
+def _parse_funding(funding_resp) -> float:
+    funding = 0.0
+    if isinstance(funding_resp, list) and funding_resp:
+        funding = float(funding_resp[0].get("fundingRate", 0.0))
+    elif isinstance(funding_resp, dict) and funding_resp.get("code") == "00000":
+        data = funding_resp.get("data", {})
+        if isinstance(data, list) and data:
+            funding = float(data[0].get("fundingRate", 0.0))
+        elif isinstance(data, dict) and "fundingRate" in data:
+            funding = float(data.get("fundingRate", 0.0))
+    return funding
+
+def _parse_funding_map(funding_resp) -> dict:
+    """
+    Maps symbol -> funding rate from the all-contracts currentFundRate response.
+    """
+    data = funding_resp
+    if isinstance(funding_resp, dict):
+        if funding_resp.get("code") != "00000":
+            return {}
+        data = funding_resp.get("data", [])
+    if isinstance(data, dict):
+        data = [data]
+    if not isinstance(data, list):
+        return {}
+    return {
+        item["symbol"]: float(item.get("fundingRate", 0.0))
+        for item in data
+        if isinstance(item, dict) and item.get("symbol")
+    }
+
+def _build_snapshot(symbol: str, candles: list, funding: float) -> dict:
+    return _build_snapshots({symbol: candles}, {symbol: funding})[symbol]
+
+def _build_snapshots(candles_by_symbol: dict, funding_by_symbol: dict) -> dict:
+    """
+    Computes snapshots for many symbols at once. Symbols whose windows have the
+    same length are stacked into one (symbols, candles) array per indicator.
+    """
+    groups = {}
+    for symbol, candles in candles_by_symbol.items():
+        groups.setdefault(len(candles), []).append(symbol)
+
+    snapshots = {}
+    for symbols in groups.values():
+        # Parse candles (Timestamp, Open, High, Low, Close, Vol, ...)
+        # Assuming standard format: [t, o, h, l, c, v]
+        ohlcv = np.asarray(
+            [[c[1:6] for c in candles_by_symbol[symbol]] for symbol in symbols],
+            dtype=np.float64,
+        )
+        columns = indicator_columns(ohlcv)
+        for i, symbol in enumerate(symbols):
+            candle_time = int(float(candles_by_symbol[symbol][-1][0]))
+            snapshots[symbol] = snapshot_from_columns(symbol, candle_time, columns, i, funding_by_symbol.get(symbol, 0.0))
+    return snapshots
+
+def indicator_columns(ohlcv: np.ndarray) -> dict:
+    """
+    Snapshot indicators for a stack of candle windows.
+    ohlcv: (n, window, 5) open/high/low/close/volume, oldest first.
+    Returns {name: (n,) array} describing the last bar of each window.
+    """
+    highs, lows, closes, volumes = ohlcv[..., 1], ohlcv[..., 2], ohlcv[..., 3], ohlcv[..., 4]
+
+    # 2. Calculate Indicators (vectorized, see market/indicators.py)
+    prices = closes[:, -1]
+    _, bb_upper, bb_lower = indicators.bollinger(closes, 20)
+    mean_volume = volumes.mean(axis=-1)
+    return {
+        "price": prices,
+        "rsi": _last(indicators.rsi(closes, 14), 50.0),
+        "ema": closes[:, -1] if closes.shape[-1] < 20 else _last(indicators.ema(closes, 20), prices),
+        "atr": _last(indicators.atr(highs, lows, closes, 14), 0.0),
+        "bb_upper": _last(bb_upper, prices),
+        "bb_lower": _last(bb_lower, prices),
+        "vwap": _last(indicators.vwap(highs, lows, closes, volumes), prices),
+        "volatility": _last(indicators.realized_volatility(closes, 20), 0.0),
+        "ret_1": _returns(closes, 1),
+        "ret_5": _returns(closes, 5),
+        "volume_ratio": np.divide(volumes[:, -1], mean_volume, out=np.ones_like(mean_volume), where=mean_volume > 0),
+    }
+
+def snapshot_from_columns(symbol: str, candle_time: int, columns: dict, i: int, funding: float) -> dict:
+    """
+    Market snapshot dict for row i of indicator_columns().
+    """
+    return {
+        "symbol": symbol,
+        "candle_time": candle_time,
+        "price": float(columns["price"][i]),
+        "rsi": round(float(columns["rsi"][i]), 2),
+        "ema": round(float(columns["ema"][i]), 6),
+        "atr": round(float(columns["atr"][i]), 6),
+        "bb_upper": round(float(columns["bb_upper"][i]), 6),
+        "bb_lower": round(float(columns["bb_lower"][i]), 6),
+        "vwap": round(float(columns["vwap"][i]), 6),
+        "volatility": round(float(columns["volatility"][i]), 6),
+        "ret_1": round(float(columns["ret_1"][i]), 6),
+        "ret_5": round(float(columns["ret_5"][i]), 6),
+        "volume_ratio": round(float(columns["volume_ratio"][i]), 4),
+        "funding": funding
+    }
+
+def _returns(closes, bars: int):
+    """
+    Simple return over the last `bars` candles per symbol (0.0 when too short).
+    """
+    if closes.shape[-1] <= bars:
+        return np.zeros(closes.shape[0])
+    base = closes[:, -1 - bars]
+    return np.divide(closes[:, -1], base, out=np.ones_like(base), where=base > 0) - 1.0
+
+def _last(values, default):
+    """
+    Last value along the time axis, with NaN (not enough candles) replaced by default.
+    """
+    value = values[..., -1]
+    return np.where(np.isnan(value), default, value)
+
 def calculate_rsi(prices, period=14):
-    if len(prices) < period + 1:
-        return 50.0
-    
-    deltas = [prices[i] - prices[i-1] for i in range(1, len(prices))]
-    gain = sum([d for d in deltas if d > 0]) / period
-    loss = abs(sum([d for d in deltas if d < 0])) / period
-    
-    if loss == 0: return 100.0
-    rs = gain / loss
-    return 100.0 - (100.0 / (1 + rs))
+    """
+    Latest Wilder RSI; 50.0 while there are not enough candles.
+    """
+    return float(_last(indicators.rsi(prices, period), 50.0))
 
 def calculate_ema(prices, period=20):
     if len(prices) < period:
-        return prices[-1]
-    
-    multiplier = 2 / (period + 1)
-    ema = prices[0]
-    for p in prices[1:]:
-        ema = (p - ema) * multiplier + ema
-    return ema
+        return float(prices[-1])
+    return float(_last(indicators.ema(prices, period), float(prices[-1])))
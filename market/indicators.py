@@ -0,0 +1,373 @@
+"""
+Technical indicators in two forms that agree numerically:
+
+- batch functions take arrays shaped (..., n) and return arrays of the same
+  shape, NaN where the indicator is not yet defined. A 2-D (symbols, n) input
+  computes every symbol in one pass.
+- streaming classes carry state across candles and update in O(1).
+
+Run `python -m market.indicators` to check agreement and time both forms.
+"""
+import math
+from collections import deque
+
+import numpy as np
+
+# ---- Batch (vectorized) ----
+
+def _ewm(x: np.ndarray, alpha: float, seed: np.ndarray) -> np.ndarray:
+    """
+    y[0] = alpha * x[0] + (1 - alpha) * seed, y[t] = alpha * x[t] + (1 - alpha) * y[t-1]
+    along the last axis. The recursion is unrolled in closed form per block;
+    blocks keep decay ** -k within float range.
+    """
+    decay = 1.0 - alpha
+    n = x.shape[-1]
+    out = np.empty_like(x, dtype=np.float64)
+    if n == 0:
+        return out
+    if decay <= 0.0:
+        out[...] = x
+        return out
+
+    block = max(1, int(30.0 / -math.log(decay))) if decay < 1.0 else n
+    prev = np.asarray(seed, dtype=np.float64)
+    for start in range(0, n, block):
+        chunk = x[..., start:start + block]
+        k = np.arange(1, chunk.shape[-1] + 1)
+        powers = decay ** k
+        acc = np.cumsum(chunk / powers, axis=-1)
+        out[..., start:start + block] = powers * (alpha * acc + prev[..., None])
+        prev = out[..., start + chunk.shape[-1] - 1]
+    return out
+
+
+def ema(closes, period: int = 20) -> np.ndarray:
+    """
+    EMA seeded with the first close (multiplier 2 / (period + 1)).
+    """
+    closes = np.asarray(closes, dtype=np.float64)
+    out = np.full(closes.shape, np.nan)
+    if closes.shape[-1] == 0:
+        return out
+    out[..., 0] = closes[..., 0]
+    out[..., 1:] = _ewm(closes[..., 1:], 2.0 / (period + 1), closes[..., 0])
+    return out
+
+
+def rsi(closes, period: int = 14) -> np.ndarray:
+    """
+    RSI with Wilder smoothing: averages seeded with the mean of the first
+    `period` gains/losses, then smoothed with alpha = 1 / period.
+    """
+    closes = np.asarray(closes, dtype=np.float64)
+    out = np.full(closes.shape, np.nan)
+    if closes.shape[-1] < period + 1:
+        return out
+
+    deltas = np.diff(closes, axis=-1)
+    gains = np.clip(deltas, 0.0, None)
+    losses = np.clip(-deltas, 0.0, None)
+
+    avg_gain = np.empty_like(gains[..., period - 1:])
+    avg_loss = np.empty_like(avg_gain)
+    avg_gain[..., 0] = gains[..., :period].mean(axis=-1)
+    avg_loss[..., 0] = losses[..., :period].mean(axis=-1)
+    avg_gain[..., 1:] = _ewm(gains[..., period:], 1.0 / period, avg_gain[..., 0])
+    avg_loss[..., 1:] = _ewm(losses[..., period:], 1.0 / period, avg_loss[..., 0])
+
+    out[..., period:] = _rsi_from_averages(avg_gain, avg_loss)
+    return out
+
+
+def _rsi_from_averages(avg_gain, avg_loss):
+    with np.errstate(divide="ignore", invalid="ignore"):
+        value = 100.0 - 100.0 / (1.0 + avg_gain / avg_loss)
+    value = np.where(avg_loss == 0, np.where(avg_gain == 0, 50.0, 100.0), value)
+    return value
+
+
+def true_range(highs, lows, closes) -> np.ndarray:
+    highs = np.asarray(highs, dtype=np.float64)
+    lows = np.asarray(lows, dtype=np.float64)
+    closes = np.asarray(closes, dtype=np.float64)
+    tr = highs - lows
+    if closes.shape[-1] > 1:
+        prev_close = closes[..., :-1]
+        tr[..., 1:] = np.maximum.reduce([
+            tr[..., 1:],
+            np.abs(highs[..., 1:] - prev_close),
+            np.abs(lows[..., 1:] - prev_close),
+        ])
+    return tr
+
+
+def atr(highs, lows, closes, period: int = 14) -> np.ndarray:
+    """
+    Wilder ATR: mean of the first `period` true ranges, then alpha = 1 / period.
+    """
+    tr = true_range(highs, lows, closes)
+    out = np.full(tr.shape, np.nan)
+    if tr.shape[-1] < period:
+        return out
+    seed = tr[..., :period].mean(axis=-1)
+    out[..., period - 1] = seed
+    out[..., period:] = _ewm(tr[..., period:], 1.0 / period, seed)
+    return out
+
+
+def _rolling_sum(x: np.ndarray, window: int) -> np.ndarray:
+    out = np.full(x.shape, np.nan)
+    if x.shape[-1] < window:
+        return out
+    csum = np.cumsum(x, axis=-1)
+    out[..., window - 1] = csum[..., window - 1]
+    out[..., window:] = csum[..., window:] - csum[..., :-window]
+    return out
+
+
+def bollinger(closes, period: int = 20, k: float = 2.0):
+    """
+    Returns (middle, upper, lower) using a rolling mean and population std.
+    """
+    closes = np.asarray(closes, dtype=np.float64)
+    mean = _rolling_sum(closes, period) / period
+    mean_sq = _rolling_sum(closes * closes, period) / period
+    std = np.sqrt(np.clip(mean_sq - mean * mean, 0.0, None))
+    return mean, mean + k * std, mean - k * std
+
+
+def vwap(highs, lows, closes, volumes) -> np.ndarray:
+    """
+    Cumulative VWAP of the typical price over the supplied window.
+    """
+    highs = np.asarray(highs, dtype=np.float64)
+    lows = np.asarray(lows, dtype=np.float64)
+    closes = np.asarray(closes, dtype=np.float64)
+    volumes = np.asarray(volumes, dtype=np.float64)
+    typical = (highs + lows + closes) / 3.0
+    cum_vol = np.cumsum(volumes, axis=-1)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        out = np.cumsum(typical * volumes, axis=-1) / cum_vol
+    return np.where(cum_vol > 0, out, closes)
+
+
+def realized_volatility(closes, period: int = 20) -> np.ndarray:
+    """
+    Per-bar realized volatility: sqrt(mean(r^2)) of the last `period` log returns.
+    """
+    closes = np.asarray(closes, dtype=np.float64)
+    out = np.full(closes.shape, np.nan)
+    if closes.shape[-1] < 2:
+        return out
+    returns = np.diff(np.log(closes), axis=-1)
+    out[..., 1:] = np.sqrt(_rolling_sum(returns * returns, period) / period)
+    return out
+
+
+# ---- Streaming (O(1) per candle) ----
+
+class EMAState:
+    def __init__(self, period: int = 20):
+        self.alpha = 2.0 / (period + 1)
+        self.value = None
+
+    def update(self, close: float) -> float:
+        if self.value is None:
+            self.value = close
+        else:
+            self.value = self.alpha * close + (1.0 - self.alpha) * self.value
+        return self.value
+
+
+class RSIState:
+    def __init__(self, period: int = 14):
+        self.period = period
+        self.prev_close = None
+        self.count = 0
+        self.avg_gain = 0.0
+        self.avg_loss = 0.0
+        self.value = math.nan
+
+    def update(self, close: float) -> float:
+        if self.prev_close is None:
+            self.prev_close = close
+            return self.value
+
+        delta = close - self.prev_close
+        self.prev_close = close
+        gain = max(delta, 0.0)
+        loss = max(-delta, 0.0)
+        self.count += 1
+
+        if self.count <= self.period:
+            # Seed phase: running mean of the first `period` deltas
+            self.avg_gain += (gain - self.avg_gain) / self.count
+            self.avg_loss += (loss - self.avg_loss) / self.count
+            if self.count < self.period:
+                return self.value
+        else:
+            self.avg_gain += (gain - self.avg_gain) / self.period
+            self.avg_loss += (loss - self.avg_loss) / self.period
+
+        self.value = float(_rsi_from_averages(self.avg_gain, self.avg_loss))
+        return self.value
+
+
+class ATRState:
+    def __init__(self, period: int = 14):
+        self.period = period
+        self.prev_close = None
+        self.count = 0
+        self.value = math.nan
+        self._seed_sum = 0.0
+
+    def update(self, high: float, low: float, close: float) -> float:
+        tr = high - low
+        if self.prev_close is not None:
+            tr = max(tr, abs(high - self.prev_close), abs(low - self.prev_close))
+        self.prev_close = close
+        self.count += 1
+
+        if self.count < self.period:
+            self._seed_sum += tr
+        elif self.count == self.period:
+            self.value = (self._seed_sum + tr) / self.period
+        else:
+            self.value += (tr - self.value) / self.period
+        return self.value
+
+
+class BollingerState:
+    def __init__(self, period: int = 20, k: float = 2.0):
+        self.period = period
+        self.k = k
+        self.window = deque(maxlen=period)
+        self._sum = 0.0
+        self._sum_sq = 0.0
+
+    def update(self, close: float):
+        if len(self.window) == self.period:
+            old = self.window[0]
+            self._sum -= old
+            self._sum_sq -= old * old
+        self.window.append(close)
+        self._sum += close
+        self._sum_sq += close * close
+
+        if len(self.window) < self.period:
+            return math.nan, math.nan, math.nan
+        mean = self._sum / self.period
+        std = math.sqrt(max(self._sum_sq / self.period - mean * mean, 0.0))
+        return mean, mean + self.k * std, mean - self.k * std
+
+
+class VWAPState:
+    def __init__(self):
+        self._pv = 0.0
+        self._volume = 0.0
+
+    def update(self, high: float, low: float, close: float, volume: float) -> float:
+        self._pv += (high + low + close) / 3.0 * volume
+        self._volume += volume
+        return self._pv / self._volume if self._volume > 0 else close
+
+
+class RealizedVolState:
+    def __init__(self, period: int = 20):
+        self.period = period
+        self.prev_close = None
+        self.window = deque(maxlen=period)
+        self._sum_sq = 0.0
+
+    def update(self, close: float) -> float:
+        if self.prev_close is None:
+            self.prev_close = close
+            return math.nan
+        r = math.log(close / self.prev_close)
+        self.prev_close = close
+        if len(self.window) == self.period:
+            self._sum_sq -= self.window[0] ** 2
+        self.window.append(r)
+        self._sum_sq += r * r
+        if len(self.window) < self.period:
+            return math.nan
+        return math.sqrt(max(self._sum_sq, 0.0) / self.period)
+
+
+# ---- Self-check & micro-benchmark ----
+
+def _synthetic_candles(n: int, seed: int = 7):
+    rng = np.random.default_rng(seed)
+    closes = 100.0 * np.exp(np.cumsum(rng.normal(0, 0.002, n)))
+    spread = np.abs(rng.normal(0, 0.001, n)) * closes
+    highs = closes + spread
+    lows = closes - spread
+    volumes = rng.uniform(1, 100, n)
+    return highs, lows, closes, volumes
+
+
+def _check_agreement(n: int = 500, tol: float = 1e-8):
+    highs, lows, closes, volumes = _synthetic_candles(n)
+    states = (EMAState(20), RSIState(14), ATRState(14), BollingerState(20), VWAPState(), RealizedVolState(20))
+    streamed = {name: [] for name in ("ema", "rsi", "atr", "bb_mid", "vwap", "rv")}
+    for h, l, c, v in zip(highs, lows, closes, volumes):
+        streamed["ema"].append(states[0].update(c))
+        streamed["rsi"].append(states[1].update(c))
+        streamed["atr"].append(states[2].update(h, l, c))
+        streamed["bb_mid"].append(states[3].update(c)[0])
+        streamed["vwap"].append(states[4].update(h, l, c, v))
+        streamed["rv"].append(states[5].update(c))
+
+    batch = {
+        "ema": ema(closes, 20),
+        "rsi": rsi(closes, 14),
+        "atr": atr(highs, lows, closes, 14),
+        "bb_mid": bollinger(closes, 20)[0],
+        "vwap": vwap(highs, lows, closes, volumes),
+        "rv": realized_volatility(closes, 20),
+    }
+    for name, values in batch.items():
+        if not np.allclose(values, streamed[name], rtol=tol, atol=tol, equal_nan=True):
+            raise AssertionError(f"{name}: batch and streaming forms disagree")
+
+
+def _benchmark(symbols: int = 8, window: int = 50, repeat: int = 2000):
+    import time
+
+    highs, lows, closes, volumes = (np.tile(a, (symbols, 1)) for a in _synthetic_candles(window))
+
+    start = time.perf_counter()
+    for _ in range(repeat):
+        ema(closes, 20)
+        rsi(closes, 14)
+        atr(highs, lows, closes, 14)
+        bollinger(closes, 20)
+        vwap(highs, lows, closes, volumes)
+        realized_volatility(closes, 20)
+    batch_us = (time.perf_counter() - start) / repeat / symbols * 1e6
+
+    states = [
+        (EMAState(20), RSIState(14), ATRState(14), BollingerState(20), VWAPState(), RealizedVolState(20))
+        for _ in range(symbols)
+    ]
+    start = time.perf_counter()
+    for i in range(repeat):
+        h, l, c, v = highs[0, i % window], lows[0, i % window], closes[0, i % window], volumes[0, i % window]
+        for e, r, a, b, vw, rv in states:
+            e.update(c)
+            r.update(c)
+            a.update(h, l, c)
+            b.update(c)
+            vw.update(h, l, c, v)
+            rv.update(c)
+    stream_us = (time.perf_counter() - start) / repeat / symbols * 1e6
+
+    print(f"batch  ({symbols}x{window} window): {batch_us:.1f} us per symbol per tick")
+    print(f"stream (one candle):           {stream_us:.1f} us per symbol per tick")
+
+
+if __name__ == "__main__":
+    _check_agreement()
+    print("batch and streaming forms agree")
+    _benchmark()
@@ -0,0 +1,133 @@
+"""
+Local WebSocket server that replays candles in the market/stream.py wire format,
+so the streaming feed can be exercised offline.
+
+    python -m market.replay_server --file candles.json --port 8765 --interval 0.5
+
+candles.json maps symbol -> [[t, o, h, l, c, v], ...] (oldest first). Without a
+file, a synthetic random walk is generated for every ALLOWED_SYMBOLS entry.
+"""
+import argparse
+import asyncio
+import json
+import threading
+
+from utils.logger import get_logger
+
+logger = get_logger("REPLAY_SERVER")
+
+
+class ReplayServer:
+    def __init__(self, candles_by_symbol: dict, host: str = "127.0.0.1", port: int = 0, interval: float = 0.0):
+        self.candles_by_symbol = candles_by_symbol
+        self.host = host
+        self.port = port
+        self.interval = interval
+        self._loop = None
+        self._server = None
+        self._thread = None
+        self._ready = threading.Event()
+
+    @property
+    def url(self) -> str:
+        return f"ws://{self.host}:{self.port}"
+
+    async def _handler(self, ws):
+        import websockets
+
+        try:
+            await self._replay(ws)
+        except websockets.ConnectionClosed:
+            pass
+
+    async def _replay(self, ws):
+        try:
+            request = json.loads(await ws.recv())
+        except ValueError:
+            return
+        symbols = [arg.get("symbol") for arg in request.get("args", []) if arg.get("channel") == "ticker"]
+        timeframe_channel = next(
+            (arg["channel"] for arg in request.get("args", []) if str(arg.get("channel", "")).startswith("candle")),
+            "candle",
+        )
+
+        length = max((len(self.candles_by_symbol.get(s, [])) for s in symbols), default=0)
+        for i in range(length):
+            for symbol in symbols:
+                rows = self.candles_by_symbol.get(symbol, [])
+                if i >= len(rows):
+                    continue
+                row = rows[i]
+                await ws.send(json.dumps({"channel": timeframe_channel, "symbol": symbol, "data": [row]}))
+                await ws.send(json.dumps({"channel": "ticker", "symbol": symbol, "data": {"last": str(row[4])}}))
+            await asyncio.sleep(self.interval)
+        # Keep the connection open so clients stay "connected" after the replay ends
+        await ws.wait_closed()
+
+    async def _serve(self):
+        import websockets
+
+        self._loop = asyncio.get_running_loop()
+        async with websockets.serve(self._handler, self.host, self.port) as server:
+            self._server = server
+            self.port = next(iter(server.sockets)).getsockname()[1]
+            self._ready.set()
+            await server.wait_closed()
+
+    def start(self) -> str:
+        """
+        Serves in a background thread and returns the ws:// URL.
+        """
+        self._thread = threading.Thread(target=lambda: asyncio.run(self._serve()), name="replay-server", daemon=True)
+        self._thread.start()
+        self._ready.wait(5)
+        logger.info(f"Replay server listening on {self.url}")
+        return self.url
+
+    def stop(self):
+        if self._loop and self._server:
+            self._loop.call_soon_threadsafe(self._server.close)
+        if self._thread:
+            self._thread.join(5)
+
+
+def _synthetic(symbols: list, bars: int, timeframe_ms: int) -> dict:
+    import numpy as np
+    from utils.time import now_ms
+
+    rng = np.random.default_rng(0)
+    start = now_ms() // timeframe_ms * timeframe_ms - bars * timeframe_ms
+    data = {}
+    for symbol in symbols:
+        closes = 100.0 * np.exp(np.cumsum(rng.normal(0, 0.002, bars)))
+        data[symbol] = [
+            [start + i * timeframe_ms, c, c * 1.001, c * 0.999, c, float(rng.uniform(1, 100))]
+            for i, c in enumerate(closes.tolist())
+        ]
+    return data
+
+
+def main():
+    from config.settings import ALLOWED_SYMBOLS, TIMEFRAME
+    from utils.time import timeframe_to_ms
+
+    parser = argparse.ArgumentParser(description="Replay candles over WebSocket")
+    parser.add_argument("--file", help="JSON file mapping symbol -> candle rows")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--interval", type=float, default=1.0, help="Seconds between replayed bars")
+    parser.add_argument("--bars", type=int, default=500, help="Synthetic bars per symbol when no file is given")
+    args = parser.parse_args()
+
+    if args.file:
+        with open(args.file) as f:
+            candles = json.load(f)
+    else:
+        candles = _synthetic(ALLOWED_SYMBOLS, args.bars, timeframe_to_ms(TIMEFRAME))
+
+    server = ReplayServer(candles, host=args.host, port=args.port, interval=args.interval)
+    asyncio.run(server._serve())
+
+
+if __name__ == "__main__":
+    main()
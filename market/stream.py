@@ -0,0 +1,148 @@
+import asyncio
+import json
+import threading
+import time
+
+from utils.logger import get_logger
+
+logger = get_logger("MARKET_STREAM")
+
+# Wire format. This is the project's own format, spoken by
+# market/replay_server.py; it is NOT the WEEX WebSocket protocol, whose
+# channel names and message shapes differ. Pointing the feed at the exchange
+# means adapting these two helpers; the rest of the class is format-agnostic.
+#   subscribe: {"op": "subscribe", "args": [{"channel": "candle5m", "symbol": ...}, {"channel": "ticker", "symbol": ...}]}
+#   candle:    {"channel": "candle5m", "symbol": ..., "data": [[t, o, h, l, c, v], ...]}
+#   ticker:    {"channel": "ticker", "symbol": ..., "data": {"last": "..."}}
+
+def subscribe_message(symbols: list, timeframe: str) -> dict:
+    args = []
+    for symbol in symbols:
+        args.append({"channel": f"candle{timeframe}", "symbol": symbol})
+        args.append({"channel": "ticker", "symbol": symbol})
+    return {"op": "subscribe", "args": args}
+
+def parse_message(raw) -> tuple:
+    """
+    Returns (kind, symbol, data) with kind in {"candle", "ticker"}, or (None, None, None).
+    """
+    try:
+        msg = json.loads(raw)
+    except (TypeError, ValueError):
+        return None, None, None
+    if not isinstance(msg, dict):
+        return None, None, None
+    channel = str(msg.get("channel", ""))
+    if channel.startswith("candle"):
+        return "candle", msg.get("symbol"), msg.get("data") or []
+    if channel == "ticker":
+        return "ticker", msg.get("symbol"), msg.get("data") or {}
+    return None, None, None
+
+
+class MarketStream:
+    """
+    Background WebSocket feed that keeps a CandleStore and last prices current.
+    Runs its own event loop in a daemon thread; on every (re)connect it calls
+    `backfill(symbol)` so bars missed while disconnected are fetched over REST.
+    """
+
+    def __init__(self, url: str, symbols: list, store, timeframe: str, backfill=None, stale_after: float = 10.0, max_reconnect_delay: float = 30.0):
+        self.url = url
+        self.symbols = list(symbols)
+        self._symbol_set = set(self.symbols)
+        self.store = store
+        self.timeframe = timeframe
+        self.backfill = backfill
+        self.stale_after = stale_after
+        self.max_reconnect_delay = max_reconnect_delay
+        self.connected = False
+        self.reconnects = 0
+        self._prices = {}
+        self._last_seen = {}
+        self._stop = threading.Event()
+        self._thread = None
+        self._loop = None
+        self._ws = None
+
+    def start(self):
+        if self._thread and self._thread.is_alive():
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=lambda: asyncio.run(self._run()), name="market-stream", daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout: float = 5.0):
+        self._stop.set()
+        if self._loop and self._ws is not None:
+            asyncio.run_coroutine_threadsafe(self._ws.close(), self._loop)
+        if self._thread:
+            self._thread.join(timeout)
+
+    def is_live(self, symbol: str) -> bool:
+        """
+        True while connected and the symbol has ticked within stale_after seconds.
+        """
+        last_seen = self._last_seen.get(symbol)
+        return self.connected and last_seen is not None and time.monotonic() - last_seen < self.stale_after
+
+    def last_price(self, symbol: str) -> float | None:
+        return self._prices.get(symbol)
+
+    def handle_message(self, raw):
+        kind, symbol, data = parse_message(raw)
+        if kind is None or symbol not in self._symbol_set:
+            return
+        if kind == "candle" and data:
+            self.store.merge(symbol, data)
+            self._prices[symbol] = float(data[-1][4])
+        elif kind == "ticker" and "last" in data:
+            self._prices[symbol] = float(data["last"])
+        else:
+            return
+        self._last_seen[symbol] = time.monotonic()
+
+    async def _run(self):
+        try:
+            import websockets
+        except ImportError:
+            # Not a transient error: retrying would only log warnings forever
+            logger.error("Market stream disabled: the 'websockets' package is not installed; using REST polling")
+            return
+
+        self._loop = asyncio.get_running_loop()
+        delay = 1.0
+        while not self._stop.is_set():
+            try:
+                async with websockets.connect(self.url, ping_interval=20) as ws:
+                    self._ws = ws
+                    await ws.send(json.dumps(subscribe_message(self.symbols, self.timeframe)))
+                    self.connected = True
+                    delay = 1.0
+                    logger.info(f"Market stream connected to {self.url} ({len(self.symbols)} symbols)")
+                    # Subscribed first, so nothing falls between backfill and live updates
+                    await self._loop.run_in_executor(None, self._backfill_all)
+                    async for raw in ws:
+                        self.handle_message(raw)
+            except Exception as e:
+                if not self._stop.is_set():
+                    logger.warning(f"Market stream error: {e}")
+            finally:
+                self.connected = False
+                self._ws = None
+
+            if self._stop.is_set():
+                break
+            self.reconnects += 1
+            logger.info(f"Reconnecting market stream in {delay:.0f}s")
+            await asyncio.sleep(delay)
+            delay = min(delay * 2, self.max_reconnect_delay)
+
+    def _backfill_all(self):
+        if self.backfill is None:
+            return
+        for symbol in self.symbols:
+            try:
+                self.backfill(symbol)
+            except Exception as e:
+                logger.error(f"Backfill failed for {symbol}: {e}")
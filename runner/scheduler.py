@@ -0,0 +1,88 @@
+import time
+
+from utils.logger import get_logger
+from utils.time import timeframe_to_ms
+
+logger = get_logger("SCHEDULER")
+
+
+class CandleScheduler:
+    """
+    Fires cycles on wall-clock multiples of `interval_sec`, `offset_sec` after
+    each boundary. When the interval divides the candle timeframe every candle
+    close is a fire time, so a new bar is picked up `offset_sec` after it closes.
+
+    A cycle that overruns its slot is never stacked: missed fire times are
+    skipped and counted, and the next run starts at the next future boundary.
+    """
+
+    def __init__(self, interval_sec: float, offset_sec: float = 1.0, timeframe: str | None = None, clock=time.time, sleep=time.sleep):
+        if interval_sec <= 0:
+            raise ValueError("interval_sec must be positive")
+        if timeframe and (timeframe_to_ms(timeframe) % int(interval_sec * 1000)) != 0:
+            logger.warning(f"Cycle interval {interval_sec}s does not divide timeframe {timeframe}; candle closes will not align")
+        self.interval = float(interval_sec)
+        self.offset = float(offset_sec)
+        self.clock = clock
+        self.sleep = sleep
+        self.next_fire = None
+        self.metrics = {
+            "cycles": 0,
+            "skipped": 0,
+            "overruns": 0,
+            "last_lag_sec": 0.0,
+            "max_lag_sec": 0.0,
+            "last_duration_sec": 0.0,
+        }
+
+    def next_fire_after(self, now: float) -> float:
+        """
+        First boundary + offset strictly after `now`.
+        """
+        return ((now - self.offset) // self.interval + 1) * self.interval + self.offset
+
+    def wait(self) -> float:
+        """
+        Sleeps until the next fire time and returns the scheduled timestamp.
+        """
+        if self.next_fire is None:
+            self.next_fire = self.next_fire_after(self.clock())
+        delay = self.next_fire - self.clock()
+        if delay > 0:
+            self.sleep(delay)
+        return self.next_fire
+
+    def run_once(self, fn):
+        scheduled = self.wait()
+        started = self.clock()
+        lag = max(0.0, started - scheduled)
+        try:
+            fn()
+        finally:
+            finished = self.clock()
+            self._advance(scheduled, started, finished, lag)
+
+    def run(self, fn):
+        while True:
+            self.run_once(fn)
+
+    def _advance(self, scheduled: float, started: float, finished: float, lag: float):
+        duration = finished - started
+        next_fire = scheduled + self.interval
+        if finished >= next_fire:
+            upcoming = self.next_fire_after(finished)
+            skipped = int(round((upcoming - next_fire) / self.interval))
+            self.metrics["overruns"] += 1
+            self.metrics["skipped"] += skipped
+            logger.warning(f"Cycle overran by {finished - next_fire:.2f}s; skipping {skipped} slot(s)")
+            next_fire = upcoming
+
+        self.next_fire = next_fire
+        self.metrics["cycles"] += 1
+        self.metrics["last_lag_sec"] = lag
+        self.metrics["max_lag_sec"] = max(self.metrics["max_lag_sec"], lag)
+        self.metrics["last_duration_sec"] = duration
+        logger.info(
+            f"Cycle took {duration:.2f}s (lag {lag * 1000:.0f}ms); "
+            f"next at {time.strftime('%H:%M:%S', time.localtime(next_fire))}"
+        )
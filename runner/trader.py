@@ -1,62 +1,378 @@
+import threading
 import time
-from market.data import get_market_snapshot
-from strategy.decision_engine import decide_trade
+from concurrent.futures import ThreadPoolExecutor
+from market.data import get_latest_price, get_market_snapshot, get_market_snapshots, start_market_stream
+from strategy.decision_engine import decide_trade, decide_trades
 from risk.guardrails import check_trade_allowed
-from exchange.orders import place_order
-from exchange.ai_log_uploader import upload_ai_log
+from exchange.orders import get_gateway, place_order
+from account.position_book import PositionBook
+from exchange.ai_log_uploader import enqueue_ai_log
+from runner.scheduler import CandleScheduler
 from utils.logger import get_logger
-from config.settings import ALLOWED_SYMBOLS, MAX_OPEN_TRADES, TRADE_NOTIONAL_USDT, TAKE_PROFIT_USDT, STOP_LOSS_USDT
+from utils.metrics import metrics, start_metrics_server, start_metrics_summary
+from utils.startup import StartupProfile
+from config.settings import (
+    ALLOWED_SYMBOLS,
+    CYCLE_INTERVAL_SEC,
+    CYCLE_OFFSET_SEC,
+    INFERENCE_MODE,
+    MARKET_STREAM_ENABLED,
+    MAX_LEVERAGE,
+    MAX_OPEN_TRADES,
+    METRICS_HOST,
+    METRICS_PORT,
+    METRICS_SUMMARY_INTERVAL_SEC,
+    POSITION_BOOK_PATH,
+    STARTUP_WARMUP,
+    STARTUP_WARMUP_TIMEOUT_SEC,
+    SYMBOL_WORKERS,
+    TRADE_NOTIONAL_USDT,
+    TAKE_PROFIT_USDT,
+    STOP_LOSS_USDT,
+    TIMEFRAME,
+)
 
 class Trader:
-    def __init__(self):
+    def __init__(self, workers: int = SYMBOL_WORKERS, inference_mode: str = INFERENCE_MODE, upload_ai_logs: bool = True, position_book_path: str = POSITION_BOOK_PATH):
         self.logger = get_logger("TRADER")
-        self.open_symbols = set()
-        self.positions = {}
+        # Backtests replay the pipeline without queueing AI logs for upload
+        self.upload_ai_logs = upload_ai_logs
+        # Fills are written through to disk so a restart remembers open shorts
+        self.book = PositionBook(position_book_path) if position_book_path else None
+        self.positions = self.book.load() if self.book else {}
+        self.open_symbols = set(self.positions)
+        if self.positions:
+            self.logger.info(f"Loaded {len(self.positions)} open positions from {position_book_path}")
+        self.workers = max(1, int(workers))
+        self.inference_mode = inference_mode
+        # Guards open_symbols / positions / _in_flight and the MAX_OPEN_TRADES check
+        self._book_lock = threading.Lock()
+        # Symbols with an order in flight: their slot is held and reconciliation skips them
+        self._in_flight = set()
+        self._timings_lock = threading.Lock()
+        self._cycle_timings = []
+        self.scheduler = CandleScheduler(CYCLE_INTERVAL_SEC, CYCLE_OFFSET_SEC, timeframe=TIMEFRAME)
+        # Streamed LLM entries set their leverage while the reason is still generating
+        from ai.backends import set_decision_field_listener
+        set_decision_field_listener(self._on_decision_field)
 
-    def run(self):
+    def run(self, startup_profile: StartupProfile | None = None):
         """
-        Main execution loop.
+        Main execution loop. startup_profile (from main.py) times the warm-up
+        and is reported once the first cycle can start.
         """
-        self.logger.info("Starting Trader Loop...")
-        while True:
-            for symbol in ALLOWED_SYMBOLS:
+        profile = startup_profile or StartupProfile()
+        self.logger.info(f"Starting Trader Loop (workers={self.workers})...")
+        with profile.phase("warm_up" if STARTUP_WARMUP else "reconcile"):
+            if STARTUP_WARMUP:
+                self.warm_up(profile=profile)
+            else:
+                self.reconcile_positions()
+        with profile.phase("services"):
+            if MARKET_STREAM_ENABLED:
+                start_market_stream(ALLOWED_SYMBOLS)
+            start_metrics_server(METRICS_HOST, METRICS_PORT)
+            start_metrics_summary(METRICS_SUMMARY_INTERVAL_SEC)
+        profile.stop()
+        if profile.enabled:
+            self.logger.info(profile.report())
+        executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="symbol") if self.workers > 1 else None
+        try:
+            self.scheduler.run(lambda: self.run_cycle(executor))
+        finally:
+            if executor:
+                executor.shutdown(wait=False)
+
+    def warm_up(self, timeout: float = STARTUP_WARMUP_TIMEOUT_SEC, profile: StartupProfile | None = None) -> dict:
+        """
+        Runs the pre-cycle work concurrently: position reconciliation (the
+        account fetch also checks credentials), one public ticker per symbol
+        to fill the WEEX connection pool, and the LLM client's SDK load and
+        first connection. Returns {task: ok}. Reconciliation is always awaited;
+        the connection tasks are abandoned after `timeout`, since a failure
+        only costs the first cycle its head start.
+        """
+        profile = profile or StartupProfile()
+        pool = ThreadPoolExecutor(max_workers=len(ALLOWED_SYMBOLS), thread_name_prefix="warm-up")
+        tasks = {
+            "reconcile": self.reconcile_positions,
+            "weex_pool": lambda: all(pool.map(get_latest_price, ALLOWED_SYMBOLS)),
+        }
+        from ai.inference import uses_llm
+        if uses_llm():
+            from ai.llm_client import get_llm_client
+            tasks["llm"] = lambda: get_llm_client().warm_up(timeout)
+
+        def run_task(name, fn):
+            with profile.phase(f"warm_up:{name}"):
                 try:
-                    self.process_symbol(symbol)
+                    return bool(fn())
                 except Exception as e:
-                    self.logger.error(f"Error processing {symbol}: {e}", exc_info=True)
-            
-            # Wait for next cycle
-            self.logger.info("Sleeping for 60 seconds...")
-            time.sleep(60)
+                    self.logger.warning(f"Warm-up task {name} failed: {e}")
+                    return False
+
+        # Task threads are separate from the ticker fan-out so neither starves the other
+        task_pool = ThreadPoolExecutor(max_workers=len(tasks), thread_name_prefix="warm-up-task")
+        futures = {name: task_pool.submit(run_task, name, fn) for name, fn in tasks.items()}
+        deadline = time.monotonic() + timeout
+        results = {}
+        for name, future in futures.items():
+            # The first cycle must see the reconciled book; the rest is best effort
+            wait = None if name == "reconcile" else max(0.0, deadline - time.monotonic())
+            try:
+                results[name] = future.result(wait)
+            except TimeoutError:
+                self.logger.warning(f"Warm-up task {name} still running after {timeout:g}s; starting anyway")
+                results[name] = False
+        task_pool.shutdown(wait=False)
+        pool.shutdown(wait=False)
+        self.logger.info(f"Warm-up done: {results}")
+        return results
+
+    def reconcile_positions(self, open_positions: list | None = None) -> bool:
+        """
+        Aligns positions, open_symbols and the SQLite book with the exchange's
+        open positions, taken from one bulk account fetch unless given.
+        Symbols with an order in flight keep their local state and slot.
+        Returns False if the exchange could not be read (the local book is
+        kept as is).
+        """
+        if open_positions is None:
+            from account.state import get_account_state, invalidate_account_state
+            invalidate_account_state()
+            account_state = get_account_state()
+            if "open_positions" not in account_state:
+                self.logger.warning("Position reconciliation skipped: account state unavailable.")
+                return False
+            open_positions = account_state["open_positions"]
+
+        with self._book_lock:
+            if self.book:
+                self.positions = self.book.reconcile(open_positions, keep=self._in_flight)
+            else:
+                positions = {
+                    p["symbol"]: {k: p[k] for k in ("side", "entry_price", "size", "leverage")}
+                    for p in open_positions
+                    if p["symbol"] not in self._in_flight
+                }
+                positions.update({s: self.positions[s] for s in self._in_flight if s in self.positions})
+                self.positions = positions
+            self.open_symbols = set(self.positions) | self._in_flight
+        return True
+
+    def sync_positions(self) -> bool:
+        """
+        Once per cycle: reconciles against the account snapshot the symbols
+        are about to decide on (cached, so this adds no request), so shorts
+        closed by TP/SL on the exchange free their symbol and slot.
+        """
+        from account.state import get_account_state
+        account_state = get_account_state()
+        if "open_positions" not in account_state:
+            self.logger.warning("Position sync skipped: account state unavailable.")
+            return False
+        return self.reconcile_positions(account_state["open_positions"])
+
+    def run_cycle(self, executor: ThreadPoolExecutor | None = None):
+        """
+        Processes every symbol once. With an executor, symbols are fanned out
+        concurrently; otherwise they run serially in ALLOWED_SYMBOLS order.
+        """
+        cycle_start = time.perf_counter()
+        with self._timings_lock:
+            self._cycle_timings = []
+
+        # One batched market fetch per cycle (bulk funding, concurrent candles)
+        snapshots = get_market_snapshots(ALLOWED_SYMBOLS)
+        market_elapsed = time.perf_counter() - cycle_start
+        self.sync_positions()
+
+        if self.inference_mode == "batch":
+            self._run_batch_cycle(executor, snapshots)
+        else:
+            self._map(executor, self._process_symbol_safe, [(s, snapshots.get(s)) for s in ALLOWED_SYMBOLS])
+
+        total = time.perf_counter() - cycle_start
+        metrics.observe("trade_cycle_seconds", total)
+        with self._book_lock:
+            metrics.set("open_positions", len(self.open_symbols))
+        self._log_cycle_timings(total, market_elapsed)
+
+    def _map(self, executor: ThreadPoolExecutor | None, fn, args_list: list) -> list:
+        """
+        Applies fn to each args tuple, concurrently when an executor is given.
+        """
+        if executor is None:
+            return [fn(*args) for args in args_list]
+        futures = [executor.submit(fn, *args) for args in args_list]
+        # SystemExit from the AI log kill switch must stop the loop
+        return [future.result() for future in futures]
+
+    def _run_batch_cycle(self, executor: ThreadPoolExecutor | None, snapshots: dict, symbols: list = ALLOWED_SYMBOLS):
+        """
+        Batch inference mode: prepare every symbol, decide all of them with one
+        LLM call, then execute and log each symbol.
+        """
+        prepared = self._map(
+            executor,
+            self._prepare_safe,
+            [(symbol, snapshots.get(symbol)) for symbol in symbols],
+        )
+        prepared = [p for p in prepared if p is not None]
+        if not prepared:
+            return
+
+        t0 = time.perf_counter()
+        decisions = decide_trades([
+            (p["market"], p["account"], p["position"], p["constraints"]) for p in prepared
+        ])
+        elapsed = time.perf_counter() - t0
+        for p in prepared:
+            p["timings"]["decision"] = elapsed
+
+        self._map(
+            executor,
+            self._finish_safe,
+            [(p, decisions[p["symbol"]]) for p in prepared],
+        )
+
+    def _prepare_safe(self, symbol: str, market_snapshot: dict | None) -> dict | None:
+        timings = {}
+        try:
+            prepared = self._prepare(symbol, market_snapshot, timings)
+        except Exception as e:
+            self.logger.error(f"Error processing {symbol}: {e}", exc_info=True)
+            prepared = None
+        if prepared is None:
+            self._record_timings(symbol, timings)
+        return prepared
+
+    def _finish_safe(self, prepared: dict, decision: dict):
+        try:
+            self._finish(prepared, decision)
+        except SystemExit:
+            raise
+        except Exception as e:
+            self.logger.error(f"Error processing {prepared['symbol']}: {e}", exc_info=True)
+        finally:
+            self._record_timings(prepared["symbol"], prepared["timings"])
+
+    def _process_symbol_safe(self, symbol: str, market_snapshot: dict | None = None):
+        try:
+            self.process_symbol(symbol, market_snapshot)
+        except SystemExit:
+            raise
+        except Exception as e:
+            self.logger.error(f"Error processing {symbol}: {e}", exc_info=True)
+
+    def _record_timings(self, symbol: str, timings: dict):
+        with self._timings_lock:
+            self._cycle_timings.append((symbol, timings))
+
+    def _log_cycle_timings(self, total: float, market_elapsed: float):
+        with self._timings_lock:
+            cycle_timings = list(self._cycle_timings)
+
+        stages = {}
+        for _, timings in cycle_timings:
+            for stage, elapsed in timings.items():
+                stages.setdefault(stage, []).append(elapsed)
+
+        parts = [
+            f"{stage}=avg {sum(v) / len(v) * 1000:.0f}ms/max {max(v) * 1000:.0f}ms"
+            for stage, v in stages.items()
+        ]
+        self.logger.info(
+            f"Cycle done in {total:.2f}s ({len(cycle_timings)} symbols): "
+            f"market_batch={market_elapsed * 1000:.0f}ms, " + ", ".join(parts)
+        )
+
+    def _on_decision_field(self, symbol: str, key: str, fields: dict):
+        """
+        Streamed-decision hook (LLM loop thread, must not block): once an
+        entry's leverage is known, the exchange leverage is set in the
+        background. Only for a SELL that already precedes the leverage and
+        that the local book would let through (symbol flat, a slot free);
+        the value is clamped to MAX_LEVERAGE. Guardrails still run on the
+        finished decision.
+        """
+        if key != "leverage" or fields.get("action") != "SELL" or symbol not in ALLOWED_SYMBOLS:
+            return
+        leverage = fields["leverage"]
+        if type(leverage) is not int or leverage < 1:
+            return
+        with self._book_lock:
+            if symbol in self.positions or symbol in self._in_flight or self._max_trades_reached(symbol):
+                return
+        get_gateway().prewarm_leverage(symbol, min(leverage, MAX_LEVERAGE))
+
+    def _max_trades_reached(self, symbol: str) -> bool:
+        # Caller must hold self._book_lock
+        position = self.positions.get(symbol)
+        has_position = symbol in self.open_symbols or position is not None
+        return not has_position and MAX_OPEN_TRADES and len(self.open_symbols) >= MAX_OPEN_TRADES
+
+    def process_symbol(self, symbol: str, market_snapshot: dict | None = None):
+        """
+        Runs one symbol through decision, guardrails, execution and AI logging.
+        market_snapshot comes from the cycle's batched fetch; when omitted it is
+        fetched for this symbol alone.
+        """
+        timings = {}
+        try:
+            self._process_symbol(symbol, market_snapshot, timings)
+        finally:
+            self._record_timings(symbol, timings)
+
+    def _process_symbol(self, symbol: str, market_snapshot: dict | None, timings: dict):
+        prepared = self._prepare(symbol, market_snapshot, timings)
+        if prepared is None:
+            return
 
-    def process_symbol(self, symbol: str):
+        # 2️⃣ AI decision
+        t0 = time.perf_counter()
+        decision = decide_trade(
+            prepared["market"],
+            prepared["account"],
+            position=prepared["position"],
+            constraints=prepared["constraints"],
+        )
+        timings["decision"] = time.perf_counter() - t0
+
+        self._finish(prepared, decision)
+
+    def _prepare(self, symbol: str, market_snapshot: dict | None, timings: dict) -> dict | None:
+        """
+        Gathers market, account and position inputs for the decision.
+        Returns None when the symbol is skipped this cycle.
+        """
         # 1️⃣ Get market data
-        market_snapshot = get_market_snapshot(symbol)
+        if market_snapshot is None:
+            t0 = time.perf_counter()
+            market_snapshot = get_market_snapshot(symbol)
+            timings["market"] = time.perf_counter() - t0
         if not market_snapshot or market_snapshot.get("price", 0) == 0:
             self.logger.warning(f"Skipping {symbol}: market data unavailable.")
-            return
+            return None
         
         # 1.5 Get Account State
         from account.state import get_account_state
+        t0 = time.perf_counter()
         account_state = get_account_state()
+        timings["account"] = time.perf_counter() - t0
         
         # 🛡️ OPEN POSITION CHECKS
-        # Prefer exchange-reported positions; fall back to local tracking.
-        open_positions = account_state.get("open_positions", [])
-        if open_positions:
-            self.open_symbols = {p.get("symbol") for p in open_positions if p.get("symbol")}
-
-        position = self.positions.get(symbol)
-        has_position = symbol in self.open_symbols or position is not None
+        # The book was reconciled with the exchange at the start of the cycle
+        with self._book_lock:
+            position = self.positions.get(symbol)
 
-        if not has_position and MAX_OPEN_TRADES and len(self.open_symbols) >= MAX_OPEN_TRADES:
-            self.logger.info(
-                f"Skipping {symbol}: max open trades reached "
-                f"({len(self.open_symbols)}/{MAX_OPEN_TRADES})."
-            )
-            return
+            if self._max_trades_reached(symbol):
+                self.logger.info(
+                    f"Skipping {symbol}: max open trades reached "
+                    f"({len(self.open_symbols)}/{MAX_OPEN_TRADES})."
+                )
+                return None
 
-        # 2️⃣ AI decision
         price = market_snapshot.get("price", 0.0)
         required_size = round(TRADE_NOTIONAL_USDT / price, 8) if price else 0.0
         pnl_usdt = 0.0
@@ -69,38 +385,95 @@ class Trader:
             "required_size": required_size if not position else position["size"],
         }
 
-        decision = decide_trade(
-            market_snapshot,
-            account_state,
-            position=position,
-            constraints=constraints,
-        )
+        return {
+            "symbol": symbol,
+            "market": market_snapshot,
+            "account": account_state,
+            "position": position,
+            "constraints": constraints,
+            "price": price,
+            "timings": timings,
+        }
+
+    def _finish(self, prepared: dict, decision: dict):
+        """
+        Guardrails, execution and AI log for a decided symbol.
+        """
+        symbol = prepared["symbol"]
+        price = prepared["price"]
+        timings = prepared["timings"]
         decision["price"] = price
 
         # 3️⃣ Guardrails
-        allowed, reason = check_trade_allowed(decision, symbol, account_state)
+        allowed, reason = check_trade_allowed(decision, symbol, prepared["account"])
+        metrics.inc("decisions_total", action=decision.get("action", "HOLD"), allowed=str(allowed).lower())
 
-        order_id = None
+        t0 = time.perf_counter()
+        order_id = self._execute(symbol, decision, prepared["position"], price, allowed, reason)
+        timings["execution"] = time.perf_counter() - t0
 
-        if allowed and decision["action"] != "HOLD":
-            self.logger.info(f"Executing {decision['action']} on {symbol}")
-            # 4️⃣ Execute order
-            side = decision["action"]
-            size = decision["size"]
-            take_profit = None
-            stop_loss = None
-
-            if decision["action"] == "SELL" and price > 0 and size > 0:
-                take_profit = round(price - (TAKE_PROFIT_USDT / size), 2)
-                stop_loss = round(price + (STOP_LOSS_USDT / size), 2)
-            if decision["action"] == "SELL" and (take_profit is None or stop_loss is None):
-                self.logger.error("Skipping entry: TP/SL not set.")
-                return
+        # 5️⃣ Upload AI log (ALWAYS) — queued, uploaded in the background
+        if not self.upload_ai_logs:
+            return
+        t0 = time.perf_counter()
+        try:
+            enqueue_ai_log(
+                order_id=order_id,
+                ai_log=decision["ai_log"]
+            )
+        except SystemExit:
+            # Re-raise to stop the main loop
+            self.logger.critical("Stopping Trader due to AI Log Kill Switch.")
+            raise
+        finally:
+            timings["ai_log"] = time.perf_counter() - t0
 
-            if decision["action"] == "CLOSE":
-                side = "BUY"  # Close short position
-                size = position["size"] if position else decision["size"]
+    def _execute(self, symbol: str, decision: dict, position: dict | None, price: float, allowed: bool, reason: str):
+        """
+        Places the order for an allowed decision and updates the position book.
+        The MAX_OPEN_TRADES re-check reserves the symbol's slot under
+        self._book_lock; the order itself is sent outside the lock so symbols
+        deciding in the same cycle submit concurrently.
+        """
+        if not allowed:
+            self.logger.warning(f"Trade blocked for {symbol}: {reason}")
+            return None
+        if decision["action"] == "HOLD":
+            self.logger.info(f"HOLD decision for {symbol}")
+            return None
+
+        self.logger.info(f"Executing {decision['action']} on {symbol}")
+        # 4️⃣ Execute order
+        side = decision["action"]
+        size = decision["size"]
+        take_profit = None
+        stop_loss = None
+
+        if decision["action"] == "SELL" and price > 0 and size > 0:
+            take_profit = round(price - (TAKE_PROFIT_USDT / size), 2)
+            stop_loss = round(price + (STOP_LOSS_USDT / size), 2)
+        if decision["action"] == "SELL" and (take_profit is None or stop_loss is None):
+            self.logger.error("Skipping entry: TP/SL not set.")
+            return None
 
+        if decision["action"] == "CLOSE":
+            side = "BUY"  # Close short position
+            size = position["size"] if position else decision["size"]
+
+        with self._book_lock:
+            if decision["action"] == "SELL":
+                if self._max_trades_reached(symbol):
+                    self.logger.info(
+                        f"Skipping {symbol} entry: max open trades reached "
+                        f"({len(self.open_symbols)}/{MAX_OPEN_TRADES})."
+                    )
+                    return None
+                # Hold the slot while the order is in flight
+                self.open_symbols.add(symbol)
+            self._in_flight.add(symbol)
+
+        order_id = None
+        try:
             order_id = place_order(
                 symbol=symbol,
                 side=side,
@@ -109,30 +482,34 @@ class Trader:
                 take_profit=take_profit,
                 stop_loss=stop_loss,
             )
-            if order_id:
-                if decision["action"] == "SELL":
-                    self.open_symbols.add(symbol)
-                    self.positions[symbol] = {
-                        "side": "SHORT",
-                        "entry_price": price,
-                        "size": size,
-                        "leverage": decision["leverage"],
-                    }
-                elif decision["action"] == "CLOSE":
-                    self.open_symbols.discard(symbol)
-                    self.positions.pop(symbol, None)
-        elif not allowed:
-            self.logger.warning(f"Trade blocked for {symbol}: {reason}")
-        else:
-            self.logger.info(f"HOLD decision for {symbol}")
+        finally:
+            if not order_id:
+                with self._book_lock:
+                    self._in_flight.discard(symbol)
+                    if symbol not in self.positions:
+                        self.open_symbols.discard(symbol)
+        if not order_id:
+            return None
 
-        # 5️⃣ Upload AI log (ALWAYS)
-        try:
-            upload_ai_log(
-                order_id=order_id,
-                ai_log=decision["ai_log"]
-            )
-        except SystemExit:
-            # Re-raise to stop the main loop
-            self.logger.critical("Stopping Trader due to AI Log Kill Switch.")
-            raise
+        # Balance and positions changed; next symbol must see a fresh account
+        from account.state import invalidate_account_state
+        invalidate_account_state()
+
+        with self._book_lock:
+            self._in_flight.discard(symbol)
+            if decision["action"] == "SELL":
+                self.positions[symbol] = {
+                    "side": "SHORT",
+                    "entry_price": price,
+                    "size": size,
+                    "leverage": decision["leverage"],
+                }
+                if self.book:
+                    self.book.open(symbol, {**self.positions[symbol], "take_profit": take_profit, "stop_loss": stop_loss}, order_id)
+            elif decision["action"] == "CLOSE":
+                self.open_symbols.discard(symbol)
+                self.positions.pop(symbol, None)
+                if self.book:
+                    self.book.close(symbol, price, order_id)
+
+        return order_id
@@ -0,0 +1,73 @@
+import copy
+import threading
+import time
+from collections import OrderedDict
+
+from ai.feature import FEATURE_VERSION, get_features, quantize_features
+from utils.logger import get_logger
+
+logger = get_logger("DECISION_CACHE")
+
+
+def fingerprint(context: dict) -> tuple:
+    """
+    Quantized key of everything the model sees that should change its answer:
+    the bucketed feature row (indicators, funding, position and allowed
+    actions/size), tagged with the feature schema version.
+
+    The candle time is deliberately not part of the key, so a decision can be
+    reused across candles while no quantized feature moves; the cache TTL
+    bounds how old a reused decision can get. Keying on the candle would cap
+    reuse at the polls within one candle (4 of 5 at 60s polls on 5m bars).
+    Price and size are keyed on 4 significant digits, so busy markets still
+    miss often.
+    """
+    market = context.get("market", {})
+    return (
+        market.get("symbol"),
+        FEATURE_VERSION,
+        quantize_features(get_features(context)),
+    )
+
+
+class DecisionCache:
+    """
+    Thread-safe LRU of validated decisions keyed by fingerprint(), with a TTL.
+    """
+
+    def __init__(self, ttl: float, maxsize: int):
+        self.ttl = ttl
+        self.maxsize = maxsize
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and time.monotonic() - entry[0] < self.ttl:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return copy.deepcopy(entry[1])
+            if entry is not None:
+                del self._entries[key]
+            self.misses += 1
+            return None
+
+    def put(self, key, decision: dict):
+        with self._lock:
+            self._entries[key] = (time.monotonic(), copy.deepcopy(decision))
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    def stats(self) -> dict:
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / total, 4) if total else 0.0,
+                "size": len(self._entries),
+            }
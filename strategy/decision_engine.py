@@ -1,8 +1,14 @@
-from ai.inference import run_inference
+from ai.feature import append_feature_dump, attach_features, loggable_context
+from ai.inference import run_batch_inference, run_inference
+from config.settings import DECISION_CACHE_ENABLED, DECISION_CACHE_SIZE, DECISION_CACHE_TTL_SEC, FEATURE_DUMP_PATH
+from strategy.decision_cache import DecisionCache, fingerprint
 from utils.logger import get_logger
+from utils.metrics import timed
 
 logger = get_logger("DECISION_ENGINE")
+decision_cache = DecisionCache(ttl=DECISION_CACHE_TTL_SEC, maxsize=DECISION_CACHE_SIZE)
 
+@timed("decide_trade_seconds")
 def decide_trade(market_snapshot: dict, account_state: dict, position: dict | None = None, constraints: dict | None = None) -> dict:
     """
     Orchestrates the AI decision process.
@@ -14,12 +20,13 @@ def decide_trade(market_snapshot: dict, account_state: dict, position: dict | No
     symbol = market_snapshot.get("symbol", "UNKNOWN")
 
     # Prepare enriched context for AI
-    context = {
-        "market": market_snapshot,
-        "account": account_state,
-        "position": position or {},
-        "constraints": constraints or {},
-    }
+    context = _build_context(market_snapshot, account_state, position, constraints)
+    attach_features([context])
+
+    cache_key = fingerprint(context) if DECISION_CACHE_ENABLED else None
+    cached = _cache_lookup(cache_key, context)
+    if cached is not None:
+        return cached
 
     logger.info(f"Requesting AI decision for {symbol}...")
 
@@ -28,35 +35,134 @@ def decide_trade(market_snapshot: dict, account_state: dict, position: dict | No
         # Pass the full context to run_inference
         # run_inference will call build_prompt(context)
         decision = run_inference(context)
-        
-        # Ensure decision has 'ai_log' populated correctly by inference.py
-        if "ai_log" not in decision:
-             decision["ai_log"] = {
-                 "stage": "Decision Making",
-                 "model": "gpt-4o-mini",
-                 "input": context, # Pass pure dict, not string
-                 "output": decision, # Pass pure dict, not string
-                 "explanation": decision.get("reason", "No reason provided")
-             }
-             
     except Exception as e:
         logger.error(f"AI Inference failed for {symbol}: {e}")
-        # Fallback to safe HOLD on error
-        return {
-            "action": "HOLD",
-            "confidence": 0.0,
-            "leverage": 1,
-            "size": 0.0,
-            "reason": f"System Error: {str(e)}",
-            "ai_log": {
-                "stage": "Error Handling",
-                "model": "System",
-                "input": str(context), 
-                "output": {"error": str(e)},
-                "explanation": "Fallback due to inference exception"
-            }
+        return _fallback_hold(context, e)
+
+    decision = _finalize(decision, context, cache_key)
+    _dump_features([context], [decision])
+    return decision
+
+@timed("decide_trades_seconds")
+def decide_trades(requests: list) -> dict:
+    """
+    Batch variant of decide_trade for one cycle.
+    requests: list of (market_snapshot, account_state, position, constraints).
+    Cache hits are answered locally; all misses share a single LLM call.
+    Returns {symbol: decision}.
+    """
+    decisions = {}
+    pending = []
+    # One feature batch for every symbol of the cycle
+    contexts = attach_features([_build_context(*request) for request in requests])
+    for context in contexts:
+        symbol = context["market"].get("symbol", "UNKNOWN")
+        cache_key = fingerprint(context) if DECISION_CACHE_ENABLED else None
+        cached = _cache_lookup(cache_key, context)
+        if cached is not None:
+            decisions[symbol] = cached
+        else:
+            pending.append((symbol, context, cache_key))
+
+    if not pending:
+        return decisions
+
+    logger.info(f"Requesting batched AI decision for {len(pending)} symbols...")
+    try:
+        results = run_batch_inference([context for _, context, _ in pending])
+    except Exception as e:
+        results = [e] * len(pending)
+
+    decided = []
+    for (symbol, context, cache_key), result in zip(pending, results):
+        if isinstance(result, Exception):
+            logger.error(f"AI Inference failed for {symbol}: {result}")
+            decisions[symbol] = _fallback_hold(context, result)
+        else:
+            decisions[symbol] = _finalize(result, context, cache_key)
+            decided.append((context, decisions[symbol]))
+    if decided:
+        _dump_features(*zip(*decided))
+    return decisions
+
+def _build_context(market_snapshot: dict, account_state: dict, position: dict | None, constraints: dict | None) -> dict:
+    return {
+        "market": market_snapshot,
+        "account": account_state,
+        "position": position or {},
+        "constraints": constraints or {},
+    }
+
+def _cache_lookup(cache_key, context: dict) -> dict | None:
+    if cache_key is None:
+        return None
+    cached = decision_cache.get(cache_key)
+    if cached is None:
+        return None
+    symbol = context["market"].get("symbol", "UNKNOWN")
+    logger.info(f"Reusing cached AI decision for {symbol} ({decision_cache.stats()['hit_rate']:.0%} hit rate)")
+    return _from_cache(cached, context)
+
+def _finalize(decision: dict, context: dict, cache_key) -> dict:
+    # Ensure decision has 'ai_log' populated correctly by inference.py
+    if "ai_log" not in decision:
+         decision["ai_log"] = {
+             "stage": "Decision Making",
+             "model": "gpt-4o-mini",
+             "input": loggable_context(context), # Pass pure dict, not string
+             "output": decision, # Pass pure dict, not string
+             "explanation": decision.get("reason", "No reason provided")
+         }
+
+    # Fallback decisions are not cached, so the LLM is asked again next cycle
+    if cache_key is not None and not decision.get("fallback"):
+        # Only the decision and model are kept; ai_log is rebuilt on reuse
+        cached = {k: v for k, v in decision.items() if k != "ai_log"}
+        cached["ai_log"] = {"model": decision["ai_log"].get("model")}
+        decision_cache.put(cache_key, cached)
+
+    return decision
+
+def _fallback_hold(context: dict, e: Exception) -> dict:
+    # Fallback to safe HOLD on error
+    return {
+        "action": "HOLD",
+        "confidence": 0.0,
+        "leverage": 1,
+        "size": 0.0,
+        "reason": f"System Error: {str(e)}",
+        "ai_log": {
+            "stage": "Error Handling",
+            "model": "System",
+            "input": str(loggable_context(context)), 
+            "output": {"error": str(e)},
+            "explanation": "Fallback due to inference exception"
         }
+    }
 
+def _from_cache(decision: dict, context: dict) -> dict:
+    """
+    Rebuilds a cached decision's ai_log for the current context, marked as cached.
+    """
+    model = decision.get("ai_log", {}).get("model", "gpt-4o-mini")
+    decision = {k: v for k, v in decision.items() if k != "ai_log"}
+    decision["ai_log"] = {
+        "stage": "Decision Making",
+        "model": model,
+        "input": loggable_context(context),
+        "output": {**decision, "cached": True},
+        "explanation": f"[cached] {decision.get('reason', '')}",
+    }
     return decision
 
+def _dump_features(contexts, decisions):
+    # Offline training data: feature rows of fresh (non-cached) decisions
+    if not FEATURE_DUMP_PATH:
+        return
+    try:
+        append_feature_dump(FEATURE_DUMP_PATH, list(contexts), list(decisions))
+    except OSError as e:
+        logger.warning(f"Feature dump failed: {e}")
 
+def decision_cache_stats() -> dict:
+    return decision_cache.stats()
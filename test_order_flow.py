@@ -1,60 +1,61 @@
-from exchange.weex_client import WeexClient
-from exchange.orders import OrderManager
-from dotenv import load_dotenv
-import os
-import yaml
-import time
+"""
+Manual end-to-end order check: leverage, ticker, market entry with TP/SL,
+position readback and close.
 
-load_dotenv()
+    python test_order_flow.py          # live account from .env (WEEX_BASE_URL, keys)
+    python test_order_flow.py --sim    # local WEEX simulator, no credentials needed
+"""
+import sys
 
-with open("config/settings.yaml") as f:
-    settings = yaml.safe_load(f)
+from dotenv import load_dotenv
 
-client = WeexClient(
-    api_key=os.getenv("WEEX_API_KEY"),
-    secret_key=os.getenv("WEEX_SECRET_KEY"),
-    passphrase=os.getenv("WEEX_PASSPHRASE"),
-    base_url=settings["base_url"]
-)
+from account.state import get_account_state, invalidate_account_state
+from exchange.orders import place_order, set_leverage
+from exchange.weex_client import WeexClient
+from market.data import get_latest_price
 
-orders = OrderManager(client)
+load_dotenv()
 
 SYMBOL = "cmt_btcusdt"
-
-print("Setting leverage...")
-print(orders.set_leverage(SYMBOL, leverage=1))
-
-print("Fetching ticker...")
-ticker = client.get(
-    "/capi/v2/market/ticker",
-    params={"symbol": SYMBOL}
-)
-print(ticker)
-
-price = float(ticker["last"])
-
-# Place a small order (~10 USDT)
-size = 0.0001  # small & safe
-limit_price = price * 0.98  # below market to avoid instant fill
-
-print("Placing order...")
-order_resp = orders.place_limit_order(
-    symbol=SYMBOL,
-    side="BUY",
-    price=limit_price,
-    size=size,
-    client_oid="api-test"
-)
-
-print(order_resp)
-
-order_id = order_resp.get("order_id")
-if not order_id:
-    raise RuntimeError("Order ID not returned")
-
-print("Waiting for fill...")
-time.sleep(5)
-
-print("Fetching fills...")
-fills = orders.get_fills(SYMBOL, order_id)
-print(fills)
+LEVERAGE = 1
+NOTIONAL_USDT = 10  # small & safe
+
+server = None
+if "--sim" in sys.argv:
+    from exchange.sim_server import WeexSimServer, live_histories
+
+    server = WeexSimServer(live_histories([SYMBOL]))
+    server.start()
+    WeexClient.set_shared(server.client())
+
+try:
+    print("Setting leverage...")
+    set_leverage(SYMBOL, LEVERAGE)
+
+    print("Fetching ticker...")
+    price = get_latest_price(SYMBOL)
+    print(price)
+    if not price:
+        raise RuntimeError("Ticker not returned")
+
+    size = round(NOTIONAL_USDT / price, 6)
+    print("Placing order...")
+    order_id = place_order(
+        SYMBOL, "BUY", size, LEVERAGE,
+        take_profit=round(price * 1.02, 2),
+        stop_loss=round(price * 0.98, 2),
+    )
+    print(order_id)
+    if not order_id:
+        raise RuntimeError("Order ID not returned")
+
+    print("Fetching account...")
+    invalidate_account_state()
+    print(get_account_state())
+
+    print("Closing position...")
+    print(place_order(SYMBOL, "SELL", size, LEVERAGE, take_profit=price * 0.98, stop_loss=price * 1.02))
+finally:
+    if server is not None:
+        print(f"Simulator requests: {server.stats}, trades: {server.exchange.trades}")
+        server.stop()
@@ -0,0 +1,113 @@
+"""
+AILogQueue spool: pending logs survive a restart, acked ones do not, and
+failed uploads are retried rather than dropped.
+"""
+import json
+import threading
+
+import pytest
+
+import exchange.ai_log_uploader as ai_log_uploader
+from exchange.ai_log_uploader import AILogQueue
+
+
+class Recorder:
+    """
+    Upload stub: records order ids and answers from `results` (then True).
+    """
+
+    def __init__(self, *results):
+        self.results = list(results)
+        self.order_ids = []
+        self.lock = threading.Lock()
+
+    def __call__(self, order_id, ai_log):
+        with self.lock:
+            self.order_ids.append(order_id)
+            return self.results.pop(0) if self.results else True
+
+
+@pytest.fixture(autouse=True)
+def reset_fail_count(monkeypatch):
+    monkeypatch.setattr(ai_log_uploader, "FAIL_COUNT", 0)
+
+
+@pytest.fixture
+def spool_path(tmp_path):
+    return str(tmp_path / "ai_log_spool.jsonl")
+
+
+def _spool_lines(path):
+    with open(path, encoding="utf-8") as f:
+        return [json.loads(line) for line in f]
+
+
+def test_uploaded_logs_are_acked(spool_path):
+    upload = Recorder()
+    log_queue = AILogQueue(spool_path=spool_path, workers=1, upload=upload)
+    log_queue.start()
+
+    log_queue.put("order-1", {"stage": "Decision Making"})
+    assert log_queue.flush(timeout=5)
+
+    assert upload.order_ids == ["order-1"]
+    record, ack = _spool_lines(spool_path)
+    assert ack == {"ack": record["id"]}
+    assert log_queue.stats["uploaded"] == 1
+
+
+def test_failed_upload_is_retried(spool_path):
+    upload = Recorder(False)
+    log_queue = AILogQueue(spool_path=spool_path, workers=1, upload=upload)
+    log_queue.start()
+
+    log_queue.put("order-1", {})
+    assert log_queue.flush(timeout=5)
+
+    assert upload.order_ids == ["order-1", "order-1"]
+    assert log_queue.stats == {"uploaded": 1, "retries": 1, "failed": 0}
+
+
+def test_unacked_logs_are_replayed_on_start(spool_path):
+    with open(spool_path, "w", encoding="utf-8") as f:
+        f.write(json.dumps({"id": "a", "order_id": "order-a", "ai_log": {}}) + "\n")
+        f.write(json.dumps({"id": "b", "order_id": "order-b", "ai_log": {}}) + "\n")
+        f.write(json.dumps({"ack": "a"}) + "\n")
+        f.write('{"id": "c", "order_id": "ord')  # torn by a crash mid-write
+
+    upload = Recorder()
+    log_queue = AILogQueue(spool_path=spool_path, workers=1, upload=upload)
+    log_queue.start()
+    assert log_queue.flush(timeout=5)
+
+    assert upload.order_ids == ["order-b"]
+    # Recovery rewrote the spool with only the unacked record, then acked it
+    assert [line.get("id", line.get("ack")) for line in _spool_lines(spool_path)] == ["b", "b"]
+
+
+def test_pending_logs_survive_a_restart(spool_path):
+    # No workers: the process dies before the log is uploaded
+    first = AILogQueue(spool_path=spool_path, workers=0, upload=Recorder())
+    first.start()
+    first.put("order-1", {"stage": "Decision Making"})
+    assert first.pending() == 1
+    first._spool.close()
+
+    upload = Recorder()
+    second = AILogQueue(spool_path=spool_path, workers=1, upload=upload)
+    second.start()
+
+    assert second.flush(timeout=5)
+    assert upload.order_ids == ["order-1"]
+
+
+def test_queue_overflow_trips_the_kill_switch(spool_path):
+    log_queue = AILogQueue(spool_path=spool_path, workers=0, maxsize=1, upload=Recorder())
+    log_queue.start()
+
+    log_queue.put("order-1", {})
+    log_queue.put("order-2", {})  # still spooled, but no room in memory
+
+    with pytest.raises(SystemExit):
+        log_queue.check()
+    assert len(_spool_lines(spool_path)) == 2
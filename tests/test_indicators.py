@@ -0,0 +1,82 @@
+"""
+market/indicators.py: batch and streaming forms agree, and RSI/ATR follow
+Wilder's definitions.
+"""
+import math
+
+import numpy as np
+import pytest
+
+from market import indicators
+
+
+def _wilder(values, period):
+    # Reference: mean of the first `period` values, then avg += (x - avg) / period
+    avg = sum(values[:period]) / period
+    out = [avg]
+    for x in values[period:]:
+        avg += (x - avg) / period
+        out.append(avg)
+    return out
+
+
+@pytest.fixture
+def candles():
+    return indicators._synthetic_candles(300)
+
+
+def test_batch_and_streaming_forms_agree():
+    indicators._check_agreement(n=300)
+
+
+def test_rsi_matches_wilder_reference(candles):
+    _, _, closes, _ = candles
+    deltas = np.diff(closes)
+    gains = _wilder(list(np.clip(deltas, 0, None)), 14)
+    losses = _wilder(list(np.clip(-deltas, 0, None)), 14)
+    expected = [100 - 100 / (1 + g / l) for g, l in zip(gains, losses)]
+
+    result = indicators.rsi(closes, 14)
+
+    assert np.isnan(result[:14]).all()
+    np.testing.assert_allclose(result[14:], expected, rtol=1e-9)
+
+
+def test_rsi_edge_cases():
+    assert indicators.rsi(np.arange(1.0, 31.0), 14)[-1] == 100.0
+    assert indicators.rsi(np.full(30, 5.0), 14)[-1] == 50.0
+    assert np.isnan(indicators.rsi(np.arange(10.0), 14)).all()
+
+
+def test_atr_matches_wilder_reference(candles):
+    highs, lows, closes, _ = candles
+    tr = [highs[0] - lows[0]] + [
+        max(h - l, abs(h - c), abs(l - c)) for h, l, c in zip(highs[1:], lows[1:], closes[:-1])
+    ]
+
+    result = indicators.atr(highs, lows, closes, 14)
+
+    assert np.isnan(result[:13]).all()
+    np.testing.assert_allclose(result[13:], _wilder(tr, 14), rtol=1e-9)
+
+
+def test_two_dimensional_input_computes_each_row(candles):
+    highs, lows, closes, volumes = candles
+    stacked = np.stack([closes, closes[::-1]])
+
+    for fn in (indicators.ema, indicators.rsi, indicators.realized_volatility):
+        result = fn(stacked)
+        np.testing.assert_allclose(result[0], fn(closes), equal_nan=True)
+        np.testing.assert_allclose(result[1], fn(closes[::-1]), equal_nan=True)
+
+
+def test_long_series_stays_finite():
+    # _ewm unrolls the recursion in blocks; a long series must not overflow
+    closes = 100.0 + np.sin(np.arange(20_000) / 50.0)
+    assert np.isfinite(indicators.ema(closes, 200)[-1])
+    assert np.isfinite(indicators.rsi(closes, 14)[-1])
+
+
+def test_streaming_bollinger_before_window_is_full():
+    state = indicators.BollingerState(20)
+    assert all(math.isnan(v) for v in state.update(100.0))
@@ -0,0 +1,185 @@
+"""
+LLMClient against ai/fake_llm_server.py: deadlines, retries, hedging and
+usage accounting, over real HTTP on localhost.
+"""
+import asyncio
+import json
+import time
+
+import pytest
+
+from ai.fake_llm_server import FakeLLMServer, hold_responder
+from ai.llm_client import LLMClient, LLMTimeoutError
+
+
+class ScriptedRandom:
+    """
+    Stands in for the server's RNG. Each request rolls random() once for
+    "slow?" and once for "error?"; scripted rolls are used in order, then 0.99
+    (fast, no error).
+    """
+
+    def __init__(self, *rolls):
+        self.rolls = list(rolls)
+
+    def random(self):
+        return self.rolls.pop(0) if self.rolls else 0.99
+
+    def uniform(self, a, b):
+        return 0.0
+
+
+@pytest.fixture
+def server():
+    server = FakeLLMServer(latency=0.02, seed=0)
+    server.start()
+    yield server
+    server.stop()
+
+
+@pytest.fixture
+def make_client(server):
+    clients = []
+
+    def make(**kwargs):
+        options = {"api_key": "test", "base_url": server.base_url, "hedge": False, "stream": False, "backoff_factor": 0.01}
+        client = LLMClient(**{**options, **kwargs})
+        clients.append(client)
+        return client
+
+    yield make
+    for client in clients:
+        client.close()
+
+
+def _pending_attempts(client) -> int:
+    async def count():
+        return sum(
+            1 for task in asyncio.all_tasks()
+            if task.get_coro().__name__ == "_attempt" and not task.done()
+        )
+    return asyncio.run_coroutine_threadsafe(count(), client._ensure_loop()).result(5)
+
+
+def _wait_for(predicate, timeout: float = 2.0):
+    deadline = time.monotonic() + timeout
+    while not predicate() and time.monotonic() < deadline:
+        time.sleep(0.01)
+    return predicate()
+
+
+def test_answer_and_usage(make_client):
+    client = make_client()
+    prompt = "ALLOWED ACTIONS: SELL, HOLD\nREQUIRED SIZE: 0.5\n"
+    answer = json.loads(client.complete(prompt))
+
+    assert answer["action"] == "HOLD"
+    usage = client.usage
+    assert usage["requests"] == 1 and usage["errors"] == 0
+    assert usage["prompt_tokens"] == len(prompt) // 4
+    assert usage["completion_tokens"] == len(hold_responder(prompt)) // 4
+    assert usage["total_tokens"] == usage["prompt_tokens"] + usage["completion_tokens"]
+    assert client.stats()["latency"]["count"] == 1
+
+
+def test_deadline_raises_timeout(server, make_client):
+    server.latency = 1.0
+    client = make_client(max_retries=0)
+
+    start = time.perf_counter()
+    with pytest.raises(LLMTimeoutError):
+        client.complete("prompt", timeout=0.2)
+
+    assert time.perf_counter() - start < 0.8
+    assert client.usage["timeouts"] == 1
+
+
+def test_server_error_is_retried(server, make_client):
+    server.error_rate = 0.5
+    server._rng = ScriptedRandom(0.99, 0.0)  # first request: fast, then HTTP 500
+    client = make_client(max_retries=2)
+
+    assert json.loads(client.complete("prompt"))["action"] == "HOLD"
+    assert client.usage["requests"] == 2
+    assert client.usage["errors"] == 1
+    assert client.usage["retries"] == 1
+
+
+def test_retries_are_bounded(server, make_client):
+    server.error_rate = 1.0
+    client = make_client(max_retries=1)
+
+    with pytest.raises(Exception):
+        client.complete("prompt")
+    assert client.usage["requests"] == 2
+    assert client.usage["retries"] == 1
+
+
+def test_hedge_wins_and_loser_is_cancelled(server, make_client):
+    client = make_client(hedge=True, hedge_min_samples=2)
+    for _ in range(2):
+        client.complete("warm")
+    assert client.hedge_delay() is not None
+
+    server.slow_rate = 0.5
+    server.slow_latency = 3.0
+    server._rng = ScriptedRandom(0.0)  # the next request is slow; its hedge is not
+    start = time.perf_counter()
+    answer = client.complete("prompt")
+    elapsed = time.perf_counter() - start
+
+    assert json.loads(answer)["action"] == "HOLD"
+    assert elapsed < 1.5
+    assert client.usage["hedged"] == 1
+    assert client.usage["hedge_wins"] == 1
+    # Only the winner is timed; the slow original was cancelled, not awaited
+    assert client.stats()["latency"]["count"] == 3
+    assert _wait_for(lambda: _pending_attempts(client) == 0)
+    assert client.usage["errors"] == 0
+
+
+def test_no_hedge_before_enough_samples(server, make_client):
+    client = make_client(hedge=True, hedge_min_samples=50)
+    client.complete("prompt")
+    assert client.hedge_delay() is None
+    assert client.usage["hedged"] == 0
+
+
+def test_streamed_answer_reports_fields_and_usage(make_client):
+    client = make_client(stream=True)
+    fields = []
+    prompt = "ALLOWED ACTIONS: SELL, HOLD\nREQUIRED SIZE: 0.5\n"
+
+    answer = json.loads(client.complete(prompt, on_field=lambda key, value: fields.append(key)))
+
+    assert answer["action"] == "HOLD"
+    assert fields[:1] == ["action"] and "reason" in fields
+    assert client.usage["streamed"] == 1
+    # Usage arrives after the JSON value, through the background drain
+    assert _wait_for(lambda: client.usage["usage_reports"] == 1)
+    assert client.usage["prompt_tokens"] == len(prompt) // 4
+
+
+def test_streamed_answer_stops_at_closing_brace(server, make_client):
+    server.responder = lambda prompt: hold_responder(prompt) + "\nHope this helps! " * 20
+    client = make_client(stream=True)
+
+    answer = client.complete("prompt")
+
+    assert answer.endswith("}")
+    assert json.loads(answer)["action"] == "HOLD"
+    assert _wait_for(lambda: client.usage["early_stops"] == 1)
+
+
+def test_prefix_cache_hits_are_counted(server, make_client):
+    server.cache_min_tokens = 128
+    client = make_client()
+    prefix = "static rules " * 100  # ~325 tokens
+
+    client.complete(prefix + "symbol A")
+    client.complete(prefix + "symbol B")
+
+    cache = client.stats()["prefix_cache"]
+    assert client.usage["cache_hits"] == 1
+    assert client.usage["cached_tokens"] >= 128
+    assert cache["hit_rate"] == 0.5
@@ -0,0 +1,150 @@
+"""
+ExecutionGateway retries against the simulated exchange: an order whose
+outcome is uncertain is looked up by client_oid and never filled twice.
+"""
+import pytest
+import requests
+
+from exchange.orders import ExecutionGateway
+from exchange.sim_exchange import SimulatedExchange, SimulatedWeexClient
+from exchange.weex_client import WeexClient
+
+SYMBOL = "cmt_ethusdt"
+
+
+class FlakyClient(SimulatedWeexClient):
+    """
+    Simulated client that fails place_order as scripted in `faults`:
+    "before" raises before the order reaches the exchange, "after" raises
+    once the exchange has filled it (a lost response), "invalid" raises an
+    error that says nothing about the order's fate. `history_lag` hides
+    this many history lookups, like an exchange whose history is behind.
+    """
+
+    def __init__(self, exchange, faults=(), history_lag=0):
+        super().__init__(exchange)
+        self.faults = list(faults)
+        self.history_lag = history_lag
+        self.submissions = 0
+        self.lookups = 0
+
+    def place_order(self, payload):
+        self.submissions += 1
+        fault = self.faults.pop(0) if self.faults else None
+        if fault == "before":
+            raise requests.ConnectionError("connection refused")
+        if fault == "invalid":
+            raise ValueError("bad payload")
+        response = super().place_order(payload)
+        if fault == "after":
+            raise requests.Timeout("read timed out")
+        return response
+
+    def get_history_orders(self, symbol, page_size=100):
+        self.lookups += 1
+        if self.history_lag:
+            self.history_lag -= 1
+            return {"code": "00000", "data": {"list": []}}
+        return super().get_history_orders(symbol, page_size)
+
+
+@pytest.fixture
+def exchange():
+    exchange = SimulatedExchange(initial_balance=10_000.0)
+    exchange.set_bar(SYMBOL, 1_000, 2000.0, 2000.0, 2000.0, 2000.0)
+    return exchange
+
+
+@pytest.fixture
+def use_client():
+    previous = []
+
+    def use(client):
+        previous.append(WeexClient.set_shared(client))
+        return client
+
+    yield use
+    if previous:
+        WeexClient.set_shared(previous[0])
+
+
+@pytest.fixture
+def gateway():
+    return ExecutionGateway(max_retries=2, retry_backoff=0.0)
+
+
+def _submit(gateway):
+    return gateway.submit(SYMBOL, "SELL", 0.1, 5, take_profit=1900.0, stop_loss=2100.0)
+
+
+def test_order_is_placed_once(exchange, use_client, gateway):
+    client = use_client(FlakyClient(exchange))
+
+    order_id = _submit(gateway)
+
+    assert order_id == exchange.order_history[0]["order_id"]
+    assert client.submissions == 1 and client.lookups == 0
+
+
+def test_timeout_after_fill_recovers_the_order(exchange, use_client, gateway):
+    client = use_client(FlakyClient(exchange, faults=["after"]))
+
+    order_id = _submit(gateway)
+
+    # Found by client_oid instead of being sent a second time
+    assert client.submissions == 1
+    assert len(exchange.order_history) == 1
+    assert order_id == exchange.order_history[0]["order_id"]
+    assert exchange.positions[SYMBOL]["size"] == pytest.approx(0.1)
+
+
+def test_order_lost_before_the_exchange_is_resubmitted(exchange, use_client, gateway):
+    client = use_client(FlakyClient(exchange, faults=["before"]))
+
+    order_id = _submit(gateway)
+
+    assert client.submissions == 2
+    assert len(exchange.order_history) == 1
+    assert order_id == exchange.order_history[0]["order_id"]
+
+
+def test_duplicate_client_oid_is_resolved_by_lookup(exchange, use_client, gateway):
+    # The fill's response is lost and the history does not show it yet, so
+    # the gateway resubmits and the exchange refuses the reused client_oid
+    client = use_client(FlakyClient(exchange, faults=["after"], history_lag=1))
+
+    order_id = _submit(gateway)
+
+    assert client.submissions == 2
+    assert exchange.rejected == 1
+    assert len(exchange.order_history) == 1
+    assert order_id == exchange.order_history[0]["order_id"]
+    assert exchange.positions[SYMBOL]["size"] == pytest.approx(0.1)
+
+
+def test_retries_are_bounded(exchange, use_client, gateway):
+    client = use_client(FlakyClient(exchange, faults=["before"] * 10))
+
+    assert _submit(gateway) is None
+    assert client.submissions == gateway.max_retries + 1
+    assert exchange.order_history == []
+
+
+def test_non_retryable_error_is_not_resubmitted(exchange, use_client, gateway):
+    client = use_client(FlakyClient(exchange, faults=["invalid"]))
+
+    assert _submit(gateway) is None
+    assert client.submissions == 1 and client.lookups == 0
+
+
+def test_sim_exchange_refuses_a_reused_client_oid(exchange):
+    body = {"symbol": SYMBOL, "side": "SELL", "quantity": "0.1", "leverage": "5", "client_oid": "abc"}
+
+    first = exchange.handle("POST", "/capi/v2/order/placeOrder", body=body)
+    second = exchange.handle("POST", "/capi/v2/order/placeOrder", body=body)
+
+    assert first["code"] == "00000"
+    assert second["code"] != "00000" and "abc" in second["msg"]
+    history = exchange.handle("GET", "/capi/v2/order/history", params={"symbol": SYMBOL})["data"]["list"]
+    assert [order["client_oid"] for order in history] == ["abc"]
+    assert exchange.positions[SYMBOL]["size"] == pytest.approx(0.1)
@@ -0,0 +1,137 @@
+"""
+Position reconciliation: the book follows the exchange's open positions,
+except for symbols with an order in flight.
+"""
+import pytest
+
+import runner.trader as trader_module
+from account.position_book import PositionBook
+from account.state import invalidate_account_state
+from exchange.sim_exchange import SimulatedExchange, SimulatedWeexClient
+from exchange.weex_client import WeexClient
+from runner.trader import Trader
+
+BTC = "cmt_btcusdt"
+ETH = "cmt_ethusdt"
+SOL = "cmt_solusdt"
+
+
+def _short(size, entry_price=100.0, leverage=5):
+    return {"side": "SHORT", "size": size, "entry_price": entry_price, "leverage": leverage}
+
+
+@pytest.fixture
+def book(tmp_path):
+    book = PositionBook(str(tmp_path / "positions.db"))
+    yield book
+    book.close_db()
+
+
+@pytest.fixture
+def exchange():
+    exchange = SimulatedExchange(initial_balance=1000.0, slippage_bps=0.0)
+    previous = WeexClient.set_shared(SimulatedWeexClient(exchange))
+    invalidate_account_state()
+    yield exchange
+    WeexClient.set_shared(previous)
+    invalidate_account_state()
+
+
+@pytest.fixture
+def trader(tmp_path):
+    return Trader(workers=1, upload_ai_logs=False, position_book_path=str(tmp_path / "positions.db"))
+
+
+def test_reconcile_drops_adopts_and_resizes(book):
+    book.open(BTC, _short(0.01), "o-1")
+    book.open(ETH, _short(0.5), "o-2")
+
+    positions = book.reconcile([
+        {"symbol": ETH, **_short(0.25)},
+        {"symbol": SOL, **_short(3.0, entry_price=20.0)},
+    ])
+
+    assert set(positions) == {ETH, SOL}
+    assert positions[ETH]["size"] == 0.25
+    assert positions[ETH]["order_id"] == "o-2"
+    assert positions[SOL]["entry_price"] == 20.0
+    actions = {fill["symbol"]: fill["action"] for fill in book.fills() if fill["action"].startswith("reconcile")}
+    assert actions == {BTC: "reconcile_closed", ETH: "reconcile_resized", SOL: "reconcile_adopted"}
+
+
+def test_reconcile_without_changes_journals_nothing(book):
+    book.open(BTC, _short(0.01), "o-1")
+
+    book.reconcile([{"symbol": BTC, **_short(0.01)}])
+
+    assert [fill["action"] for fill in book.fills()] == ["open"]
+
+
+def test_reconcile_leaves_kept_symbols_alone(book):
+    book.open(BTC, _short(0.01), "o-1")
+
+    positions = book.reconcile([{"symbol": ETH, **_short(0.5)}], keep={BTC, ETH})
+
+    assert set(positions) == {BTC}
+
+
+def test_sync_drops_position_closed_by_take_profit(exchange, trader):
+    exchange.set_bar(BTC, 1_000, 100.0, 100.0, 100.0, 100.0)
+    order_id, error = exchange.place_order(BTC, "SELL", 1.0, leverage=5, take_profit=95.0, stop_loss=110.0)
+    assert error is None
+
+    assert trader.sync_positions()
+    assert set(trader.positions) == {BTC}
+    assert trader.open_symbols == {BTC}
+
+    # The next bar trades through the take profit on the exchange
+    exchange.set_bar(BTC, 2_000, 99.0, 99.0, 94.0, 96.0)
+    invalidate_account_state()
+    assert trader.sync_positions()
+
+    assert trader.positions == {}
+    assert trader.open_symbols == set()
+    assert trader.book.load() == {}
+
+
+def test_sync_keeps_the_local_book_when_the_exchange_is_unreadable(trader, monkeypatch):
+    trader.positions = {BTC: _short(0.01)}
+    trader.open_symbols = {BTC}
+    def unreachable(cls):
+        raise ConnectionError("exchange down")
+
+    monkeypatch.setattr(WeexClient, "shared", classmethod(unreachable))
+    invalidate_account_state()
+
+    assert not trader.sync_positions()
+    assert set(trader.positions) == {BTC}
+
+
+def test_in_flight_entry_keeps_its_slot(exchange, trader, monkeypatch):
+    exchange.set_bar(BTC, 1_000, 100.0, 100.0, 100.0, 100.0)
+
+    def place_order(**kwargs):
+        # A reconcile from another thread runs before the exchange reports the fill
+        assert trader.reconcile_positions([])
+        assert BTC in trader.open_symbols
+        return "o-1"
+
+    monkeypatch.setattr(trader_module, "place_order", place_order)
+    decision = {"action": "SELL", "size": 0.01, "leverage": 5}
+
+    assert trader._execute(BTC, decision, None, 100.0, True, "") == "o-1"
+
+    assert set(trader.positions) == {BTC}
+    assert trader.open_symbols == {BTC}
+    assert trader._in_flight == set()
+    assert set(trader.book.load()) == {BTC}
+
+
+def test_failed_entry_releases_its_slot(trader, monkeypatch):
+    monkeypatch.setattr(trader_module, "place_order", lambda **kwargs: None)
+    decision = {"action": "SELL", "size": 0.01, "leverage": 5}
+
+    assert trader._execute(BTC, decision, None, 100.0, True, "") is None
+
+    assert trader.open_symbols == set()
+    assert trader._in_flight == set()
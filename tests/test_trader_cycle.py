@@ -0,0 +1,87 @@
+"""
+Trader cycles: symbols run concurrently, one failing symbol does not stop
+the others, and MAX_OPEN_TRADES holds under concurrent entries.
+"""
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+import runner.trader as trader_module
+from config.settings import ALLOWED_SYMBOLS, MAX_OPEN_TRADES
+from runner.trader import Trader
+
+
+@pytest.fixture
+def trader(monkeypatch):
+    monkeypatch.setattr(trader_module, "get_market_snapshots", lambda symbols: {})
+    trader = Trader(workers=len(ALLOWED_SYMBOLS), inference_mode="per_symbol", upload_ai_logs=False, position_book_path="")
+    monkeypatch.setattr(trader, "sync_positions", lambda: True)
+    return trader
+
+
+@pytest.fixture
+def executor():
+    executor = ThreadPoolExecutor(max_workers=len(ALLOWED_SYMBOLS))
+    yield executor
+    executor.shutdown(wait=False)
+
+
+def test_cycle_processes_symbols_concurrently(trader, executor, monkeypatch):
+    seen = []
+
+    def process_symbol(symbol, market_snapshot=None):
+        time.sleep(0.2)
+        seen.append(symbol)
+
+    monkeypatch.setattr(trader, "process_symbol", process_symbol)
+    start = time.perf_counter()
+    trader.run_cycle(executor)
+
+    assert sorted(seen) == sorted(ALLOWED_SYMBOLS)
+    assert time.perf_counter() - start < 0.2 * len(ALLOWED_SYMBOLS) / 2
+
+
+def test_failing_symbol_does_not_stop_the_cycle(trader, executor, monkeypatch):
+    seen = []
+
+    def process_symbol(symbol, market_snapshot=None):
+        if symbol == ALLOWED_SYMBOLS[0]:
+            raise ValueError("bad snapshot")
+        seen.append(symbol)
+
+    monkeypatch.setattr(trader, "process_symbol", process_symbol)
+    trader.run_cycle(executor)
+
+    assert sorted(seen) == sorted(ALLOWED_SYMBOLS[1:])
+
+
+def test_kill_switch_stops_the_cycle(trader, executor, monkeypatch):
+    def process_symbol(symbol, market_snapshot=None):
+        raise SystemExit("AI logging failed")
+
+    monkeypatch.setattr(trader, "process_symbol", process_symbol)
+    with pytest.raises(SystemExit):
+        trader.run_cycle(executor)
+
+
+def test_concurrent_entries_respect_max_open_trades(trader, monkeypatch):
+    def place_order(**kwargs):
+        time.sleep(0.05)
+        return f"order-{kwargs['symbol']}"
+
+    monkeypatch.setattr(trader_module, "place_order", place_order)
+    decision = {"action": "SELL", "size": 0.01, "leverage": 5}
+    barrier = threading.Barrier(len(ALLOWED_SYMBOLS))
+
+    def enter(symbol):
+        barrier.wait()
+        return trader._execute(symbol, dict(decision), None, 100.0, True, "")
+
+    with ThreadPoolExecutor(max_workers=len(ALLOWED_SYMBOLS)) as pool:
+        order_ids = list(pool.map(enter, ALLOWED_SYMBOLS))
+
+    assert len([o for o in order_ids if o]) == MAX_OPEN_TRADES
+    assert len(trader.positions) == MAX_OPEN_TRADES
+    assert trader.open_symbols == set(trader.positions)
@@ -0,0 +1,108 @@
+import asyncio
+import threading
+import time
+from email.utils import parsedate_to_datetime
+
+from utils.logger import get_logger
+
+logger = get_logger("RATE_LIMITER")
+
+
+class TokenBucket:
+    """
+    Token bucket refilled continuously at `rate` tokens/s up to `capacity`.
+    Safe to share between threads and event loops: the lock is only held to
+    compute the wait, never while sleeping.
+    """
+
+    def __init__(self, rate: float, capacity: float | None = None):
+        self.rate = float(rate)
+        self.capacity = float(capacity if capacity is not None else rate)
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+        self._blocked_until = 0.0
+        self._lock = threading.Lock()
+
+    def _reserve(self, tokens: float = 1.0) -> float:
+        """
+        Takes `tokens` (possibly going negative) and returns how long the caller
+        must wait before using them.
+        """
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+            self._updated = now
+            self._tokens -= tokens
+            wait = -self._tokens / self.rate if self._tokens < 0 else 0.0
+            return max(wait, self._blocked_until - now)
+
+    def acquire(self, tokens: float = 1.0):
+        wait = self._reserve(tokens)
+        if wait > 0:
+            time.sleep(wait)
+
+    async def acquire_async(self, tokens: float = 1.0):
+        wait = self._reserve(tokens)
+        if wait > 0:
+            await asyncio.sleep(wait)
+
+    def block_for(self, seconds: float):
+        """
+        Holds every caller off for `seconds` (used for 429 / Retry-After).
+        """
+        with self._lock:
+            self._blocked_until = max(self._blocked_until, time.monotonic() + seconds)
+            self._tokens = min(self._tokens, 0.0)
+
+
+class RateLimiter:
+    """
+    Routes WEEX paths to separate buckets for public market data,
+    private account and trade endpoints.
+    """
+
+    def __init__(self, market_per_sec: float, account_per_sec: float, trade_per_sec: float):
+        self.buckets = {
+            "market": TokenBucket(market_per_sec),
+            "account": TokenBucket(account_per_sec),
+            "trade": TokenBucket(trade_per_sec),
+        }
+
+    @staticmethod
+    def bucket_name(path: str) -> str:
+        if "/market/" in path:
+            return "market"
+        if "/account/" in path:
+            return "account"
+        return "trade"
+
+    def acquire(self, path: str):
+        self.buckets[self.bucket_name(path)].acquire()
+
+    async def acquire_async(self, path: str):
+        await self.buckets[self.bucket_name(path)].acquire_async()
+
+    def throttled(self, path: str, retry_after: float | None = None):
+        """
+        Called when the exchange answers 429; pauses the endpoint's bucket.
+        """
+        name = self.bucket_name(path)
+        delay = retry_after if retry_after is not None else 1.0
+        logger.warning(f"Rate limited on {path}; pausing '{name}' bucket for {delay:.2f}s")
+        self.buckets[name].block_for(delay)
+
+
+def parse_retry_after(value) -> float | None:
+    """
+    Seconds to wait from a Retry-After header: delta-seconds or an HTTP-date.
+    """
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except (TypeError, ValueError):
+        pass
+    try:
+        return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError, IndexError, OverflowError):
+        return None
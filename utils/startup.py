@@ -0,0 +1,153 @@
+"""
+Startup profile: how long each initialization phase and each imported module
+took between process start and the first cycle.
+
+    profile = StartupProfile(enabled=True)   # before importing anything heavy
+    with profile.phase("imports"):
+        from runner.trader import Trader
+    ...
+    logger.info(profile.report())
+
+Imports are timed by a meta-path hook that subclasses each module's loader
+in place, so modules see their usual loader type. Times are inclusive (the
+module and everything it imported) and self (the module's own body).
+Deliberately free of config/ and third-party imports so it can be installed
+before them.
+"""
+import sys
+import threading
+import time
+from contextlib import contextmanager
+
+
+class _ImportTimer:
+    """
+    sys.meta_path entry recording (module, inclusive, self) load times.
+    """
+
+    def __init__(self):
+        self.records = {}
+        self._local = threading.local()
+        self._loader_classes = {}
+        self._lock = threading.Lock()
+        self.active = False
+
+    def find_spec(self, name, path=None, target=None):
+        if not self.active:
+            return None
+        for finder in sys.meta_path:
+            if finder is self or not hasattr(finder, "find_spec"):
+                continue
+            spec = finder.find_spec(name, path, target)
+            if spec is not None:
+                break
+        else:
+            return None
+        loader = spec.loader
+        # Builtin/frozen importers are classes, not instances; they load in microseconds
+        if loader is None or isinstance(loader, type) or not hasattr(loader, "exec_module"):
+            return spec
+        try:
+            loader.__class__ = self._timed_class(type(loader))
+        except TypeError:
+            pass
+        return spec
+
+    def _timed_class(self, cls):
+        timed_cls = self._loader_classes.get(cls)
+        if timed_cls is None:
+            timer = self
+
+            def create_module(loader, spec):
+                # Extension modules do their loading (dlopen) here
+                if not timer.active:
+                    return cls.create_module(loader, spec)
+                return timer._time(spec.name, cls.create_module, loader, spec)
+
+            def exec_module(loader, module):
+                if not timer.active:
+                    return cls.exec_module(loader, module)
+                return timer._time(module.__name__, cls.exec_module, loader, module)
+
+            attrs = {"create_module": create_module, "exec_module": exec_module, "__module__": cls.__module__}
+            timed_cls = type(cls.__name__, (cls,), attrs)
+            with self._lock:
+                timed_cls = self._loader_classes.setdefault(cls, timed_cls)
+        return timed_cls
+
+    def _time(self, name, fn, *args):
+        stack = getattr(self._local, "stack", None)
+        if stack is None:
+            stack = self._local.stack = []
+        stack.append(0.0)  # time spent in nested imports
+        start = time.perf_counter()
+        try:
+            return fn(*args)
+        finally:
+            inclusive = time.perf_counter() - start
+            nested = stack.pop()
+            if stack:
+                stack[-1] += inclusive
+            with self._lock:
+                previous_inclusive, previous_own = self.records.get(name, (0.0, 0.0))
+                self.records[name] = (previous_inclusive + inclusive, previous_own + inclusive - nested)
+
+
+class StartupProfile:
+    """
+    Wall-clock phases plus per-module import times, reported as one log block.
+    Disabled profiles cost nothing beyond the phase() context manager.
+    """
+
+    def __init__(self, enabled: bool = False):
+        self.enabled = enabled
+        self.started = time.perf_counter()
+        self.phases = []
+        self._imports = None
+        if enabled:
+            self._imports = _ImportTimer()
+            self._imports.active = True
+            sys.meta_path.insert(0, self._imports)
+
+    @contextmanager
+    def phase(self, name: str):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            if self.enabled:
+                self.phases.append((name, start - self.started, time.perf_counter() - start))
+
+    def stop(self):
+        if self._imports is not None:
+            self._imports.active = False
+            if self._imports in sys.meta_path:
+                sys.meta_path.remove(self._imports)
+
+    def by_package(self) -> list:
+        """
+        [(top-level package, self seconds, modules)] sorted by time.
+        """
+        packages = {}
+        for name, (_, own) in dict(self._imports.records if self._imports else {}).items():
+            total, count = packages.get(name.split(".")[0], (0.0, 0))
+            packages[name.split(".")[0]] = (total + own, count + 1)
+        return sorted(((pkg, t, n) for pkg, (t, n) in packages.items()), key=lambda item: -item[1])
+
+    def report(self, top: int = 15) -> str:
+        if not self.enabled:
+            return ""
+        elapsed = time.perf_counter() - self.started
+        lines = [f"Startup profile: ready after {elapsed * 1000:.0f}ms"]
+        for name, offset, duration in self.phases:
+            lines.append(f"  phase {name:<24}{duration * 1000:>9.1f}ms  (at +{offset * 1000:.0f}ms)")
+        records = dict(self._imports.records) if self._imports else {}
+        if records:
+            lines.append(f"  imports by package (self time, {len(records)} modules):")
+            for pkg, seconds, count in self.by_package()[:top]:
+                lines.append(f"    {pkg:<28}{seconds * 1000:>9.1f}ms  {count:>4} modules")
+            lines.append("  slowest modules (inclusive / self):")
+            slowest = sorted(records.items(), key=lambda item: -item[1][0])[:top]
+            for name, (inclusive, own) in slowest:
+                lines.append(f"    {name:<40}{inclusive * 1000:>9.1f}ms {own * 1000:>9.1f}ms")
+        return "\n".join(lines)
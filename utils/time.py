@@ -0,0 +1,15 @@
+import time
+
+_UNIT_MS = {"m": 60_000, "h": 3_600_000, "d": 86_400_000}
+
+def now_ms() -> int:
+    return int(time.time() * 1000)
+
+def timeframe_to_ms(timeframe: str) -> int:
+    """
+    Converts a candle granularity such as "5m", "1h" or "1d" to milliseconds.
+    """
+    unit = timeframe[-1].lower()
+    if unit not in _UNIT_MS:
+        raise ValueError(f"Unsupported timeframe: {timeframe}")
+    return int(timeframe[:-1]) * _UNIT_MS[unit]
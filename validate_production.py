@@ -3,7 +3,7 @@ load_dotenv()
 
 from runner.trader import Trader
 from utils.logger import get_logger
-from exchange.ai_log_uploader import FAIL_COUNT
+from exchange import ai_log_uploader
 
 logger = get_logger("VALIDATION")
 
@@ -18,12 +18,15 @@ def main():
         trader.process_symbol(symbol)
         
         logger.info("✅ process_symbol completed without crashing.")
-        
-        if FAIL_COUNT == 0:
+
+        # AI logs upload in the background; wait for the queue to drain
+        flushed = ai_log_uploader.flush_ai_logs(timeout=30)
+
+        if flushed and ai_log_uploader.FAIL_COUNT == 0:
              logger.info("✅ AI Log Upload appears successful (FAIL_COUNT=0).")
              logger.info("🏆 SYSTEM IS READY FOR PRODUCTION.")
         else:
-             logger.error(f"❌ AI Log Upload had failures (FAIL_COUNT={FAIL_COUNT}). Check logs.")
+             logger.error(f"❌ AI Log Upload had failures (FAIL_COUNT={ai_log_uploader.FAIL_COUNT}, flushed={flushed}). Check logs.")
 
     except Exception as e:
         logger.error(f"❌ Validation Crashed: {e}")